@@ -135,6 +135,47 @@ STATICFILES_DIRS = [
 MEDIA_ROOT = BASE_DIR / 'temp_uploads' # Using pathlib
 MEDIA_URL = '/media/'
 
+# OCR engine (see ocr_app/ocr_engine.py), loaded on first use
+OCR_LANGUAGES = os.getenv('OCR_LANGUAGES', 'en').split(',')
+# EasyOCR falls back to the CPU when no GPU is found, set False to skip looking
+OCR_USE_GPU = os.getenv('OCR_USE_GPU', 'True') == 'True'
+# Text crops recognised per model call, larger is faster on a GPU
+OCR_RECOGNITION_BATCH_SIZE = int(os.getenv('OCR_RECOGNITION_BATCH_SIZE', '8'))
+# How images are shrunk, cropped and straightened before OCR:
+# 'fast', 'balanced', 'quality' or 'off' (see ocr_app/preprocessing.py)
+OCR_PREPROCESS_PROFILE = os.getenv('OCR_PREPROCESS_PROFILE', 'balanced')
+
+# Background OCR jobs (see ocr_app/tasks.py)
+# 'thread' runs uploads through a small pool inside the web process,
+# 'worker' leaves them queued in the database for `manage.py run_ocr_worker`
+# so that web processes never load the OCR model
+OCR_QUEUE_MODE = os.getenv('OCR_QUEUE_MODE', 'thread' if DEBUG else 'worker')
+OCR_WORKER_THREADS = int(os.getenv('OCR_WORKER_THREADS', '2'))
+# run_ocr_worker: number of OCR processes, torch threads per process
+# (0 = the process's share of the cores) and whether to pin each process
+# to its share of the cores
+OCR_WORKER_PROCESSES = int(os.getenv('OCR_WORKER_PROCESSES', '2'))
+OCR_TORCH_THREADS = int(os.getenv('OCR_TORCH_THREADS', '0'))
+OCR_PIN_CORES = os.getenv('OCR_PIN_CORES', 'True') == 'True'
+# A job running longer than this is assumed dead and handed to another worker
+OCR_JOB_TIMEOUT_SECONDS = int(os.getenv('OCR_JOB_TIMEOUT_SECONDS', '300'))
+OCR_MAX_ATTEMPTS = int(os.getenv('OCR_MAX_ATTEMPTS', '3'))
+# Receipts handed to a worker per job, OCRed together where possible
+OCR_BATCH_SIZE = int(os.getenv('OCR_BATCH_SIZE', '8'))
+# Most images accepted by one batch upload (files and zip entries together)
+OCR_BATCH_MAX_FILES = int(os.getenv('OCR_BATCH_MAX_FILES', '50'))
+OCR_BATCH_MAX_FILE_BYTES = int(os.getenv('OCR_BATCH_MAX_FILE_BYTES', str(10 * 1024 * 1024)))
+# Duplicate receipts (see ocr_app/dedupe.py): largest difference-hash distance
+# (out of 256 bits) still flagged as the same receipt, and how far back to look.
+# Distances of 16 and more cannot use the hash band indexes and scan the window
+OCR_DUPLICATE_MAX_DISTANCE = int(os.getenv('OCR_DUPLICATE_MAX_DISTANCE', '12'))
+OCR_DUPLICATE_WINDOW_DAYS = int(os.getenv('OCR_DUPLICATE_WINDOW_DAYS', '90'))
+# Longest a status request may long-poll for. A waiting request holds a
+# worker thread of the WSGI server the whole time, so keep this to a few
+# seconds unless the server runs many threads per worker (e.g. gunicorn
+# --threads) or is async
+OCR_STATUS_MAX_WAIT_SECONDS = int(os.getenv('OCR_STATUS_MAX_WAIT_SECONDS', '5'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -1,16 +1,32 @@
 from django.contrib import admin
-from .models import ProcessedReceipt, ExpenseEntry
+from .models import ProcessedReceipt, ExpenseEntry, ReceiptBatch
+
+@admin.register(ReceiptBatch)
+class ReceiptBatchAdmin(admin.ModelAdmin):
+    list_display = ['id', 'created_at']
+    readonly_fields = ['id', 'created_at']
 
 @admin.register(ProcessedReceipt)
 class ProcessedReceiptAdmin(admin.ModelAdmin):
-    list_display = ['id', 'status', 'uploaded_at', 'processed_at']
-    list_filter = ['status', 'uploaded_at']
-    search_fields = ['id', 'original_ocr_text']
-    readonly_fields = ['id', 'uploaded_at', 'processed_at', 'processing_time_seconds']
+    list_display = ['id', 'status', 'uploaded_at', 'processed_at', 'duplicate_of', 'ocr_cache_hit']
+    list_filter = ['status', 'uploaded_at', 'ocr_cache_hit']
+    search_fields = ['id', 'batch__id', 'content_hash', 'original_ocr_text']
+    readonly_fields = [
+        'id', 'uploaded_at', 'started_at', 'attempts', 'processed_at', 'processing_time_seconds',
+        'content_hash', 'perceptual_hash', 'duplicate_of', 'ocr_cache_hit'
+    ]
     fieldsets = (
         ('Basic Information', {
             'fields': ('id', 'status', 'uploaded_at', 'processed_at', 'processing_time_seconds')
         }),
+        ('Duplicate Detection', {
+            'fields': ('duplicate_of', 'content_hash', 'perceptual_hash', 'ocr_cache_hit'),
+            'classes': ('collapse',)
+        }),
+        ('Background Processing', {
+            'fields': ('batch', 'started_at', 'attempts'),
+            'classes': ('collapse',)
+        }),
         ('Receipt Data', {
             'fields': ('receipt_image', 'original_ocr_text')
         }),
@@ -36,6 +52,10 @@ class ExpenseEntryAdmin(admin.ModelAdmin):
         ('Receipt Information', {
             'fields': ('receipt_number', 'gst_no', 'upi_transaction_id', 'location')
         }),
+        ('Parser Confidence', {
+            'fields': ('amount_confidence', 'date_confidence', 'merchant_confidence'),
+            'classes': ('collapse',)
+        }),
         ('Business Details', {
             'fields': ('is_reimbursable', 'project_code', 'uploaded_by_employee_id')
         }),
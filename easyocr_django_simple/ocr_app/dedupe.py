@@ -0,0 +1,151 @@
+# ocr_app/dedupe.py
+"""
+Duplicate receipt detection and the OCR result cache.
+
+Every upload is fingerprinted twice:
+- content_hash, the SHA-256 of the file. A resubmitted file matches exactly,
+  and its OCR text and parsed expense fields are copied from the earlier
+  receipt instead of running the OCR model again (see tasks.process_receipts).
+  The processed receipts themselves are the cache, looked up by an indexed
+  hash.
+- perceptual_hash, a 256-bit difference hash of the image. The same receipt
+  re-encoded or resized (forwarded through a chat app, exported from another
+  phone) lands within a few bits of the original. The usual 64-bit hash is
+  too coarse for receipts, different ones from the same shop share a layout.
+  These near-duplicates are only flagged as likely double claims. Different
+  photos OCR differently, so their results are not reused.
+
+A hash distance cannot be indexed, so the perceptual hash is also stored as
+16 indexed bands of 16 bits. Two hashes at most 15 bits apart differ in at
+most 15 bands and share at least one exactly, so only receipts sharing a band
+are compared.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ProcessedReceipt
+
+# Difference hash grid, one bit per horizontally adjacent pixel pair
+HASH_WIDTH, HASH_HEIGHT = 17, 16
+# Bands of 16 bits (4 hex digits) of the perceptual hash
+HASH_BANDS = 16
+BAND_FIELDS = [f'perceptual_band_{band}' for band in range(HASH_BANDS)]
+
+
+def compute_content_hash(uploaded_file):
+    sha256 = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        sha256.update(chunk)
+    uploaded_file.seek(0)
+    return sha256.hexdigest()
+
+
+def compute_perceptual_hash(uploaded_file):
+    """Difference hash: one bit per pair of horizontally adjacent pixels, as hex"""
+    from PIL import Image
+
+    uploaded_file.seek(0)
+    try:
+        with Image.open(uploaded_file) as image:
+            # Lets JPEG decode at a fraction of the size, much faster
+            image.draft('L', (HASH_WIDTH * 8, HASH_HEIGHT * 8))
+            pixels = list(image.convert('L').resize((HASH_WIDTH, HASH_HEIGHT)).getdata())
+    except Exception:
+        return None
+    finally:
+        uploaded_file.seek(0)
+
+    bits = 0
+    for row in range(HASH_HEIGHT):
+        for column in range(HASH_WIDTH - 1):
+            index = row * HASH_WIDTH + column
+            bits = bits << 1 | (pixels[index] > pixels[index + 1])
+    return f'{bits:064x}'
+
+
+def hamming_distance(first_hash, second_hash):
+    return bin(int(first_hash, 16) ^ int(second_hash, 16)).count('1')
+
+
+def split_bands(perceptual_hash):
+    """Split a perceptual hash into its HASH_BANDS 16-bit bands"""
+    return [int(perceptual_hash[band * 4:band * 4 + 4], 16) for band in range(HASH_BANDS)]
+
+
+def set_bands(receipt_instance):
+    bands = split_bands(receipt_instance.perceptual_hash) if receipt_instance.perceptual_hash else [None] * HASH_BANDS
+    for field, value in zip(BAND_FIELDS, bands):
+        setattr(receipt_instance, field, value)
+
+
+def find_duplicate(content_hash, perceptual_hash):
+    """Get the earliest receipt with the same or a near-identical image, or None"""
+    exact = ProcessedReceipt.objects.filter(content_hash=content_hash).order_by('uploaded_at').first()
+    if exact is not None or perceptual_hash is None:
+        return exact
+
+    since = timezone.now() - timedelta(days=settings.OCR_DUPLICATE_WINDOW_DAYS)
+    candidates = ProcessedReceipt.objects.filter(uploaded_at__gte=since, perceptual_hash__isnull=False)
+    max_distance = settings.OCR_DUPLICATE_MAX_DISTANCE
+    if max_distance < HASH_BANDS:
+        # Only receipts sharing a band can be close enough, found by the band indexes
+        shares_band = Q()
+        for field, value in zip(BAND_FIELDS, split_bands(perceptual_hash)):
+            shares_band |= Q(**{field: value})
+        candidates = candidates.filter(shares_band)
+    candidates = candidates.order_by('uploaded_at').values_list('id', 'perceptual_hash')
+
+    for receipt_id, candidate_hash in candidates.iterator(chunk_size=2000):
+        if hamming_distance(perceptual_hash, candidate_hash) <= max_distance:
+            return ProcessedReceipt.objects.get(pk=receipt_id)
+    return None
+
+
+def fingerprint_receipt(receipt_instance, uploaded_file, seen=None):
+    """
+    Set a new receipt's hashes and flag it if it duplicates an earlier upload.
+
+    seen maps content hashes to receipts uploaded in the same request, which
+    are not in the database yet.
+    """
+    receipt_instance.content_hash = compute_content_hash(uploaded_file)
+    receipt_instance.perceptual_hash = compute_perceptual_hash(uploaded_file)
+    set_bands(receipt_instance)
+
+    if seen is not None and receipt_instance.content_hash in seen:
+        first = seen[receipt_instance.content_hash]
+        receipt_instance.duplicate_of = first.duplicate_of or first
+    else:
+        receipt_instance.duplicate_of = find_duplicate(receipt_instance.content_hash, receipt_instance.perceptual_hash)
+        if seen is not None:
+            seen[receipt_instance.content_hash] = receipt_instance
+    return receipt_instance
+
+
+def find_cached_results(receipts):
+    """
+    Map receipts to an earlier processed receipt of the identical file whose
+    OCR text and expense entry can be reused, in one query.
+    """
+    hashes = {receipt_instance.content_hash for receipt_instance in receipts if receipt_instance.content_hash}
+    if not hashes:
+        return {}
+
+    sources = {}
+    for source in ProcessedReceipt.objects.filter(
+        content_hash__in=hashes,
+        status='processed',
+        expense_entry__isnull=False
+    ).select_related('expense_entry').order_by('-processed_at'):
+        # Newest first, the latest parse wins
+        sources.setdefault(source.content_hash, source)
+
+    return {
+        receipt_instance.pk: sources[receipt_instance.content_hash]
+        for receipt_instance in receipts
+        if receipt_instance.content_hash in sources and sources[receipt_instance.content_hash].pk != receipt_instance.pk
+    }
@@ -1,6 +1,83 @@
 # ocr_app/forms.py
+import os
+import zipfile
+import zlib
+
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
 
 class ImageUploadForm(forms.Form):
     image = forms.ImageField(label='Select an image',
-                             widget=forms.ClearableFileInput(attrs={'class': 'form-control-file'}))
\ No newline at end of file
+                             widget=forms.ClearableFileInput(attrs={'class': 'form-control-file'}))
+
+class MultipleFileInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
+
+
+class MultipleImageField(forms.ImageField):
+    """Image field taking any number of files, each validated as an image"""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', MultipleFileInput())
+        super().__init__(*args, **kwargs)
+
+    def clean(self, data, initial=None):
+        if isinstance(data, (list, tuple)):
+            return [super(MultipleImageField, self).clean(item, initial) for item in data]
+        return [super().clean(data, initial)] if data else []
+
+
+class BatchUploadForm(forms.Form):
+    IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff')
+
+    images = MultipleImageField(label='Select images', required=False)
+    archive = forms.FileField(label='Or a zip of images', required=False)
+
+    def clean_archive(self):
+        """Unpack the zip into validated image uploads"""
+        archive = self.cleaned_data.get('archive')
+        if not archive:
+            return []
+
+        try:
+            zip_file = zipfile.ZipFile(archive)
+        except zipfile.BadZipFile:
+            raise forms.ValidationError("The archive is not a valid zip file.")
+
+        entries = [
+            info for info in zip_file.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(self.IMAGE_EXTENSIONS)
+            and not os.path.basename(info.filename).startswith('.')
+        ]
+        if len(entries) > settings.OCR_BATCH_MAX_FILES:
+            raise forms.ValidationError(f"The archive holds more than {settings.OCR_BATCH_MAX_FILES} images.")
+
+        images = []
+        image_field = forms.ImageField()
+        for info in entries:
+            # Checked before extracting, against zip bombs
+            if info.file_size > settings.OCR_BATCH_MAX_FILE_BYTES:
+                raise forms.ValidationError(f"{info.filename} is too large.")
+            try:
+                data = zip_file.read(info)
+            except (zipfile.BadZipFile, zlib.error, RuntimeError, EOFError, NotImplementedError):
+                # Corrupt entries, encrypted entries and unsupported compression methods
+                raise forms.ValidationError(f"{info.filename} could not be extracted.")
+            upload = SimpleUploadedFile(os.path.basename(info.filename), data)
+            try:
+                images.append(image_field.clean(upload))
+            except forms.ValidationError:
+                raise forms.ValidationError(f"{info.filename} is not a valid image.")
+        return images
+
+    def clean(self):
+        cleaned_data = super().clean()
+        files = cleaned_data.get('images', []) + cleaned_data.get('archive', [])
+        if not self.errors:
+            if not files:
+                raise forms.ValidationError("Upload at least one image or a zip of images.")
+            if len(files) > settings.OCR_BATCH_MAX_FILES:
+                raise forms.ValidationError(f"Upload at most {settings.OCR_BATCH_MAX_FILES} images at once.")
+        cleaned_data['files'] = files
+        return cleaned_data
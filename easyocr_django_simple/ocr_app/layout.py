@@ -0,0 +1,98 @@
+# ocr_app/layout.py
+"""
+Where each piece of OCR text sits on the receipt, and how sure OCR was of it.
+
+EasyOCR's readtext() returns, for every text region it detects, a box, the
+text and a confidence. original_ocr_text keeps the texts, one region per
+line. The boxes and confidences go into ProcessedReceipt.ocr_layout, packed
+as arrays of 16-bit integers: 10 bytes a region, one column per receipt
+instead of one row per region. The parser uses them to pair labels with the
+values printed next to or under them (see simple_parser.apply_layout).
+"""
+import struct
+import sys
+from array import array
+from collections import namedtuple
+
+LAYOUT_VERSION = 1
+# Version, number of regions
+HEADER = struct.Struct('<BI')
+CONFIDENCE_SCALE = 65535
+
+Region = namedtuple('Region', 'text x0 y0 x1 y1 confidence')
+
+
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+class OCRLayout:
+    """The text regions of one image: texts, boxes (x0, y0, x1, y1 per region) and confidences"""
+
+    def __init__(self, texts, boxes, confidences):
+        self.texts = texts
+        self.boxes = boxes  # array('H'), four values per region
+        self.confidences = confidences  # array('H'), confidence * CONFIDENCE_SCALE
+
+    @classmethod
+    def from_readtext(cls, results):
+        """Build from readtext() results: [(corner points, text, confidence), ...]"""
+        texts, boxes, confidences = [], array('H'), array('H')
+        for points, text, confidence in results:
+            xs = [point[0] for point in points]
+            ys = [point[1] for point in points]
+            boxes.extend(
+                min(max(int(round(value)), 0), 65535)
+                for value in (min(xs), min(ys), max(xs), max(ys))
+            )
+            texts.append(text)
+            confidences.append(int(round(min(max(float(confidence), 0.0), 1.0) * CONFIDENCE_SCALE)))
+        return cls(texts, boxes, confidences)
+
+    @property
+    def text(self):
+        """The texts one per line, as stored in original_ocr_text"""
+        if self.texts:
+            return "\n".join(self.texts)
+        return "No text could be extracted from the image by OCR."
+
+    def pack(self):
+        """Boxes and confidences as bytes for ProcessedReceipt.ocr_layout, texts are not included"""
+        return (
+            HEADER.pack(LAYOUT_VERSION, len(self.texts))
+            + _little_endian(self.boxes).tobytes()
+            + _little_endian(self.confidences).tobytes()
+        )
+
+    @classmethod
+    def unpack(cls, data, ocr_text):
+        """
+        Rebuild from pack() output and the stored OCR text. None if there is no
+        layout, or it does not belong to this text.
+        """
+        if not data or not ocr_text:
+            return None
+        data = bytes(data)
+        version, count = HEADER.unpack_from(data)
+        texts = ocr_text.split('\n')
+        if version != LAYOUT_VERSION or count != len(texts) or len(data) != HEADER.size + count * 10:
+            return None
+
+        boxes, confidences = array('H'), array('H')
+        boxes.frombytes(data[HEADER.size:HEADER.size + count * 8])
+        confidences.frombytes(data[HEADER.size + count * 8:])
+        return cls(texts, _little_endian(boxes), _little_endian(confidences))
+
+    def __len__(self):
+        return len(self.texts)
+
+    def regions(self):
+        """Get the regions in OCR order, confidences back in 0-1"""
+        boxes = self.boxes
+        return [
+            Region(text, *boxes[index * 4:index * 4 + 4], round(confidence / CONFIDENCE_SCALE, 4))
+            for index, (text, confidence) in enumerate(zip(self.texts, self.confidences))
+        ]
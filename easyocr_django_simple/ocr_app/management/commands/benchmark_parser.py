@@ -0,0 +1,281 @@
+import random
+import re
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ocr_app.simple_parser import parse_invoice_text
+
+COMPARED_FIELDS = [
+    'amount', 'currency', 'receipt_number', 'date', 'receiver_name',
+    'upi_transaction_id', 'type_of_expense', 'location',
+]
+
+VENDORS = [
+    'Blue Lagoon Cafe LTD', 'Acme Office INC', 'Sharma Wood DECOR', 'Green Leaf Restaurant LLC',
+    'City Taxi SERVICES', 'Northern Rail COMPANY', 'Shell Fuel CORP', 'Grand Hotel LTD',
+    'Pixel Tech SOLUTIONS', 'Corner Store', 'Metro Petrol Station', 'Swift Courier INC',
+]
+ITEMS = {
+    'meals': ['Paneer Tikka', 'Veg Thali', 'Cold Coffee', 'Dining charges', 'Food court meal'],
+    'travel': ['Flight BLR-DEL', 'Hotel stay 2 nights', 'Uber trip', 'Train ticket', 'Taxi fare'],
+    'fuel': ['Diesel 30L', 'Petrol 25L', 'Fuel surcharge'],
+    'other': ['A4 paper ream', 'Printer ink', 'Courier charges', 'USB cable', 'Stapler'],
+}
+LOCATIONS = ['Springfield, IL', 'Austin, TX', 'Peterborough PE1', 'Mumbai, MH', 'Cambridge PE29']
+SYMBOLS = ['$', '£', '€', '₹', '¥']
+CODES = ['USD', 'GBP', 'EUR', 'INR']
+
+
+def legacy_parse_invoice_text(ocr_text):
+    """The parser as it was before the single-pass rewrite: one re.search per rule, strptime per format"""
+    if not ocr_text:
+        return {"success": False, "error": "No OCR text provided"}
+
+    data = {field: None for field in COMPARED_FIELDS}
+    data.update(currency='USD', type_of_expense='other')
+
+    for pattern in [
+        r'[\$£€¥₹]\s*(\d+(?:\.\d{2})?)',
+        r'(\d+(?:\.\d{2})?)\s*[\$£€¥₹]',
+        r'TOTAL[:\s]*[\$£€¥₹]?\s*(\d+(?:\.\d{2})?)',
+        r'AMOUNT[:\s]*[\$£€¥₹]?\s*(\d+(?:\.\d{2})?)',
+        r'DUE[:\s]*[\$£€¥₹]?\s*(\d+(?:\.\d{2})?)',
+    ]:
+        match = re.search(pattern, ocr_text, re.IGNORECASE)
+        if match:
+            data['amount'] = Decimal(match.group(1))
+            break
+
+    for pattern, currency in [
+        (r'[\$]', 'USD'), (r'[£]', 'GBP'), (r'[€]', 'EUR'), (r'[¥]', 'JPY'), (r'[₹]', 'INR'),
+        (r'GBP', 'GBP'), (r'USD', 'USD'), (r'EUR', 'EUR'),
+    ]:
+        if re.search(pattern, ocr_text):
+            data['currency'] = currency
+            break
+
+    for pattern in [
+        r'INVOICE[:\s#]*(\w+)', r'RECEIPT[:\s#]*(\w+)', r'BILL[:\s#]*(\w+)', r'NO[:\s]*(\w+)', r'NUMBER[:\s]*(\w+)',
+    ]:
+        match = re.search(pattern, ocr_text, re.IGNORECASE)
+        if match:
+            data['receipt_number'] = match.group(1)
+            break
+
+    for pattern in [r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', r'(\d{4}[/-]\d{1,2}[/-]\d{1,2})', r'(\d{1,2}\s+\w+\s+\d{4})']:
+        match = re.search(pattern, ocr_text)
+        if match:
+            for fmt in ['%m/%d/%Y', '%d/%m/%Y', '%Y/%m/%d', '%d %B %Y', '%d %b %Y']:
+                try:
+                    data['date'] = datetime.strptime(match.group(1), fmt).date()
+                    break
+                except ValueError:
+                    continue
+            if data['date']:
+                break
+
+    for pattern in [
+        r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s+(?:LTD|LLC|INC|CORP|COMPANY)',
+        r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s+(?:WOOD|DECOR|SERVICES|SOLUTIONS)',
+    ]:
+        match = re.search(pattern, ocr_text)
+        if match:
+            data['receiver_name'] = match.group(1)
+            break
+
+    match = re.search(r'UPI[:\s]*([A-Z0-9]+)', ocr_text, re.IGNORECASE)
+    if match:
+        data['upi_transaction_id'] = match.group(1)
+
+    text_lower = ocr_text.lower()
+    if any(keyword in text_lower for keyword in ['flight', 'hotel', 'taxi', 'uber', 'train', 'travel', 'trip']):
+        data['type_of_expense'] = 'travel'
+    elif any(keyword in text_lower for keyword in ['restaurant', 'food', 'meal', 'dining', 'cafe']):
+        data['type_of_expense'] = 'meals'
+    elif any(keyword in text_lower for keyword in ['fuel', 'gas', 'petrol', 'diesel']):
+        data['type_of_expense'] = 'fuel'
+
+    for pattern in [r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*),\s*([A-Z]{2})', r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s+PE\d+']:
+        match = re.search(pattern, ocr_text)
+        if match:
+            data['location'] = match.group(0)
+            break
+
+    return {"success": True, "data": data}
+
+
+def format_date(rng, value):
+    return rng.choice([
+        value.strftime('%m/%d/%Y'),
+        value.strftime('%d/%m/%Y'),
+        value.strftime('%Y/%m/%d'),
+        value.strftime('%d %B %Y'),
+        value.strftime('%d %b %Y'),
+        value.strftime('%Y-%m-%d'),
+    ])
+
+
+def group_thousands(value):
+    """1234567.50 -> 1,234,567.50"""
+    return f'{value:,.2f}'
+
+
+def group_lakhs(value):
+    """1234567.50 -> 12,34,567.50, as amounts are written in India"""
+    whole, fraction = f'{value:.2f}'.split('.')
+    head, tail = whole[:-3], whole[-3:]
+    groups = []
+    while head:
+        groups.insert(0, head[-2:])
+        head = head[:-2]
+    return ','.join(groups + [tail]) + '.' + fraction
+
+
+def format_amount(rng, value):
+    return rng.choice([f'{value:.2f}', f'{value:.2f}', group_thousands(value)])
+
+
+def synthetic_receipt(rng):
+    """
+    OCR-like text of one made-up receipt, one detected text region per line,
+    and the amount and date it was made with
+    """
+    expense_type = rng.choice(list(ITEMS))
+    symbol = rng.choice(SYMBOLS)
+    lines = [rng.choice(VENDORS)]
+    if rng.random() < 0.7:
+        lines.append(rng.choice(LOCATIONS))
+    lines.append(f"{rng.choice(['Invoice', 'Receipt', 'Bill'])} {rng.choice(['#', 'No:', ':'])} "
+                 f"{rng.choice(['INV', 'R', ''])}{rng.randint(1000, 999999)}")
+    receipt_date = date(2023, 1, 1) + timedelta(days=rng.randint(0, 900))
+    lines.append(f"Date: {format_date(rng, receipt_date)}")
+    if rng.random() < 0.3:
+        lines.append(f"Time: {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}")
+
+    total = Decimal(0)
+    for _ in range(rng.randint(1, 8)):
+        price = Decimal(rng.randint(100, 50000)) / 100
+        if rng.random() < 0.1:
+            # Flights, hotel stays, equipment: totals in the lakhs
+            price *= 100
+        quantity = rng.randint(1, 4)
+        total += price * quantity
+        lines.append(f"{rng.choice(ITEMS[expense_type])} x{quantity} {price}")
+
+    tax = (total * Decimal('0.05')).quantize(Decimal('0.01'))
+    lines.append(f"Subtotal {format_amount(rng, total)}")
+    lines.append(f"Tax 5% {tax}")
+    total_line = rng.choice([
+        f"TOTAL: {symbol}{format_amount(rng, total + tax)}",
+        f"Total {format_amount(rng, total + tax)} {rng.choice(CODES)}",
+        f"Amount Due {format_amount(rng, total + tax)}",
+        f"Grand Total {format_amount(rng, total + tax)}{symbol}",
+        f"Amount: {group_thousands(total + tax)} INR",
+        f"TOTAL Rs. {group_lakhs(total + tax)}",
+    ])
+    lines.append(total_line)
+    if rng.random() < 0.4:
+        lines.append(f"Paid via UPI: {rng.randint(10 ** 11, 10 ** 12 - 1)}")
+    else:
+        lines.append(rng.choice(['Paid by card **** 4821', 'Cash', 'Thank you, visit again!']))
+    return '\n'.join(lines), {'amount': total + tax, 'date': receipt_date}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time parse_invoice_text over a corpus of synthetic receipts, compare its results "
+        "with the previous parser, and fail if it is not the given factor faster. Both are "
+        "timed on the same machine in the same run, so the check holds on slow CI runners too."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--receipts',
+            type=int,
+            default=5000,
+            help='Number of synthetic receipts in the corpus (default 5000)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Passes over the corpus, the best one counts (default 3)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for the corpus'
+        )
+        parser.add_argument(
+            '--min-speedup',
+            type=float,
+            default=1.5,
+            help='Smallest acceptable speed-up of the current parser over the legacy one (default 1.5)'
+        )
+        parser.add_argument(
+            '--show-differences',
+            type=int,
+            default=0,
+            help='Print up to this many receipts where the two parsers disagree'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        corpus, expected = zip(*[synthetic_receipt(rng) for _ in range(options['receipts'])])
+        self.stdout.write(
+            f"Corpus: {len(corpus)} receipts, {sum(map(len, corpus)) / len(corpus):.0f} characters on average"
+        )
+
+        current, current_rate = self.time_parser(parse_invoice_text, corpus, options['repeat'])
+        legacy, legacy_rate = self.time_parser(legacy_parse_invoice_text, corpus, options['repeat'])
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Throughput"))
+        self.stdout.write(f"  current parser  {current_rate:>10,.0f} receipts/s")
+        self.stdout.write(f"  legacy parser   {legacy_rate:>10,.0f} receipts/s")
+        self.stdout.write(f"  speed-up        {current_rate / legacy_rate:>10.1f}x")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Agreement with the legacy parser"))
+        disagreements = Counter()
+        shown = 0
+        for text, new, old in zip(corpus, current, legacy):
+            fields = [field for field in COMPARED_FIELDS if new['data'][field] != old['data'][field]]
+            disagreements.update(fields)
+            if fields and shown < options['show_differences']:
+                shown += 1
+                self.stdout.write(f"  --- {text!r}")
+                for field in fields:
+                    self.stdout.write(f"      {field}: {old['data'][field]!r} -> {new['data'][field]!r}")
+        for field in COMPARED_FIELDS:
+            agreed = len(corpus) - disagreements[field]
+            self.stdout.write(f"  {field:<20} {agreed / len(corpus):>8.1%}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Correct on the synthetic receipts (current / legacy)"))
+        for field in ['amount', 'date']:
+            right = [
+                sum(result['data'][field] == truth[field] for result, truth in zip(results, expected)) / len(corpus)
+                for results in (current, legacy)
+            ]
+            self.stdout.write(f"  {field:<20} {right[0]:>8.1%} {right[1]:>8.1%}")
+
+        speedup = current_rate / legacy_rate
+        if speedup < options['min_speedup']:
+            raise CommandError(
+                f"The current parser is {speedup:.1f}x as fast as the legacy one, "
+                f"below the required {options['min_speedup']:.1f}x"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Speed-up of at least {options['min_speedup']:.1f}x met"))
+
+    def time_parser(self, parse, corpus, repeat):
+        """Parse the corpus repeat times, return the results and the best receipts/sec"""
+        best = None
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            results = [parse(text) for text in corpus]
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return results, len(corpus) / best
@@ -0,0 +1,191 @@
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+from difflib import SequenceMatcher
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from ocr_app.layout import OCRLayout
+from ocr_app.ocr_engine import get_ocr_reader, prepare_image
+from ocr_app.preprocessing import PROFILES
+
+from .benchmark_parser import synthetic_receipt
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff')
+# A 12MP phone photo, portrait
+PHOTO_SIZE = (3024, 4032)
+
+
+def synthetic_photo(rng, path):
+    """
+    Photo-like image of a made-up receipt: printed on white paper, tilted a
+    little, lying on a darker table, sometimes stored sideways with an EXIF
+    orientation tag. Returns the receipt's text.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    text, _ = synthetic_receipt(rng)
+    lines = text.split('\n')
+    try:
+        font = ImageFont.load_default(size=36)
+    except TypeError:  # Pillow < 10.1, the small bitmap font is scaled up below
+        font = ImageFont.load_default()
+    line_height = int(font.getbbox('Ag')[3] * 1.6)
+    width = max(int(font.getlength(line)) for line in lines) + line_height * 2
+    paper = Image.new('RGBA', (width, line_height * (len(lines) + 2)), (250, 248, 240, 255))
+    draw = ImageDraw.Draw(paper)
+    for number, line in enumerate(lines, 1):
+        draw.text((line_height, line_height * number), line, fill=(20, 20, 20, 255), font=font)
+
+    scale = min(PHOTO_SIZE[0] * 0.8 / paper.width, PHOTO_SIZE[1] * 0.75 / paper.height)
+    paper = paper.resize((int(paper.width * scale), int(paper.height * scale)), Image.BICUBIC)
+    paper = paper.rotate(rng.uniform(-4, 4), resample=Image.BICUBIC, expand=True)
+
+    table = tuple(rng.randint(60, 120) for _ in range(3))
+    photo = Image.new('RGB', PHOTO_SIZE, table)
+    photo.paste(paper, (
+        (PHOTO_SIZE[0] - paper.width) // 2 + rng.randint(-100, 100),
+        (PHOTO_SIZE[1] - paper.height) // 2 + rng.randint(-100, 100),
+    ), paper)
+
+    exif = Image.Exif()
+    if rng.random() < 0.5:
+        # Stored sideways, as phones do, with the tag saying how to turn it upright
+        photo = photo.transpose(Image.Transpose.ROTATE_90)
+        exif[0x0112] = 6
+    photo.save(path, quality=90, exif=exif)
+    return text
+
+
+def normalise(text):
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run OCR over a set of receipt photos once per preprocessing profile and report "
+        "the time taken and how much of the expected text was read. Fixtures are images "
+        "with a .txt file of the same name holding their text; without --fixtures, "
+        "synthetic 12MP receipt photos are generated."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fixtures',
+            help='Directory of receipt images and their expected text (name.jpg + name.txt)'
+        )
+        parser.add_argument(
+            '--synthetic',
+            type=int,
+            default=6,
+            help='Number of synthetic photos to generate when no --fixtures are given (default 6)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for the synthetic photos'
+        )
+        parser.add_argument(
+            '--profiles',
+            nargs='+',
+            choices=list(PROFILES),
+            default=list(PROFILES),
+            help='Profiles to compare (default all). Speed-ups are relative to the first one'
+        )
+
+    def handle(self, *args, **options):
+        workdir = None
+        try:
+            if options['fixtures']:
+                fixtures = self.load_fixtures(options['fixtures'])
+            else:
+                workdir = tempfile.mkdtemp(prefix='ocr_fixtures_')
+                rng = random.Random(options['seed'])
+                self.stdout.write(f"Generating {options['synthetic']} synthetic receipt photos...")
+                fixtures = []
+                for number in range(options['synthetic']):
+                    path = os.path.join(workdir, f'receipt_{number}.jpg')
+                    fixtures.append((path, synthetic_photo(rng, path)))
+            if not fixtures:
+                raise CommandError("No fixtures to run on")
+
+            started = time.perf_counter()
+            reader = get_ocr_reader()
+            self.stdout.write(f"OCR model loaded in {time.perf_counter() - started:.2f}s")
+            # The first recognition is slower, keep it out of the numbers
+            import numpy  # Installed with easyocr
+            reader.readtext(numpy.full((64, 256, 3), 255, dtype=numpy.uint8))
+
+            results = {}
+            for profile in options['profiles']:
+                self.stdout.write(f"Profile {profile!r}...")
+                results[profile] = self.run_profile(profile, fixtures)
+        finally:
+            if workdir:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        baseline = results[options['profiles'][0]]
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Per image, mean of {len(fixtures)} ({options['profiles'][0]!r} is the baseline)"
+        ))
+        self.stdout.write(
+            f"  {'profile':<10} {'size':>10} {'prepare':>9} {'OCR':>9} {'total':>9} "
+            f"{'CPU':>8} {'speed-up':>9} {'accuracy':>9}"
+        )
+        for profile, result in results.items():
+            self.stdout.write(
+                f"  {profile:<10} {result['megapixels']:>8.1f}MP {result['prepare'] * 1000:>7.0f}ms "
+                f"{result['ocr'] * 1000:>7.0f}ms {result['total'] * 1000:>7.0f}ms {result['cpu']:>7.2f}s "
+                f"{baseline['cpu'] / result['cpu'] if result['cpu'] else 0:>8.1f}x {result['accuracy']:>9.1%}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            "Accuracy is the character similarity of the OCR text to the expected text"
+        ))
+
+    def load_fixtures(self, directory):
+        """(image path, expected text) for every image in the directory with a text file next to it"""
+        if not os.path.isdir(directory):
+            raise CommandError(f"Fixture directory {directory} does not exist")
+        fixtures = []
+        for name in sorted(os.listdir(directory)):
+            stem, extension = os.path.splitext(name)
+            expected = os.path.join(directory, stem + '.txt')
+            if extension.lower() not in IMAGE_EXTENSIONS:
+                continue
+            if not os.path.exists(expected):
+                self.stdout.write(self.style.WARNING(f"  Skipping {name}, no {stem}.txt"))
+                continue
+            with open(expected, encoding='utf-8') as text_file:
+                fixtures.append((os.path.join(directory, name), text_file.read()))
+        return fixtures
+
+    def run_profile(self, profile, fixtures):
+        """Preprocess and OCR every fixture with the profile, returning the mean timings and accuracy"""
+        totals = {'megapixels': 0.0, 'prepare': 0.0, 'ocr': 0.0, 'total': 0.0, 'cpu': 0.0, 'accuracy': 0.0}
+        reader = get_ocr_reader()
+        with override_settings(OCR_PREPROCESS_PROFILE=profile):
+            for path, expected in fixtures:
+                cpu_started = time.process_time()
+                started = time.perf_counter()
+                image, size = prepare_image(path)
+                prepared = time.perf_counter()
+                layout = OCRLayout.from_readtext(
+                    reader.readtext(image, batch_size=settings.OCR_RECOGNITION_BATCH_SIZE)
+                )
+                finished = time.perf_counter()
+
+                totals['megapixels'] += size[0] * size[1] / 1e6
+                totals['prepare'] += prepared - started
+                totals['ocr'] += finished - prepared
+                totals['total'] += finished - started
+                totals['cpu'] += time.process_time() - cpu_started
+                totals['accuracy'] += SequenceMatcher(
+                    None, normalise(expected), normalise(layout.text), autojunk=False
+                ).ratio()
+        return {name: total / len(fixtures) for name, total in totals.items()}
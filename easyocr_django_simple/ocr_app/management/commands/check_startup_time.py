@@ -0,0 +1,86 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ocr_app.ocr_engine import HEAVY_MODULES
+
+# Run in a fresh interpreter: time django.setup() plus loading every URLconf
+# (which imports all views), and report which heavy modules got imported
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver, resolve
+get_resolver().url_patterns
+resolve(sys.argv[1])
+elapsed = time.perf_counter() - started
+heavy = [name for name in sys.argv[2:] if name in sys.modules]
+print(json.dumps({'elapsed': elapsed, 'heavy': heavy}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how long django.setup() and URL resolution take in a fresh process "
+        "and fail if it exceeds the budget or imports the OCR/LLM libraries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--budget-ms',
+            type=float,
+            default=1000,
+            help='Largest acceptable median startup time in milliseconds (default 1000)'
+        )
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=5,
+            help='Number of fresh processes to time (default 5)'
+        )
+        parser.add_argument(
+            '--url',
+            default='/',
+            help='Path to resolve after setup (default /)'
+        )
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        timings, heavy = [], set()
+
+        for _ in range(max(options['runs'], 1)):
+            completed = subprocess.run(
+                [sys.executable, '-c', STARTUP_SCRIPT, options['url'], *HEAVY_MODULES],
+                cwd=settings.BASE_DIR,
+                env=env,
+                capture_output=True,
+                text=True
+            )
+            if completed.returncode != 0:
+                raise CommandError(f"Startup failed:\n{completed.stderr}")
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            timings.append(result['elapsed'] * 1000)
+            heavy.update(result['heavy'])
+
+        median = statistics.median(timings)
+        self.stdout.write(
+            f"django.setup() + URL resolution over {len(timings)} run(s): "
+            f"min {min(timings):.0f}ms, median {median:.0f}ms, max {max(timings):.0f}ms "
+            f"(budget {options['budget_ms']:.0f}ms)"
+        )
+
+        problems = []
+        if heavy:
+            problems.append(f"heavy modules imported at startup: {', '.join(sorted(heavy))}")
+        if median > options['budget_ms']:
+            problems.append(f"median startup {median:.0f}ms is over the {options['budget_ms']:.0f}ms budget")
+        if problems:
+            raise CommandError('; '.join(problems))
+
+        self.stdout.write(self.style.SUCCESS("Startup is within budget"))
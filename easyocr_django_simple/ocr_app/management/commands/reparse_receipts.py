@@ -0,0 +1,182 @@
+import json
+import multiprocessing
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from ocr_app.models import ExpenseEntry
+from ocr_app.simple_parser import parse_invoice_text, parse_stored_receipt
+
+# The expense entry fields the parser fills in
+PARSED_FIELDS = list(parse_invoice_text('-')['data'])
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-run the receipt parser over the stored OCR text of processed receipts and "
+        "update their expense entries, e.g. after the parsing rules changed. Entries are "
+        "streamed in primary key order, parsed in a pool of processes and written back "
+        "in batches. An interrupted run resumes from its checkpoint file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Parser processes (default one per CPU)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Entries read, parsed and written back at a time (default 2000)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Entries per UPDATE statement (default 200)'
+        )
+        parser.add_argument(
+            '--fields',
+            nargs='+',
+            choices=PARSED_FIELDS,
+            default=PARSED_FIELDS,
+            metavar='FIELD',
+            help='Only update these fields, e.g. to keep manual corrections elsewhere (default all parsed fields)'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(settings.BASE_DIR, 'reparse_receipts.checkpoint.json'),
+            help='Progress file, resumed from if it exists and removed when the run completes'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore an existing checkpoint and start from the first entry'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count the entries that would change without writing anything'
+        )
+
+    def handle(self, *args, **options):
+        fields = options['fields']
+        chunk_size = max(options['chunk_size'], 1)
+        processes = max(options['processes'], 1)
+
+        progress = {'last_id': None, 'scanned': 0, 'updated': 0, 'unchanged': 0, 'failed': 0}
+        if os.path.exists(options['checkpoint']) and not options['restart']:
+            with open(options['checkpoint']) as checkpoint:
+                progress.update(json.load(checkpoint))
+            self.stdout.write(f"Resuming after entry {progress['last_id']} ({progress['scanned']} already scanned)")
+
+        entries = ExpenseEntry.objects.filter(
+            receipt__status='processed',
+            receipt__original_ocr_text__gt=''
+        )
+        if progress['last_id']:
+            entries = entries.filter(pk__gt=progress['last_id'])
+        remaining = entries.count()
+        self.stdout.write(
+            f"Re-parsing {remaining} expense entries with {processes} process(es), "
+            f"{chunk_size} at a time{' (dry run)' if options['dry_run'] else ''}..."
+        )
+
+        rows = entries.order_by('pk').values(
+            'pk', 'receipt__original_ocr_text', 'receipt__ocr_layout', *fields
+        ).iterator(chunk_size=chunk_size)
+        chunks = iter(lambda: list(islice(rows, chunk_size)), [])
+
+        scanned = 0
+        started = time.perf_counter()
+        # The parser processes must not inherit the database connection
+        connections.close_all()
+        with multiprocessing.get_context().Pool(processes) as pool:
+            # Parse the next chunk while the previous one is written back
+            pending = None
+            for chunk in chunks:
+                parsing = pool.starmap_async(
+                    parse_stored_receipt,
+                    [
+                        # Some databases return binary data as memoryviews, which can't be pickled
+                        (row['receipt__original_ocr_text'], bytes(row['receipt__ocr_layout'] or b''))
+                        for row in chunk
+                    ],
+                    chunksize=max(len(chunk) // (processes * 4), 1)
+                )
+                if pending is not None:
+                    scanned += self.write_back(*pending, fields, progress, options)
+                    self.report(scanned, remaining, started)
+                pending = (chunk, parsing)
+            if pending is not None:
+                scanned += self.write_back(*pending, fields, progress, options)
+                self.report(scanned, remaining, started)
+
+        elapsed = time.perf_counter() - started
+        if not options['dry_run'] and os.path.exists(options['checkpoint']):
+            os.remove(options['checkpoint'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {progress['scanned']} entries: {progress['updated']} "
+            f"{'would change' if options['dry_run'] else 'updated'}, {progress['unchanged']} unchanged, "
+            f"{progress['failed']} failed to parse. This run: {scanned} in {elapsed:.1f}s "
+            f"({scanned / elapsed if elapsed else 0:,.0f}/s)"
+        ))
+
+    def write_back(self, chunk, parsing, fields, progress, options):
+        """Save the chunk's changed entries and the checkpoint. Returns the number of entries scanned"""
+        changed, changed_fields = [], set()
+        for row, result in zip(chunk, parsing.get()):
+            if not result['success']:
+                progress['failed'] += 1
+                continue
+            values = {field: result['data'][field] for field in fields}
+            differences = {field for field, value in values.items() if row[field] != value}
+            if not differences:
+                progress['unchanged'] += 1
+                continue
+            changed_fields |= differences
+            # Only the primary key and the updated fields are used by bulk_update()
+            changed.append(ExpenseEntry(pk=row['pk'], **values))
+
+        if changed and not options['dry_run']:
+            try:
+                with transaction.atomic():
+                    # A rule change usually touches a few fields, and the cost of
+                    # bulk_update() grows with the number of fields set
+                    ExpenseEntry.objects.bulk_update(
+                        changed,
+                        [field for field in fields if field in changed_fields],
+                        batch_size=max(options['batch_size'], 1)
+                    )
+            except Exception as e:
+                raise CommandError(
+                    f"Writing back {len(changed)} entries failed: {e}. "
+                    f"Fix the cause and run the command again to resume from the last checkpoint."
+                )
+
+        progress['updated'] += len(changed)
+        progress['scanned'] += len(chunk)
+        progress['last_id'] = str(chunk[-1]['pk'])
+        if not options['dry_run']:
+            # Written after the commit: at worst a resumed run re-parses one chunk
+            temporary = options['checkpoint'] + '.tmp'
+            with open(temporary, 'w') as checkpoint:
+                json.dump(progress, checkpoint)
+            os.replace(temporary, options['checkpoint'])
+        return len(chunk)
+
+    def report(self, scanned, remaining, started):
+        elapsed = time.perf_counter() - started
+        rate = scanned / elapsed if elapsed else 0
+        eta = (remaining - scanned) / rate if rate else 0
+        self.stdout.write(
+            f"  {scanned}/{remaining} ({scanned / remaining if remaining else 1:.0%}) "
+            f"{rate:,.0f} entries/s, about {eta:.0f}s left"
+        )
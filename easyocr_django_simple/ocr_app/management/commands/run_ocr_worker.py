@@ -0,0 +1,112 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ocr_app.models import ProcessedReceipt
+from ocr_app.tasks import claim_next_receipts, release_receipts, requeue_stale_receipts
+from ocr_app.worker_pool import OCRWorkerPool
+
+
+class Command(BaseCommand):
+    help = (
+        "Process queued receipts (OCR + parsing) in a pool of OCR processes, each "
+        "loading the model once. Run with OCR_QUEUE_MODE=worker so web processes "
+        "never load it; in 'thread' mode it can still finish receipts left queued "
+        "by a restart."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=settings.OCR_WORKER_PROCESSES,
+            help='Number of OCR processes (default OCR_WORKER_PROCESSES)'
+        )
+        parser.add_argument(
+            '--torch-threads',
+            type=int,
+            default=settings.OCR_TORCH_THREADS,
+            help="Torch threads per process, 0 for the process's share of the cores"
+        )
+        parser.add_argument(
+            '--no-pin-cores',
+            action='store_false',
+            dest='pin_cores',
+            default=settings.OCR_PIN_CORES,
+            help='Do not pin each process to its share of the cores'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.OCR_BATCH_SIZE,
+            help='Receipts handed to a process at a time and OCRed together (default OCR_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for more receipts'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait between checks of an empty queue (default 1.0)'
+        )
+
+    def handle(self, *args, **options):
+        processes = max(options['processes'], 1)
+        processed = 0
+        started = time.perf_counter()
+
+        pool = OCRWorkerPool(processes, options['torch_threads'] or None, options['pin_cores'])
+        self.stdout.write(f"Starting {processes} OCR process(es)...")
+        pids = pool.start()
+        self.stdout.write(f"{len(pids)} OCR process(es) ready in {time.perf_counter() - started:.1f}s, "
+                          f"waiting for receipts...")
+        started = time.perf_counter()
+
+        try:
+            while True:
+                # Long-running loop, drop connections the database has closed
+                close_old_connections()
+
+                requeued, failed = requeue_stale_receipts()
+                if requeued or failed:
+                    self.stdout.write(self.style.WARNING(
+                        f"Requeued {requeued} stale receipt(s), gave up on {failed}"
+                    ))
+
+                # Keep every process busy
+                while pool.has_capacity():
+                    receipt_ids = claim_next_receipts(max(options['batch_size'], 1))
+                    if not receipt_ids:
+                        break
+                    pool.submit(receipt_ids)
+
+                if not pool.in_flight:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                for receipt_id, stored, error in pool.wait(timeout=options['poll_interval']):
+                    if error is not None:
+                        # The job or its process died, hand the receipt out again
+                        release_receipts(ProcessedReceipt.objects.filter(pk=receipt_id))
+                        self.stdout.write(self.style.ERROR(f"Receipt {receipt_id} failed: {error}"))
+                    elif stored:
+                        processed += 1
+                    else:
+                        self.stdout.write(self.style.WARNING(f"Lost receipt {receipt_id} to another worker"))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.shutdown()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"OCR worker stopped after {processed} receipt(s) in {elapsed:.1f}s "
+            f"({processed / elapsed if elapsed else 0:.2f}/s)"
+        ))
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ocr_app.ocr_engine import get_ocr_reader
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the OCR model ahead of the first receipt: downloads the model files "
+        "if needed (useful at deploy time) and runs one recognition to warm it up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--image',
+            help='Image to run the warm-up recognition on (default: a blank image)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        reader = get_ocr_reader()
+        self.stdout.write(f"OCR model loaded in {time.perf_counter() - started:.2f}s")
+
+        if options['image']:
+            image = options['image']
+        else:
+            import numpy  # Installed with easyocr
+            image = numpy.full((64, 256, 3), 255, dtype=numpy.uint8)
+
+        started = time.perf_counter()
+        try:
+            results = reader.readtext(image)
+        except Exception as e:
+            raise CommandError(f"Warm-up recognition failed: {e}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Warm-up recognition found {len(results)} line(s) in {time.perf_counter() - started:.2f}s"
+        ))
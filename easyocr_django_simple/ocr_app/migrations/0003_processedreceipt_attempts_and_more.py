@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ocr_app", "0002_expenseentry_processedreceipt_delete_ocrresult_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(
+                default=0, help_text="Times an OCR worker has picked this receipt up"
+            ),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="started_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="processedreceipt",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("ocr_pending", "Waiting for OCR"),
+                    ("llm_pending", "Extracting Details"),
+                    ("processing", "Processing"),
+                    ("processed", "Processed"),
+                    ("error", "Error"),
+                    ("file_error", "File Error"),
+                    ("processing_error", "Processing Error"),
+                    ("failed", "Failed"),
+                ],
+                default="pending",
+                help_text="Current processing status",
+                max_length=50,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="processedreceipt",
+            index=models.Index(
+                fields=["status", "uploaded_at"], name="receipt_status_uploaded_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ocr_app", "0003_processedreceipt_attempts_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReceiptBatch",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Receipt Batch",
+                "verbose_name_plural": "Receipt Batches",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="batch",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Batch upload this receipt came in with, if any",
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="receipts",
+                to="ocr_app.receiptbatch",
+            ),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ocr_app", "0004_receiptbatch_processedreceipt_batch"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                help_text="SHA-256 of the uploaded file",
+                max_length=64,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="duplicate_of",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Earlier upload of the same or a near-identical receipt (likely double claim)",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="duplicates",
+                to="ocr_app.processedreceipt",
+            ),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="ocr_cache_hit",
+            field=models.BooleanField(
+                default=False,
+                help_text="OCR results were copied from an identical earlier upload",
+            ),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="perceptual_hash",
+            field=models.CharField(
+                blank=True,
+                help_text="Difference hash of the image, matches resized or re-encoded copies",
+                max_length=64,
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ocr_app", "0005_processedreceipt_content_hash_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="expenseentry",
+            name="amount_confidence",
+            field=models.FloatField(
+                blank=True, help_text="Confidence in the amount", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="expenseentry",
+            name="date_confidence",
+            field=models.FloatField(
+                blank=True, help_text="Confidence in the date", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="expenseentry",
+            name="merchant_confidence",
+            field=models.FloatField(
+                blank=True, help_text="Confidence in the vendor name", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="ocr_layout",
+            field=models.BinaryField(
+                blank=True,
+                help_text="Packed OCR text region boxes and confidences",
+                null=True,
+            ),
+        ),
+    ]
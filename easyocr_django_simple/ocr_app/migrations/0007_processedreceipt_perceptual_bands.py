@@ -0,0 +1,111 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:10
+
+from django.db import migrations, models
+
+
+def backfill_perceptual_bands(apps, schema_editor):
+    ProcessedReceipt = apps.get_model("ocr_app", "ProcessedReceipt")
+    fields = [f"perceptual_band_{band}" for band in range(16)]
+
+    receipts = ProcessedReceipt.objects.filter(perceptual_hash__isnull=False).only(
+        "id", "perceptual_hash"
+    )
+    updated = []
+    for receipt in receipts.iterator(chunk_size=1000):
+        for band, field in enumerate(fields):
+            setattr(receipt, field, int(receipt.perceptual_hash[band * 4:band * 4 + 4], 16))
+        updated.append(receipt)
+        if len(updated) == 1000:
+            ProcessedReceipt.objects.bulk_update(updated, fields)
+            updated = []
+    ProcessedReceipt.objects.bulk_update(updated, fields)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ocr_app", "0006_expenseentry_amount_confidence_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="perceptual_band_0",
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="perceptual_band_1",
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="perceptual_band_10",
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="perceptual_band_11",
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="perceptual_band_12",
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="perceptual_band_13",
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="perceptual_band_14",
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="perceptual_band_15",
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="perceptual_band_2",
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="perceptual_band_3",
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="perceptual_band_4",
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="perceptual_band_5",
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="perceptual_band_6",
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="perceptual_band_7",
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="perceptual_band_8",
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="processedreceipt",
+            name="perceptual_band_9",
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_perceptual_bands, migrations.RunPython.noop),
+    ]
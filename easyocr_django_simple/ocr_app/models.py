@@ -4,19 +4,52 @@ from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
 
+# A stack of receipts uploaded together through the batch API
+class ReceiptBatch(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Receipt Batch"
+        verbose_name_plural = "Receipt Batches"
+
+    def __str__(self):
+        return f"Batch {self.id}"
+
 # Model to store OCR Result details (renamed from OCRResult to avoid confusion)
 class ProcessedReceipt(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
+        ('ocr_pending', 'Waiting for OCR'),
+        ('llm_pending', 'Extracting Details'),
         ('processing', 'Processing'),
         ('processed', 'Processed'),
         ('error', 'Error'),
+        ('file_error', 'File Error'),
+        ('processing_error', 'Processing Error'),
         ('failed', 'Failed'),
     ]
+    # Statuses of a receipt still queued or being worked on by an OCR worker
+    ACTIVE_STATUSES = ('ocr_pending', 'llm_pending')
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    batch = models.ForeignKey(
+        ReceiptBatch,
+        on_delete=models.CASCADE,
+        related_name='receipts',
+        null=True,
+        blank=True,
+        help_text="Batch upload this receipt came in with, if any"
+    )
     # The raw text from OCR before LLM processing
     original_ocr_text = models.TextField(help_text="Raw OCR text extracted from the receipt")
+    # Box and confidence of each line of original_ocr_text, see layout.py
+    ocr_layout = models.BinaryField(
+        null=True,
+        blank=True,
+        help_text="Packed OCR text region boxes and confidences"
+    )
     # Path to the actual uploaded image (if you decide to store it for auditing)
     receipt_image = models.ImageField(
         upload_to='receipt_images/%Y/%m/%d/', 
@@ -47,15 +80,69 @@ class ProcessedReceipt(models.Model):
     # Processing timestamps
     processed_at = models.DateTimeField(null=True, blank=True)
     processing_time_seconds = models.FloatField(null=True, blank=True)
+    # Set when a worker claims the receipt, cleared if the job is requeued
+    started_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0, help_text="Times an OCR worker has picked this receipt up")
+    # Image fingerprints for duplicate detection, see dedupe.py
+    content_hash = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text="SHA-256 of the uploaded file"
+    )
+    perceptual_hash = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        help_text="Difference hash of the image, matches resized or re-encoded copies"
+    )
+    # The perceptual hash in 16 bands of 16 bits, indexed to find near-duplicates by band
+    perceptual_band_0 = models.IntegerField(null=True, blank=True, db_index=True)
+    perceptual_band_1 = models.IntegerField(null=True, blank=True, db_index=True)
+    perceptual_band_2 = models.IntegerField(null=True, blank=True, db_index=True)
+    perceptual_band_3 = models.IntegerField(null=True, blank=True, db_index=True)
+    perceptual_band_4 = models.IntegerField(null=True, blank=True, db_index=True)
+    perceptual_band_5 = models.IntegerField(null=True, blank=True, db_index=True)
+    perceptual_band_6 = models.IntegerField(null=True, blank=True, db_index=True)
+    perceptual_band_7 = models.IntegerField(null=True, blank=True, db_index=True)
+    perceptual_band_8 = models.IntegerField(null=True, blank=True, db_index=True)
+    perceptual_band_9 = models.IntegerField(null=True, blank=True, db_index=True)
+    perceptual_band_10 = models.IntegerField(null=True, blank=True, db_index=True)
+    perceptual_band_11 = models.IntegerField(null=True, blank=True, db_index=True)
+    perceptual_band_12 = models.IntegerField(null=True, blank=True, db_index=True)
+    perceptual_band_13 = models.IntegerField(null=True, blank=True, db_index=True)
+    perceptual_band_14 = models.IntegerField(null=True, blank=True, db_index=True)
+    perceptual_band_15 = models.IntegerField(null=True, blank=True, db_index=True)
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        related_name='duplicates',
+        null=True,
+        blank=True,
+        help_text="Earlier upload of the same or a near-identical receipt (likely double claim)"
+    )
+    ocr_cache_hit = models.BooleanField(
+        default=False,
+        help_text="OCR results were copied from an identical earlier upload"
+    )
 
     class Meta:
         ordering = ['-uploaded_at']
         verbose_name = "Processed Receipt"
         verbose_name_plural = "Processed Receipts"
+        indexes = [
+            # Workers look for the oldest queued receipts
+            models.Index(fields=['status', 'uploaded_at'], name='receipt_status_uploaded_idx'),
+        ]
 
     def __str__(self):
         return f"Receipt {self.id} - {self.status}"
 
+    @property
+    def is_final(self):
+        return self.status not in self.ACTIVE_STATUSES
+
 # Model to store the structured expense data from the LLM
 class ExpenseEntry(models.Model):
     EXPENSE_TYPE_CHOICES = [
@@ -140,6 +227,11 @@ class ExpenseEntry(models.Model):
     project_code = models.CharField(max_length=100, null=True, blank=True, help_text="Project code if applicable")
     location = models.CharField(max_length=255, null=True, blank=True, help_text="Location where expense occurred")
 
+    # How sure the parser is of the key fields, 0-1 (None when not found or no OCR layout)
+    amount_confidence = models.FloatField(null=True, blank=True, help_text="Confidence in the amount")
+    date_confidence = models.FloatField(null=True, blank=True, help_text="Confidence in the date")
+    merchant_confidence = models.FloatField(null=True, blank=True, help_text="Confidence in the vendor name")
+
     # Travel-specific fields
     travel_mode = models.CharField(
         max_length=100, 
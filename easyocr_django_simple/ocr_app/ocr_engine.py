@@ -0,0 +1,94 @@
+# ocr_app/ocr_engine.py
+"""
+Lazily initialised OCR engine.
+
+Importing easyocr pulls in torch, and building the reader loads the detection
+and recognition models: seconds of CPU and hundreds of MB per process. Nothing
+here runs at import time, so URL loading, `migrate`, `check`, tests and web
+worker boots never pay for it. The reader is built by the first
+get_ocr_reader() call, or ahead of time with `python manage.py warm_ocr`.
+"""
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+
+from .layout import OCRLayout
+from .preprocessing import get_profile, preprocess_image
+
+# Must not be imported while Django starts up, see `manage.py check_startup_time`
+HEAVY_MODULES = ('easyocr', 'torch', 'cv2', 'langchain', 'langchain_openai')
+
+# Singleton reader, initialized lazily like get_llm_processor()
+ocr_reader = None
+_lock = threading.Lock()
+
+def get_ocr_reader():
+    global ocr_reader
+    if ocr_reader is None:
+        # Several worker threads may ask for it at once, only build it once
+        with _lock:
+            if ocr_reader is None:
+                import easyocr
+                ocr_reader = easyocr.Reader(settings.OCR_LANGUAGES, gpu=settings.OCR_USE_GPU)
+    return ocr_reader
+
+def prepare_image(filepath):
+    """
+    Preprocess an image file as OCR_PREPROCESS_PROFILE says (see preprocessing.py).
+    Returns what to give EasyOCR, an array or the file itself with the 'off'
+    profile, and its size.
+    """
+    from PIL import Image
+
+    profile = get_profile()
+    if profile is None:
+        with Image.open(filepath) as image:
+            return filepath, image.size
+    import numpy  # Comes with easyocr
+
+    image = preprocess_image(filepath, profile)
+    return numpy.asarray(image), image.size
+
+def _read(image):
+    return OCRLayout.from_readtext(get_ocr_reader().readtext(image, batch_size=settings.OCR_RECOGNITION_BATCH_SIZE))
+
+def read_layout(filepath):
+    """Preprocess and OCR an image file, returning its text regions as an OCRLayout"""
+    return _read(prepare_image(filepath)[0])
+
+def read_layouts(filepaths):
+    """
+    Preprocess and OCR many image files, returning their OCRLayouts in the same order.
+
+    Images of one size go through readtext_batched() together, so the text
+    detector runs once per group instead of once per image. Preprocessed
+    receipts are padded to a few common sizes for this, unpreprocessed ones
+    group when they come from the same phone. Other images, or a group the
+    batched call fails on, are read one by one.
+    """
+    groups = defaultdict(list)
+    images = []
+    for index, filepath in enumerate(filepaths):
+        image, size = prepare_image(filepath)
+        images.append(image)
+        groups[size].append(index)
+
+    reader = get_ocr_reader()
+    layouts = [None] * len(filepaths)
+    for indexes in groups.values():
+        if len(indexes) > 1:
+            try:
+                batch_results = reader.readtext_batched(
+                    [images[index] for index in indexes],
+                    batch_size=settings.OCR_RECOGNITION_BATCH_SIZE
+                )
+            except Exception:
+                batch_results = None
+            if batch_results is not None:
+                for index, results in zip(indexes, batch_results):
+                    layouts[index] = OCRLayout.from_readtext(results)
+                continue
+        for index in indexes:
+            layouts[index] = _read(images[index])
+    return layouts
@@ -0,0 +1,194 @@
+# ocr_app/preprocessing.py
+"""
+Image preprocessing before OCR.
+
+Phone photos of receipts are 12MP or more, most of it table or background,
+often sideways or a little tilted. EasyOCR works on whatever it is given:
+decoding the full photo, detecting text over all of it and recognising every
+crop at full resolution costs several times the CPU the text needs. Each
+profile below says what to do to an image first:
+
+- max_side: downscale so the longer side of the receipt is at most this many
+  pixels. JPEGs are decoded at 1/2, 1/4 or 1/8 size when that is still
+  large enough (Image.draft), which saves most of the decoding.
+- grayscale: EasyOCR's models read grayscale anyway.
+- crop: cut away the background around the receipt, found as the largest
+  bright area of the photo.
+- deskew: straighten text lines tilted by up to MAX_SKEW_DEGREES.
+- pad_to: pad with white up to a multiple of this many pixels, so receipts
+  of about the same size can still be OCRed as one batch (see
+  ocr_engine.read_layouts).
+
+The EXIF orientation is always applied. OCR_PREPROCESS_PROFILE picks the
+profile, 'off' hands the file to EasyOCR untouched. Text boxes in the OCR
+layout are in the coordinates of the preprocessed image.
+"""
+import math
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+PROFILES = {
+    'off': None,
+    'fast': {'max_side': 1280, 'grayscale': True, 'crop': True, 'deskew': False, 'pad_to': 128},
+    'balanced': {'max_side': 1600, 'grayscale': True, 'crop': True, 'deskew': True, 'pad_to': 128},
+    'quality': {'max_side': 2560, 'grayscale': True, 'crop': True, 'deskew': True, 'pad_to': 0},
+}
+
+# Size of the thumbnails the receipt outline and the skew are found on
+CROP_THUMBNAIL_SIDE = 256
+SKEW_THUMBNAIL_SIDE = 600
+MAX_SKEW_DEGREES = 10
+# A bright area smaller than this share of the photo is not taken for the receipt
+MIN_CROP_AREA = 0.15
+# Kept around the receipt, as a share of its size
+CROP_MARGIN = 0.02
+
+
+def get_profile(name=None):
+    """The profile called name (default OCR_PREPROCESS_PROFILE), None for 'off'"""
+    name = name or settings.OCR_PREPROCESS_PROFILE
+    if name not in PROFILES:
+        raise ImproperlyConfigured(
+            f"Unknown OCR preprocessing profile {name!r}, expected one of {', '.join(PROFILES)}"
+        )
+    return PROFILES[name]
+
+
+def otsu_threshold(image):
+    """Grey level that best splits a grayscale image into dark and bright pixels"""
+    histogram = image.histogram()
+    total = sum(histogram)
+    weighted_total = sum(level * count for level, count in enumerate(histogram))
+    best_level, best_variance = 127, -1
+    dark_count = dark_weighted = 0
+    for level, count in enumerate(histogram):
+        dark_count += count
+        if dark_count == 0:
+            continue
+        bright_count = total - dark_count
+        if bright_count == 0:
+            break
+        dark_weighted += level * count
+        dark_mean = dark_weighted / dark_count
+        bright_mean = (weighted_total - dark_weighted) / bright_count
+        variance = dark_count * bright_count * (dark_mean - bright_mean) ** 2
+        if variance > best_variance:
+            best_level, best_variance = level, variance
+    return best_level
+
+
+def find_receipt_box(gray):
+    """Box (left, top, right, bottom) around the receipt paper, None if there is nothing to cut away"""
+    from PIL import ImageFilter
+
+    small = gray.copy()
+    small.thumbnail((CROP_THUMBNAIL_SIDE, CROP_THUMBNAIL_SIDE))
+    threshold = otsu_threshold(small)
+    # Paper is brighter than the table it lies on. Eroding drops bright specks
+    # in the background, so they don't stretch the box
+    mask = small.point(lambda level: 255 if level > threshold else 0).filter(ImageFilter.MinFilter(5))
+    box = mask.getbbox()
+    if box is None:
+        return None
+
+    left, top, right, bottom = box
+    width, height = small.size
+    area = (right - left) * (bottom - top) / (width * height)
+    if area < MIN_CROP_AREA or area > 0.95:
+        return None
+
+    margin_x = (right - left) * CROP_MARGIN
+    margin_y = (bottom - top) * CROP_MARGIN
+    scale_x = gray.width / width
+    scale_y = gray.height / height
+    return (
+        max(int((left - margin_x) * scale_x), 0),
+        max(int((top - margin_y) * scale_y), 0),
+        min(int((right + margin_x) * scale_x + 1), gray.width),
+        min(int((bottom + margin_y) * scale_y + 1), gray.height),
+    )
+
+
+def estimate_skew(gray):
+    """
+    Degrees to rotate the image by (counter-clockwise) to level its text lines.
+
+    Projection profile: rotated the right way, the rows of a receipt alternate
+    between full text lines and empty gaps, so the ink per row varies most.
+    Only the middle of the image is scored, the part every tried rotation
+    keeps inside the picture. The corners rotated in from outside are empty
+    and would add variance of their own, growing with the angle.
+    """
+    from PIL import Image
+
+    small = gray.copy()
+    small.thumbnail((SKEW_THUMBNAIL_SIDE, SKEW_THUMBNAIL_SIDE))
+    threshold = otsu_threshold(small)
+    ink = small.point(lambda level: 255 if level <= threshold else 0)
+
+    # Largest centred box of the image's proportions that stays inside it rotated by MAX_SKEW_DEGREES
+    width, height = ink.size
+    sin = math.sin(math.radians(MAX_SKEW_DEGREES))
+    cos = math.cos(math.radians(MAX_SKEW_DEGREES))
+    scale = min(width / (width * cos + height * sin), height / (width * sin + height * cos))
+    margin_x = math.ceil(width * (1 - scale) / 2)
+    margin_y = math.ceil(height * (1 - scale) / 2)
+    box = (margin_x, margin_y, width - margin_x, height - margin_y)
+
+    def spread(angle):
+        rotated = ink.rotate(angle, resample=Image.NEAREST, fillcolor=0).crop(box)
+        values = list(rotated.resize((1, rotated.height), Image.BOX).getdata())
+        mean = sum(values) / len(values)
+        return sum((value - mean) ** 2 for value in values)
+
+    def score(angle):
+        # Ties go to the smaller angle, a flat profile (a blank image) is left as it is
+        return spread(angle), -abs(angle)
+
+    # Whole degrees first, then half a degree either side of the best one, within the range
+    best = max(range(-MAX_SKEW_DEGREES, MAX_SKEW_DEGREES + 1), key=score)
+    best = max((angle for angle in (best - 0.5, best, best + 0.5) if abs(angle) <= MAX_SKEW_DEGREES), key=score)
+    return best if abs(best) >= 0.5 else 0
+
+
+def preprocess_image(source, profile):
+    """Load an image file (path or file object) and prepare it for OCR as the profile says"""
+    from PIL import Image, ImageOps
+
+    image = Image.open(source)
+    mode = 'L' if profile['grayscale'] else 'RGB'
+    max_side = profile['max_side']
+    if max_side:
+        # Decode at the smallest JPEG scale that is still at least the target size
+        scale = max_side / max(image.size)
+        if scale < 1:
+            image.draft(mode, (int(image.width * scale), int(image.height * scale)))
+    image = ImageOps.exif_transpose(image).convert(mode)
+    gray = image if mode == 'L' else image.convert('L')
+
+    if profile['crop']:
+        box = find_receipt_box(gray)
+        if box is not None:
+            image = image.crop(box)
+            gray = image if mode == 'L' else image.convert('L')
+
+    if max_side and max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        gray = image if mode == 'L' else image.convert('L')
+
+    if profile['deskew']:
+        angle = estimate_skew(gray)
+        if angle:
+            white = 255 if mode == 'L' else (255, 255, 255)
+            image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=white)
+
+    pad_to = profile['pad_to']
+    if pad_to:
+        width = -(-image.width // pad_to) * pad_to
+        height = -(-image.height // pad_to) * pad_to
+        if (width, height) != image.size:
+            padded = Image.new(mode, (width, height), 255 if mode == 'L' else (255, 255, 255))
+            padded.paste(image, (0, 0))
+            image = padded
+    return image
@@ -0,0 +1,265 @@
+# ocr_app/tasks.py
+"""
+Background OCR jobs for uploaded receipts.
+
+The ProcessedReceipt row is the job, so no broker (Redis etc.) is needed.
+upload_image saves the receipt as 'ocr_pending' and returns straight away; a
+worker claims it with a conditional UPDATE, runs OCR and the parser, and moves
+it through 'llm_pending' to 'processed' (or 'file_error' / 'processing_error'),
+recording processed_at and processing_time_seconds.
+
+Workers come in two flavours, set by OCR_QUEUE_MODE:
+- 'thread' (default with DEBUG): a small thread pool inside the web process,
+  fed once the upload has been committed. Simple, but every web process that
+  handles an upload loads the OCR model.
+- 'worker' (default otherwise): receipts wait in the database for
+  `python manage.py run_ocr_worker`, a farm of OCR processes (worker_pool.py),
+  and web processes never import easyocr.
+
+A job whose worker died is handed out again after OCR_JOB_TIMEOUT_SECONDS, up
+to OCR_MAX_ATTEMPTS times. Every write a job makes is conditional on its claim
+still being current, so a job given up on cannot overwrite its retry.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.forms.models import model_to_dict
+from django.utils import timezone
+
+from .dedupe import find_cached_results
+from .models import ProcessedReceipt, ExpenseEntry
+from .ocr_engine import read_layout, read_layouts
+# Simple parser (no external API calls, no rate limits!)
+from .simple_parser import parse_invoice_text
+
+logger = logging.getLogger(__name__)
+
+# Thread pool for 'thread' mode, created on first use
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    """Get the thread pool used in 'thread' queue mode"""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.OCR_WORKER_THREADS,
+                    thread_name_prefix='ocr-worker'
+                )
+    return _executor
+
+
+def enqueue_receipts(receipts):
+    """Queue 'ocr_pending' receipts for processing once the upload commits"""
+    if settings.OCR_QUEUE_MODE == 'thread':
+        receipt_ids = [receipt.pk for receipt in receipts]
+        for start in range(0, len(receipt_ids), settings.OCR_BATCH_SIZE):
+            batch = receipt_ids[start:start + settings.OCR_BATCH_SIZE]
+            transaction.on_commit(lambda batch=batch: get_executor().submit(run_receipt_job, batch))
+    # In 'worker' mode the rows themselves are the queue entries
+
+
+def claim_receipts(receipt_ids):
+    """Claim queued receipts for this worker, returning the ids it got, in order"""
+    # The claim time doubles as the claim token, see process_receipt()
+    now = timezone.now()
+    ProcessedReceipt.objects.filter(
+        pk__in=receipt_ids,
+        status='ocr_pending',
+        started_at__isnull=True
+    ).update(started_at=now, attempts=F('attempts') + 1)
+
+    claimed = set(ProcessedReceipt.objects.filter(
+        pk__in=receipt_ids,
+        started_at=now
+    ).values_list('id', flat=True))
+    return [receipt_id for receipt_id in receipt_ids if receipt_id in claimed]
+
+
+def claim_next_receipts(limit):
+    """Claim up to limit of the oldest queued receipts, returning their ids"""
+    while True:
+        receipt_ids = list(ProcessedReceipt.objects.filter(
+            status='ocr_pending',
+            started_at__isnull=True
+        ).order_by('uploaded_at').values_list('id', flat=True)[:limit])
+
+        if not receipt_ids:
+            return []
+        claimed = claim_receipts(receipt_ids)
+        if claimed:
+            return claimed
+        # Other workers got there first, try the next ones
+
+
+def release_receipts(receipts):
+    """
+    Put claimed receipts back in the queue, or fail those that have used up
+    their attempts. Returns (requeued, failed) counts.
+    """
+    receipts = receipts.filter(status__in=ProcessedReceipt.ACTIVE_STATUSES)
+
+    failed = receipts.filter(attempts__gte=settings.OCR_MAX_ATTEMPTS).update(
+        status='processing_error',
+        llm_error_message=f"OCR did not finish after {settings.OCR_MAX_ATTEMPTS} attempts.",
+        processed_at=timezone.now()
+    )
+    requeued = receipts.filter(attempts__lt=settings.OCR_MAX_ATTEMPTS).update(
+        status='ocr_pending',
+        started_at=None
+    )
+    return requeued, failed
+
+
+def requeue_stale_receipts():
+    """Hand out again receipts whose worker stopped responding. Returns (requeued, failed)"""
+    cutoff = timezone.now() - timedelta(seconds=settings.OCR_JOB_TIMEOUT_SECONDS)
+    return release_receipts(ProcessedReceipt.objects.filter(started_at__lt=cutoff))
+
+
+def process_receipts(receipt_ids):
+    """
+    Run OCR and the parser for claimed receipts and store the results.
+
+    Receipts of a file that was processed before reuse its results. The
+    others are OCRed together (see ocr_engine.read_layouts) to make the most
+    of each model call. Returns {receipt id: stored}, see process_receipt().
+    """
+    receipts = ProcessedReceipt.objects.in_bulk(receipt_ids)
+    receipts = [receipts[receipt_id] for receipt_id in receipt_ids if receipt_id in receipts]
+    cached = find_cached_results(receipts)
+    started = time.perf_counter()
+
+    filepaths = {
+        receipt_instance.pk: os.path.join(settings.MEDIA_ROOT, receipt_instance.receipt_image.name)
+        for receipt_instance in receipts
+    }
+    readable = [
+        receipt_instance for receipt_instance in receipts
+        if receipt_instance.pk not in cached and os.path.exists(filepaths[receipt_instance.pk])
+    ]
+
+    ocr_layouts = {}
+    if len(readable) > 1:
+        try:
+            layouts = read_layouts([filepaths[receipt_instance.pk] for receipt_instance in readable])
+            ocr_layouts = {receipt_instance.pk: layout for receipt_instance, layout in zip(readable, layouts)}
+        except Exception:
+            logger.exception("Batched OCR failed, reading the receipts one by one")
+    # The batch's OCR time is shared out evenly between its receipts
+    ocr_seconds = (time.perf_counter() - started) / len(readable) if ocr_layouts else 0.0
+
+    results = {}
+    for receipt_instance in receipts:
+        if receipt_instance.pk in cached:
+            results[receipt_instance.pk] = process_receipt(receipt_instance, cached=cached[receipt_instance.pk])
+        else:
+            results[receipt_instance.pk] = process_receipt(
+                receipt_instance, ocr_layouts.get(receipt_instance.pk), ocr_seconds
+            )
+    return results
+
+
+def process_receipt(receipt_instance, layout=None, ocr_seconds=0.0, cached=None):
+    """
+    Run the parser (and OCR, unless its OCRLayout is given) for a claimed receipt
+    and store the results. If cached, a processed receipt of the same file,
+    is given its text and expense entry are copied instead.
+
+    Returns False if the claim was lost along the way (the job was requeued
+    as stale), in which case nothing more is written.
+    """
+    claim = ProcessedReceipt.objects.filter(pk=receipt_instance.pk, started_at=receipt_instance.started_at)
+    started = time.perf_counter()
+
+    def finish(status, **fields):
+        return claim.update(
+            status=status,
+            processed_at=timezone.now(),
+            processing_time_seconds=ocr_seconds + time.perf_counter() - started,
+            **fields
+        ) == 1
+
+    try:
+        if cached is not None:
+            with transaction.atomic():
+                if not finish(
+                    'processed',
+                    original_ocr_text=cached.original_ocr_text,
+                    ocr_layout=cached.ocr_layout,
+                    llm_output_raw=cached.llm_output_raw,
+                    llm_error_message=cached.llm_error_message,
+                    ocr_cache_hit=True
+                ):
+                    return False
+                ExpenseEntry.objects.create(
+                    receipt_id=receipt_instance.pk,
+                    **model_to_dict(cached.expense_entry, exclude=['id', 'receipt', 'processed_at'])
+                )
+            return True
+
+        # --- OCR Processing ---
+        if layout is None:
+            filepath = os.path.join(settings.MEDIA_ROOT, receipt_instance.receipt_image.name)
+            if not os.path.exists(filepath):
+                raise FileNotFoundError(f"Uploaded file not found at {filepath}")
+            layout = read_layout(filepath)
+        ocr_text = layout.text
+
+        if not claim.update(status='llm_pending', original_ocr_text=ocr_text, ocr_layout=layout.pack()):
+            return False
+
+        # --- Simple Parser Processing ---
+        parse_result = parse_invoice_text(ocr_text, layout)
+        if parse_result["success"]:
+            expense_data = parse_result["data"]
+            result_fields = {
+                'llm_output_raw': '{"message": "Processed using simple rule-based parser - no external API calls required!"}',
+            }
+        else:
+            # Still mark as processed since OCR worked, with a basic expense entry
+            expense_data = {
+                'money_used_for': f"OCR Text: {ocr_text[:200]}{'...' if len(ocr_text) > 200 else ''}",
+                'type_of_expense': 'other',
+                'is_reimbursable': True,
+            }
+            result_fields = {
+                'llm_output_raw': '{"message": "Simple parser failed - showing basic OCR text only."}',
+                'llm_error_message': parse_result["error"],
+            }
+
+        with transaction.atomic():
+            if not finish('processed', **result_fields):
+                return False
+            ExpenseEntry.objects.create(receipt_id=receipt_instance.pk, **expense_data)
+        return True
+
+    except FileNotFoundError as e:
+        return finish('file_error', llm_error_message=str(e))
+    except Exception as e:
+        logger.exception("Processing receipt %s failed", receipt_instance.pk)
+        return finish('processing_error', llm_error_message=str(e))
+
+
+def run_receipt_job(receipt_ids):
+    """Thread pool entry point: claim the receipts and process them"""
+    close_old_connections()
+    try:
+        claimed = claim_receipts(receipt_ids)
+        if claimed:
+            process_receipts(claimed)
+    except Exception:
+        logger.exception("OCR job for receipts %s failed", receipt_ids)
+    finally:
+        # Pool threads outlive the job, don't leave their connection open
+        close_old_connections()
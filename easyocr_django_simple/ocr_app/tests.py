@@ -1,3 +1,377 @@
-from django.test import TestCase
+# ocr_app/tests.py
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.datastructures import MultiValueDict
+from django.utils import timezone
+
+from .dedupe import HASH_BANDS, find_duplicate, set_bands, split_bands
+from .forms import BatchUploadForm
+from .preprocessing import MAX_SKEW_DEGREES, estimate_skew, get_profile, preprocess_image
+from .simple_parser import parse_invoice_text
+from .models import ProcessedReceipt, ExpenseEntry
+from .tasks import claim_receipts, process_receipts, requeue_stale_receipts
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='ocr-app-tests-')
+
+RECEIPT_LINES = ['CORNER CAFE', 'Date: 14/03/2024', 'Total: 450.00']
+
+
+def region(text, row):
+    return ([[0, row * 20], [200, row * 20], [200, row * 20 + 15], [0, row * 20 + 15]], text, 0.9)
+
+
+class StubReader:
+    """Stands in for easyocr.Reader, reading the same lines from every image"""
+
+    def __init__(self, lines=RECEIPT_LINES, on_read=None):
+        self.lines = lines
+        self.on_read = on_read
+
+    def readtext(self, image, **kwargs):
+        if self.on_read is not None:
+            self.on_read()
+        return [region(text, row) for row, text in enumerate(self.lines)]
+
+    def readtext_batched(self, images, **kwargs):
+        return [self.readtext(image) for image in images]
+
+
+def png_bytes(color='white', size=(60, 80)):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def zip_upload(entries, name='receipts.zip'):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zip_file:
+        for filename, data in entries.items():
+            zip_file.writestr(filename, data)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='application/zip')
+
+
+def image_upload(name='receipt.png', color='white'):
+    return SimpleUploadedFile(name, png_bytes(color), content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, OCR_QUEUE_MODE='worker', OCR_PREPROCESS_PROFILE='off')
+class OCRTestCase(TestCase):
+    """Receipts in a temporary MEDIA_ROOT, read by a StubReader"""
+
+    def setUp(self):
+        os.makedirs(MEDIA_ROOT, exist_ok=True)
+        self.addCleanup(shutil.rmtree, MEDIA_ROOT, ignore_errors=True)
+        self.reader = StubReader()
+        patcher = mock.patch('ocr_app.ocr_engine.get_ocr_reader', lambda: self.reader)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_receipt(self, name='receipt.png', **fields):
+        with open(f'{MEDIA_ROOT}/{name}', 'wb') as image_file:
+            image_file.write(png_bytes())
+        return ProcessedReceipt.objects.create(receipt_image=name, status=fields.pop('status', 'ocr_pending'), **fields)
+
+
+class ReceiptJobTests(OCRTestCase):
+    """Claiming, processing and requeueing receipts"""
+
+    def test_claim_and_process(self):
+        receipt_instance = self.create_receipt()
+        self.assertEqual(claim_receipts([receipt_instance.pk]), [receipt_instance.pk])
+        # Already claimed
+        self.assertEqual(claim_receipts([receipt_instance.pk]), [])
+
+        self.assertEqual(process_receipts([receipt_instance.pk]), {receipt_instance.pk: True})
+        receipt_instance.refresh_from_db()
+        self.assertEqual(receipt_instance.status, 'processed')
+        self.assertEqual(receipt_instance.attempts, 1)
+        self.assertIn('CORNER CAFE', receipt_instance.original_ocr_text)
+        self.assertEqual(receipt_instance.expense_entry.amount, Decimal('450.00'))
+
+    def test_batch_of_receipts(self):
+        receipts = [self.create_receipt(f'receipt{number}.png') for number in range(3)]
+        receipt_ids = claim_receipts([receipt_instance.pk for receipt_instance in receipts])
+        self.assertEqual(process_receipts(receipt_ids), {receipt_id: True for receipt_id in receipt_ids})
+        self.assertEqual(ExpenseEntry.objects.count(), 3)
+
+    def test_lost_claim_writes_nothing(self):
+        receipt_instance = self.create_receipt()
+        claim_receipts([receipt_instance.pk])
+
+        def requeue_and_reclaim():
+            # The job is given up on as stale while OCR runs, and another worker claims it
+            ProcessedReceipt.objects.filter(pk=receipt_instance.pk).update(
+                started_at=timezone.now() - timedelta(seconds=settings.OCR_JOB_TIMEOUT_SECONDS + 1)
+            )
+            requeue_stale_receipts()
+            claim_receipts([receipt_instance.pk])
+
+        self.reader.on_read = requeue_and_reclaim
+        self.assertEqual(process_receipts([receipt_instance.pk]), {receipt_instance.pk: False})
+
+        receipt_instance.refresh_from_db()
+        self.assertEqual(receipt_instance.status, 'ocr_pending')
+        self.assertEqual(receipt_instance.attempts, 2)
+        self.assertEqual(receipt_instance.original_ocr_text, '')
+        self.assertFalse(ExpenseEntry.objects.exists())
+
+    def test_stale_jobs_are_requeued(self):
+        stale = self.create_receipt(
+            'stale.png', started_at=timezone.now() - timedelta(seconds=settings.OCR_JOB_TIMEOUT_SECONDS + 1), attempts=1
+        )
+        running = self.create_receipt('running.png', started_at=timezone.now(), attempts=1)
+
+        self.assertEqual(requeue_stale_receipts(), (1, 0))
+        stale.refresh_from_db()
+        running.refresh_from_db()
+        self.assertIsNone(stale.started_at)
+        self.assertEqual(stale.status, 'ocr_pending')
+        self.assertIsNotNone(running.started_at)
+        # Claimable again
+        self.assertEqual(claim_receipts([stale.pk]), [stale.pk])
+
+    def test_fails_after_max_attempts(self):
+        receipt_instance = self.create_receipt()
+        for attempt in range(1, settings.OCR_MAX_ATTEMPTS + 1):
+            self.assertEqual(claim_receipts([receipt_instance.pk]), [receipt_instance.pk])
+            ProcessedReceipt.objects.filter(pk=receipt_instance.pk).update(
+                started_at=timezone.now() - timedelta(seconds=settings.OCR_JOB_TIMEOUT_SECONDS + 1)
+            )
+            expected = (0, 1) if attempt == settings.OCR_MAX_ATTEMPTS else (1, 0)
+            self.assertEqual(requeue_stale_receipts(), expected)
+
+        receipt_instance.refresh_from_db()
+        self.assertEqual(receipt_instance.status, 'processing_error')
+        self.assertEqual(receipt_instance.attempts, settings.OCR_MAX_ATTEMPTS)
+        self.assertEqual(claim_receipts([receipt_instance.pk]), [])
+
+    def test_missing_file(self):
+        receipt_instance = ProcessedReceipt.objects.create(receipt_image='missing.png', status='ocr_pending')
+        claim_receipts([receipt_instance.pk])
+        process_receipts([receipt_instance.pk])
+        receipt_instance.refresh_from_db()
+        self.assertEqual(receipt_instance.status, 'file_error')
+
+
+class BatchUploadFormTests(OCRTestCase):
+    """Validation of uploaded images and zip archives"""
+
+    def form(self, images=(), archive=None):
+        files = MultiValueDict({'images': list(images)})
+        if archive is not None:
+            files['archive'] = archive
+        return BatchUploadForm({}, files)
+
+    def test_archive_images(self):
+        form = self.form(archive=zip_upload({
+            'scans/a.png': png_bytes('white'),
+            'scans/b.PNG': png_bytes('black'),
+            # Skipped, not images
+            'scans/notes.txt': b'notes',
+            '__MACOSX/._a.png': b'resource fork',
+        }))
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual([upload.name for upload in form.cleaned_data['files']], ['a.png', 'b.PNG'])
+
+    def test_invalid_zip(self):
+        form = self.form(archive=SimpleUploadedFile('receipts.zip', b'not a zip'))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['archive'], ["The archive is not a valid zip file."])
+
+    @override_settings(OCR_BATCH_MAX_FILE_BYTES=100)
+    def test_entry_over_size_limit(self):
+        form = self.form(archive=zip_upload({'big.png': png_bytes(size=(400, 400)) + b'\0' * 100}))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['archive'], ["big.png is too large."])
+
+    def test_entry_not_an_image(self):
+        form = self.form(archive=zip_upload({'a.png': png_bytes(), 'fake.jpg': b'plain text'}))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['archive'], ["fake.jpg is not a valid image."])
+
+    @override_settings(OCR_BATCH_MAX_FILES=2)
+    def test_file_count_cap(self):
+        form = self.form(archive=zip_upload({f'{number}.png': png_bytes() for number in range(3)}))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['archive'], ["The archive holds more than 2 images."])
+
+        # Counted across the images and the archive together
+        form = self.form(images=[image_upload()], archive=zip_upload({f'{number}.png': png_bytes() for number in range(2)}))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.non_field_errors(), ["Upload at most 2 images at once."])
+
+    def test_nothing_uploaded(self):
+        form = self.form()
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.non_field_errors(), ["Upload at least one image or a zip of images."])
+
+
+class BatchUploadViewTests(OCRTestCase):
+    """The batch upload and status endpoints"""
+
+    def test_images_and_archive(self):
+        response = self.client.post(reverse('batch_upload'), {
+            'images': [image_upload('one.png', 'white'), image_upload('two.png', 'black')],
+            'archive': zip_upload({'three.png': png_bytes('red')}),
+        })
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data['count'], 3)
+
+        receipts = ProcessedReceipt.objects.filter(batch_id=data['batch_id'])
+        self.assertEqual(receipts.count(), 3)
+        self.assertTrue(all(receipt_instance.status == 'ocr_pending' for receipt_instance in receipts))
+
+        # Processed by a worker
+        receipt_ids = claim_receipts([receipt_instance.pk for receipt_instance in receipts])
+        self.assertEqual(len(receipt_ids), 3)
+        process_receipts(receipt_ids)
+
+        status = self.client.get(data['status_url']).json()
+        self.assertTrue(status['is_final'])
+        self.assertEqual(status['status_counts'], {'processed': 3})
+
+    def test_invalid_upload(self):
+        response = self.client.post(reverse('batch_upload'), {'archive': SimpleUploadedFile('receipts.zip', b'not a zip')})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('archive', response.json()['errors'])
+        self.assertFalse(ProcessedReceipt.objects.exists())
+
+
+def flip_bits(perceptual_hash, bits):
+    """Flip the given bit positions, counted from the most significant bit"""
+    value = int(perceptual_hash, 16)
+    for bit in bits:
+        value ^= 1 << (255 - bit)
+    return f'{value:064x}'
+
+
+class DuplicateReceiptTests(OCRTestCase):
+    """Near-duplicate lookup by hash bands, and the OCR result cache"""
+
+    BASE_HASH = '0123456789abcdef' * 4
+
+    def create_hashed(self, perceptual_hash, **fields):
+        receipt_instance = ProcessedReceipt(receipt_image='hashed.png', perceptual_hash=perceptual_hash, **fields)
+        set_bands(receipt_instance)
+        receipt_instance.save()
+        return receipt_instance
+
+    def test_split_bands(self):
+        bands = split_bands(self.BASE_HASH)
+        self.assertEqual(len(bands), HASH_BANDS)
+        self.assertEqual(bands[:4], [0x0123, 0x4567, 0x89ab, 0xcdef])
+
+    @override_settings(OCR_DUPLICATE_MAX_DISTANCE=15)
+    def test_near_duplicate_sharing_one_band(self):
+        # One bit in each of the first 15 bands, only the last band is left intact
+        near = self.create_hashed(flip_bits(self.BASE_HASH, [band * 16 for band in range(15)]))
+        self.create_hashed(flip_bits(self.BASE_HASH, [band * 16 + 1 for band in range(HASH_BANDS)]))
+
+        self.assertEqual(find_duplicate('no-such-file', self.BASE_HASH), near)
+
+    @override_settings(OCR_DUPLICATE_MAX_DISTANCE=15)
+    def test_no_near_duplicate(self):
+        # 16 bits apart, one in every band
+        self.create_hashed(flip_bits(self.BASE_HASH, [band * 16 for band in range(HASH_BANDS)]))
+        # Shares bands but too far apart
+        self.create_hashed(flip_bits(self.BASE_HASH, range(16, 48)))
+
+        self.assertIsNone(find_duplicate('no-such-file', self.BASE_HASH))
+
+    def test_exact_duplicate_upload(self):
+        response = self.client.post(reverse('batch_upload'), {'images': [image_upload('one.png'), image_upload('two.png')]})
+        first, second = response.json()['receipts']
+        self.assertIsNone(first['duplicate_of'])
+        self.assertEqual(second['duplicate_of'], first['id'])
+
+    def test_cached_result_copies_expense_entry(self):
+        original = self.create_receipt('original.png', content_hash='same-file')
+        claim_receipts([original.pk])
+        process_receipts([original.pk])
+
+        resubmitted = self.create_receipt('resubmitted.png', content_hash='same-file')
+        claim_receipts([resubmitted.pk])
+        with mock.patch.object(self.reader, 'readtext') as readtext:
+            self.assertEqual(process_receipts([resubmitted.pk]), {resubmitted.pk: True})
+        readtext.assert_not_called()
+
+        original.refresh_from_db()
+        resubmitted.refresh_from_db()
+        self.assertTrue(resubmitted.ocr_cache_hit)
+        self.assertEqual(resubmitted.status, 'processed')
+        self.assertEqual(resubmitted.original_ocr_text, original.original_ocr_text)
+
+        # A copy of its own, not the original's entry
+        self.assertNotEqual(resubmitted.expense_entry.pk, original.expense_entry.pk)
+        self.assertEqual(resubmitted.expense_entry.amount, original.expense_entry.amount)
+        self.assertEqual(resubmitted.expense_entry.money_used_for, original.expense_entry.money_used_for)
+        self.assertEqual(ExpenseEntry.objects.count(), 2)
+
+
+class DeskewTests(TestCase):
+    """Skew estimation of the preprocessing profiles"""
+
+    def text_lines(self, angle):
+        from PIL import Image, ImageDraw
+
+        image = Image.new('L', (800, 1200), 255)
+        draw = ImageDraw.Draw(image)
+        for line in range(35):
+            draw.rectangle([60, 40 + line * 32, 200 + line * 137 % 540, 56 + line * 32], fill=0)
+        return image.rotate(-angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+
+    def test_tilted_lines(self):
+        for angle in (-9.5, -3, 0, 1.5, 8):
+            with self.subTest(angle=angle):
+                self.assertEqual(estimate_skew(self.text_lines(angle)), angle)
+
+    def test_stays_in_range(self):
+        self.assertEqual(estimate_skew(self.text_lines(MAX_SKEW_DEGREES + 2)), MAX_SKEW_DEGREES)
+        self.assertEqual(estimate_skew(self.text_lines(-MAX_SKEW_DEGREES - 2)), -MAX_SKEW_DEGREES)
+
+    def test_blank_image(self):
+        from PIL import Image
+
+        blank = Image.new('L', (800, 1200), 255)
+        self.assertEqual(estimate_skew(blank), 0)
+
+        source = io.BytesIO()
+        blank.save(source, 'PNG')
+        source.seek(0)
+        self.assertEqual(preprocess_image(source, get_profile('quality')).size, (800, 1200))
+
+
+class ParserAmountTests(TestCase):
+    """Amounts and currencies read by the rule-based parser"""
+
+    def assertParses(self, text, amount, currency):
+        data = parse_invoice_text(text)['data']
+        self.assertEqual((data['amount'], data['currency']), (Decimal(amount), currency))
+
+    def test_thousands_separators(self):
+        self.assertParses("Amount: 1,250.00 INR", '1250.00', 'INR')
+        self.assertParses("TOTAL: $1,234,567.89", '1234567.89', 'USD')
+        self.assertParses("Grand Total 12,500.00€", '12500.00', 'EUR')
+
+    def test_rupees(self):
+        self.assertParses("TOTAL Rs. 1,23,456.50", '123456.50', 'INR')
+        self.assertParses("Paid Rs.99.00", '99.00', 'INR')
+
+    def test_plain_amounts(self):
+        self.assertParses("Date 12/03/2024\nTotal: 450.00", '450.00', 'USD')
+        # Not a thousands separator
+        self.assertIsNone(parse_invoice_text("Table 12,34")['data']['amount'])
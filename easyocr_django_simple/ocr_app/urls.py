@@ -5,5 +5,8 @@ from . import views
 urlpatterns = [
     path('', views.upload_image, name='upload_image'),
     path('receipt/<uuid:receipt_id>/', views.receipt_detail, name='receipt_detail'),
+    path('receipt/<uuid:receipt_id>/status/', views.receipt_status, name='receipt_status'),
+    path('batch/', views.batch_upload, name='batch_upload'),
+    path('batch/<uuid:batch_id>/', views.batch_status, name='batch_status'),
     path('cleanup/<uuid:receipt_id>/', views.cleanup_image, name='cleanup_image'),
 ]
\ No newline at end of file
@@ -1,21 +1,21 @@
 # ocr_app/views.py
-import easyocr
 import os
+import time
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.core.files.storage import FileSystemStorage
 from django.conf import settings
+from django.db import transaction
+from django.forms.models import model_to_dict
+from django.urls import reverse
 from decimal import Decimal # For handling monetary values
 
-from .forms import ImageUploadForm
-from .models import ProcessedReceipt, ExpenseEntry # Import new models
-# Import simple parser (no external API calls, no rate limits!)
-from .simple_parser import parse_invoice_text
-
-# Initialize EasyOCR reader (do this once)
-reader = easyocr.Reader(['en'])
+from .dedupe import fingerprint_receipt
+from .forms import ImageUploadForm, BatchUploadForm
+from .models import ProcessedReceipt, ExpenseEntry, ReceiptBatch # Import new models
+from .tasks import enqueue_receipts
 
 def upload_image(request):
     if request.method == 'POST':
@@ -24,87 +24,17 @@ def upload_image(request):
             uploaded_file = request.FILES['image']
             fs = FileSystemStorage(location=settings.MEDIA_ROOT)
             filename = fs.save(uploaded_file.name, uploaded_file)
-            filepath = os.path.join(settings.MEDIA_ROOT, filename)
-
-            ocr_text = "No text extracted."
-            llm_processing_status = "Not processed."
-            llm_processed_data = None
-            llm_error = None
-            raw_llm_output = None
-
-            # 1. Store the uploaded receipt info (before OCR for robustness)
-            receipt_instance = ProcessedReceipt.objects.create(
-                receipt_image=filename # Store just the filename, not the full URL
-                # You might want to rename the file to something unique before saving it permanently
-                # For this prototype, we'll delete it later, so just store its temp path.
+
+            # Store the uploaded receipt and queue it, OCR runs in the background
+            # (see tasks.py) so the request does not wait for it
+            receipt_instance = ProcessedReceipt(
+                receipt_image=filename, # Store just the filename, not the full URL
+                status='ocr_pending'
             )
-            receipt_instance.status = 'ocr_pending'
+            # Flags resubmissions, identical files also skip OCR (see dedupe.py)
+            fingerprint_receipt(receipt_instance, uploaded_file)
             receipt_instance.save()
-
-            try:
-                # --- OCR Processing ---
-                if not os.path.exists(filepath):
-                    raise FileNotFoundError(f"Uploaded file not found at {filepath}")
-
-                results = reader.readtext(filepath)
-                if results:
-                    ocr_text = "\n".join([result[1] for result in results])
-                else:
-                    ocr_text = "No text could be extracted from the image by OCR."
-
-                receipt_instance.original_ocr_text = ocr_text
-                receipt_instance.status = 'llm_pending'
-                receipt_instance.save()
-
-                # --- Simple Parser Processing (No API calls, no rate limits!) ---
-                parse_result = parse_invoice_text(ocr_text)
-                
-                if parse_result["success"]:
-                    parsed_data = parse_result["data"]
-                    llm_processing_status = "Processed by simple parser successfully."
-                    receipt_instance.status = 'processed'
-                    receipt_instance.llm_output_raw = '{"message": "Processed using simple rule-based parser - no external API calls required!"}'
-
-                    # Create and save ExpenseEntry
-                    expense_entry = ExpenseEntry.objects.create(
-                        receipt=receipt_instance,
-                        **parsed_data
-                    )
-                    expense_entry.save()
-                    receipt_instance.save() # Save status after expense entry created
-
-                else:
-                    llm_processing_status = "Simple parser failed."
-                    llm_error = parse_result["error"]
-                    receipt_instance.status = 'processed'  # Still mark as processed since OCR worked
-                    receipt_instance.llm_error_message = llm_error
-                    receipt_instance.llm_output_raw = '{"message": "Simple parser failed - showing basic OCR text only."}'
-                    receipt_instance.save()
-                    
-                    # Create a basic expense entry even when parsing fails
-                    basic_expense_data = {
-                        'money_used_for': f"OCR Text: {ocr_text[:200]}{'...' if len(ocr_text) > 200 else ''}",
-                        'type_of_expense': 'other',
-                        'is_reimbursable': True,
-                    }
-                    expense_entry = ExpenseEntry.objects.create(
-                        receipt=receipt_instance,
-                        **basic_expense_data
-                    )
-
-
-            except FileNotFoundError as e:
-                ocr_text = f"Error: Uploaded file not found. ({e})"
-                receipt_instance.status = 'file_error'
-                receipt_instance.llm_error_message = str(e)
-                receipt_instance.save()
-            except Exception as e:
-                ocr_text = f"An unexpected error occurred during OCR/LLM processing: {e}"
-                receipt_instance.status = 'processing_error'
-                receipt_instance.llm_error_message = str(e)
-                receipt_instance.save()
-            # Schedule file cleanup after a delay to allow viewing
-            # The file will be cleaned up when the receipt detail page is accessed
+            enqueue_receipts([receipt_instance])
 
             # Redirect to a details page for the ProcessedReceipt
             return redirect('receipt_detail', receipt_id=receipt_instance.id)
@@ -134,10 +64,121 @@ def receipt_detail(request, receipt_id):
         'receipt': receipt_instance,
         'expense_entry': expense_entry,
         'image_available': image_available,
+        'status_wait_seconds': settings.OCR_STATUS_MAX_WAIT_SECONDS,
     }
     
     return render(request, 'ocr_app/receipt_detail.html', context)
 
+def receipt_status(request, receipt_id):
+    """
+    Report a receipt's processing status as JSON.
+
+    With ?wait=<seconds> this long-polls: the response is held until the
+    status differs from ?status= (the current status by default) or
+    processing has finished, for at most OCR_STATUS_MAX_WAIT_SECONDS. The
+    wait ties up a server thread, see the setting.
+    """
+    receipt_instance = get_object_or_404(ProcessedReceipt, id=receipt_id)
+
+    try:
+        wait = max(0.0, min(float(request.GET.get('wait', 0)), settings.OCR_STATUS_MAX_WAIT_SECONDS))
+    except ValueError:
+        wait = 0.0
+    seen_status = request.GET.get('status', receipt_instance.status)
+    deadline = time.monotonic() + wait
+
+    while (not receipt_instance.is_final and receipt_instance.status == seen_status
+           and time.monotonic() < deadline):
+        time.sleep(0.5)
+        receipt_instance.refresh_from_db(
+            fields=['status', 'processed_at', 'processing_time_seconds', 'llm_error_message']
+        )
+
+    return JsonResponse({
+        'id': str(receipt_instance.id),
+        'status': receipt_instance.status,
+        'status_display': receipt_instance.get_status_display(),
+        'is_final': receipt_instance.is_final,
+        'processed_at': receipt_instance.processed_at,
+        'processing_time_seconds': receipt_instance.processing_time_seconds,
+        'error_message': receipt_instance.llm_error_message,
+    })
+
+def receipt_result(receipt_instance, with_expense_entry=True):
+    """Get a receipt's status and, once processed, its expense entry as a dict"""
+    result = {
+        'id': str(receipt_instance.id),
+        'filename': os.path.basename(receipt_instance.receipt_image.name) if receipt_instance.receipt_image else None,
+        'status': receipt_instance.status,
+        'is_final': receipt_instance.is_final,
+        'processed_at': receipt_instance.processed_at,
+        'processing_time_seconds': receipt_instance.processing_time_seconds,
+        'error_message': receipt_instance.llm_error_message,
+        'detail_url': reverse('receipt_detail', args=[receipt_instance.id]),
+        'duplicate_of': str(receipt_instance.duplicate_of_id) if receipt_instance.duplicate_of_id else None,
+        'ocr_cache_hit': receipt_instance.ocr_cache_hit,
+    }
+    if with_expense_entry:
+        try:
+            result['expense_entry'] = model_to_dict(receipt_instance.expense_entry, exclude=['receipt'])
+        except ExpenseEntry.DoesNotExist:
+            result['expense_entry'] = None
+    return result
+
+@csrf_exempt # API for upload clients, there is no session to protect
+@require_POST
+def batch_upload(request):
+    """
+    Upload a stack of receipts at once, as several 'images' files and/or a zip
+    'archive'. Every image becomes an 'ocr_pending' receipt of one batch, OCRed
+    together in the background. Responds with the batch id and its receipts,
+    poll batch_status for the results.
+    """
+    form = BatchUploadForm(request.POST, request.FILES)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+
+    fs = FileSystemStorage(location=settings.MEDIA_ROOT)
+    seen = {}
+    with transaction.atomic():
+        batch = ReceiptBatch.objects.create()
+        receipts = ProcessedReceipt.objects.bulk_create([
+            fingerprint_receipt(
+                ProcessedReceipt(batch=batch, receipt_image=fs.save(uploaded_file.name, uploaded_file), status='ocr_pending'),
+                uploaded_file,
+                seen
+            )
+            for uploaded_file in form.cleaned_data['files']
+        ])
+        enqueue_receipts(receipts)
+
+    return JsonResponse({
+        'batch_id': str(batch.id),
+        'count': len(receipts),
+        'status_url': reverse('batch_status', args=[batch.id]),
+        # Nothing is processed yet
+        'receipts': [receipt_result(receipt_instance, with_expense_entry=False) for receipt_instance in receipts],
+    }, status=201)
+
+def batch_status(request, batch_id):
+    """Report the status of every receipt in a batch, with the expense entries found so far"""
+    batch = get_object_or_404(ReceiptBatch, id=batch_id)
+    receipts = batch.receipts.select_related('expense_entry').order_by('uploaded_at')
+    results = [receipt_result(receipt_instance) for receipt_instance in receipts]
+
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+
+    return JsonResponse({
+        'batch_id': str(batch.id),
+        'created_at': batch.created_at,
+        'count': len(results),
+        'is_final': all(result['is_final'] for result in results),
+        'status_counts': counts,
+        'receipts': results,
+    })
+
 @require_POST
 def cleanup_image(request, receipt_id):
     """
@@ -145,6 +186,10 @@ def cleanup_image(request, receipt_id):
     """
     receipt_instance = get_object_or_404(ProcessedReceipt, id=receipt_id)
     
+    if not receipt_instance.is_final:
+        # The OCR worker still needs the file
+        return JsonResponse({'status': 'info', 'message': 'Receipt is still being processed'})
+    
     if receipt_instance.receipt_image:
         filepath = os.path.join(settings.MEDIA_ROOT, receipt_instance.receipt_image.name)
         if os.path.exists(filepath):
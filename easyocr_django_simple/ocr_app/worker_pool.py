@@ -0,0 +1,169 @@
+# ocr_app/worker_pool.py
+"""
+A farm of OCR worker processes for `manage.py run_ocr_worker`.
+
+Each process loads the EasyOCR reader once, in its initializer, and then works
+through groups of receipt ids fed to it over the pool's queue. The parent only claims
+receipts and hands them out, so it never imports easyocr or torch itself.
+
+On CPU-only hosts torch would otherwise give every process one thread per
+core and the processes fight over them. By default the available cores are
+split into one shard per process: each process gets as many torch threads as
+it has cores and can be pinned to its shard (Linux only).
+"""
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+
+def get_available_cores():
+    """Get the CPU cores this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def shard_cores(cores, processes):
+    """Split cores into one contiguous, non-empty shard per process"""
+    if len(cores) < processes:
+        # More processes than cores, they have to share
+        return [[cores[index % len(cores)]] for index in range(processes)]
+    size, extra = divmod(len(cores), processes)
+    shards, start = [], 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        shards.append(cores[start:end])
+        start = end
+    return shards
+
+
+def init_worker(shards, ready, torch_threads, pin_cores):
+    """Set up a worker process: Django, core shard, torch threads, OCR model"""
+    if not apps.ready:
+        # Spawned rather than forked
+        django.setup()
+
+    cores = shards.get()
+    if pin_cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+
+    threads = torch_threads or len(cores)
+    # Must be set before torch is imported for its OpenMP pool to pick it up
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['MKL_NUM_THREADS'] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Already fixed by earlier torch work in this process
+
+    from .ocr_engine import get_ocr_reader
+    get_ocr_reader()
+    ready.put(os.getpid())
+
+
+def run_job(receipt_ids):
+    """Process claimed receipts in a worker process"""
+    from .tasks import process_receipts
+
+    close_old_connections()
+    try:
+        return process_receipts(receipt_ids)
+    finally:
+        close_old_connections()
+
+
+class OCRWorkerPool:
+    """Fixed-size pool of warmed-up OCR processes working on claimed receipts"""
+
+    def __init__(self, processes, torch_threads=None, pin_cores=True):
+        self.processes = processes
+        self.torch_threads = torch_threads
+        self.pin_cores = pin_cores
+        self.in_flight = {}
+        self.executor = None
+
+    def start(self):
+        """Start the processes and wait for their models to load. Returns their pids"""
+        # Children must not share the parent's database connections
+        connections.close_all()
+
+        context = multiprocessing.get_context()
+        shards, ready = context.Queue(), context.Queue()
+        for cores in shard_cores(get_available_cores(), self.processes):
+            shards.put(cores)
+
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=context,
+            initializer=init_worker,
+            initargs=(shards, ready, self.torch_threads, self.pin_cores)
+        )
+        # Processes may only be started as work arrives, give each one a no-op
+        # job and wait until all of them have loaded the model
+        warm = [self.executor.submit(os.getpid) for _ in range(self.processes)]
+        for future in warm:
+            future.result()  # Raises if a process failed to start
+        return [ready.get(timeout=settings.OCR_JOB_TIMEOUT_SECONDS) for _ in range(self.processes)]
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def has_capacity(self):
+        # One job per process, claimed receipts should not wait in the queue
+        return len(self.in_flight) < self.processes
+
+    def submit(self, receipt_ids):
+        future = self.executor.submit(run_job, receipt_ids)
+        self.in_flight[future] = receipt_ids
+
+    def wait(self, timeout=None):
+        """
+        Wait for at least one job to finish, for at most timeout seconds.
+
+        Returns (receipt_id, stored, error) tuples for the receipts of the jobs
+        that are done.
+        If a worker process died the pool is restarted and every job that was
+        in flight is returned with its error.
+        """
+        if not self.in_flight:
+            return []
+
+        done, _ = wait(self.in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+        results = []
+        for future in done:
+            receipt_ids = self.in_flight.pop(future)
+            try:
+                stored = future.result()
+                results.extend((receipt_id, stored.get(receipt_id, False), None) for receipt_id in receipt_ids)
+            except Exception as e:
+                results.extend((receipt_id, False, e) for receipt_id in receipt_ids)
+
+        if any(isinstance(error, BrokenProcessPool) for _, _, error in results):
+            # The other jobs went down with the pool
+            results.extend(
+                (receipt_id, False, BrokenProcessPool('Worker pool restarted'))
+                for receipt_ids in self.in_flight.values()
+                for receipt_id in receipt_ids
+            )
+            self.in_flight.clear()
+            self.shutdown()
+            self.start()
+
+        return results
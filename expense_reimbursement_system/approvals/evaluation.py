@@ -0,0 +1,158 @@
+"""
+In-memory evaluation of conditional approval rules.
+
+Evaluating the rules of a flow used to re-query the flow's step approvers and
+the expense's approvals for every rule, twice for HYBRID rules, and the rule
+statistics endpoint ran the same queries again. ApprovalSnapshot loads what
+the rules look at once per expense:
+
+* the expense's approval records,
+* the flow's rules with their specific approvers,
+* the flow's steps, from the company's routing index in approvals.routing,
+
+two queries whatever the number of rules or steps, and still two for a
+whole batch of expenses with load_many(), plus reading the routing version of
+each company once the index is cached. Every rule, the next step and the
+statistics are then answered from the snapshot.
+"""
+from .models import ApprovalFlow, ExpenseApproval
+from .routing import get_flow_steps
+
+
+class ApprovalSnapshot:
+    """The approvals, steps and rules of one expense, loaded once"""
+
+    def __init__(self, expense, approvals, steps, rules):
+        self.expense = expense
+        self.approvals = {approval.approver_id: approval for approval in approvals}
+        self.steps = steps
+        self.rules = rules
+
+    @classmethod
+    def load(cls, expense):
+        """Load the snapshot of an expense, see load_many()"""
+        return cls.load_many([expense])[expense.pk]
+
+    @classmethod
+    def load_many(cls, expenses):
+        """
+        Load the snapshots of many expenses, keyed by expense id, in (at most)
+        two queries and a routing version read per company.
+        """
+        approvals = {expense.pk: [] for expense in expenses}
+        for approval in ExpenseApproval.objects.filter(expense_id__in=approvals):
+            approvals[approval.expense_id].append(approval)
+
+        flow_companies = {
+            expense.approval_flow_id: expense.company_id for expense in expenses if expense.approval_flow_id
+        }
+        flow_ids = set(flow_companies)
+        steps = {flow_id: get_flow_steps(company_id, flow_id) for flow_id, company_id in flow_companies.items()}
+        rules = {flow_id: [] for flow_id in flow_ids}
+        if flow_ids:
+            links = ApprovalFlow.approval_rules.through.objects.filter(
+                approvalflow_id__in=flow_ids
+            ).select_related('approvalrule__specific_approver').order_by('approvalrule__name')
+            for link in links:
+                rules[link.approvalflow_id].append(link.approvalrule)
+
+        return {
+            expense.pk: cls(
+                expense,
+                approvals[expense.pk],
+                steps.get(expense.approval_flow_id, ()),
+                rules.get(expense.approval_flow_id, [])
+            )
+            for expense in expenses
+        }
+
+    def get_approval(self, approver_id):
+        return self.approvals.get(approver_id)
+
+    def record(self, approval):
+        """Keep the snapshot current after an approval record was created or changed"""
+        self.approvals[approval.approver_id] = approval
+
+    def has_approved(self, approver_id):
+        approval = self.approvals.get(approver_id)
+        return approval is not None and approval.status == 'APPROVED'
+
+    def get_step_approval_counts(self):
+        """Get (step approvers, step approvers who approved), as used by percentage rules"""
+        approver_ids = [step.approver_id for step in self.steps]
+        approved_count = sum(1 for approver_id in set(approver_ids) if self.has_approved(approver_id))
+        return len(approver_ids), approved_count
+
+    def get_next_step(self):
+        """Get the step after the expense's current one, or None after the last step"""
+        step_number = self.expense.get_next_step_number()
+        for step in self.steps:
+            if step.step_number >= step_number:
+                return step
+        return None
+
+    def evaluate_percentage_rule(self, rule):
+        """Evaluate percentage-based approval rule"""
+        if not rule.percentage_threshold:
+            return False
+
+        total_approvers, approved_count = self.get_step_approval_counts()
+        if total_approvers == 0:
+            return False
+
+        return (approved_count / total_approvers) * 100 >= rule.percentage_threshold
+
+    def evaluate_specific_approver_rule(self, rule):
+        """Evaluate specific approver rule (e.g., CFO approval)"""
+        if not rule.specific_approver_id:
+            return False
+        return self.has_approved(rule.specific_approver_id)
+
+    def evaluate_hybrid_rule(self, rule):
+        """Evaluate hybrid rule (percentage OR specific approver)"""
+        return self.evaluate_percentage_rule(rule) or self.evaluate_specific_approver_rule(rule)
+
+    def evaluate_rule(self, rule):
+        """Evaluate a specific approval rule"""
+        if rule.rule_type == 'PERCENTAGE':
+            return self.evaluate_percentage_rule(rule)
+        elif rule.rule_type == 'SPECIFIC_APPROVER':
+            return self.evaluate_specific_approver_rule(rule)
+        elif rule.rule_type == 'HYBRID':
+            return self.evaluate_hybrid_rule(rule)
+
+        return False
+
+    def evaluate(self):
+        """Check whether any rule of the flow is met"""
+        return any(self.evaluate_rule(rule) for rule in self.rules)
+
+    def get_rule_statistics(self):
+        """Get statistics for the flow's rules, keyed by rule id"""
+        stats = {}
+
+        for rule in self.rules:
+            rule_stats = {
+                'rule_name': rule.name,
+                'rule_type': rule.rule_type,
+                'is_met': self.evaluate_rule(rule)
+            }
+
+            if rule.rule_type == 'PERCENTAGE':
+                total_approvers, approved_count = self.get_step_approval_counts()
+                rule_stats.update({
+                    'total_approvers': total_approvers,
+                    'approved_count': approved_count,
+                    'percentage_threshold': rule.percentage_threshold,
+                    'current_percentage': (approved_count / total_approvers * 100) if total_approvers > 0 else 0
+                })
+
+            elif rule.rule_type == 'SPECIFIC_APPROVER':
+                rule_stats.update({
+                    'specific_approver': rule.specific_approver.get_full_name() if rule.specific_approver else None,
+                    'has_approved': self.has_approved(rule.specific_approver_id)
+                })
+
+            stats[str(rule.id)] = rule_stats
+
+        return stats
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("approvals", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="expenseapproval",
+            index=models.Index(
+                fields=["created_at", "id"], name="approval_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="expenseapproval",
+            index=models.Index(
+                fields=["approver", "created_at", "id"],
+                name="approval_approver_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("approvals", "0003_expenseapproval_approval_created_id_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="expenseapproval",
+            index=models.Index(
+                fields=["approver", "status"], name="approval_approver_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="expenseapproval",
+            index=models.Index(
+                fields=["expense", "status"], name="approval_expense_status_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("companies", "0002_initial"),
+        ("approvals", "0004_expenseapproval_approval_approver_status_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ApprovalRoutingVersion",
+            fields=[
+                (
+                    "company",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="approval_routing_version",
+                        serialize=False,
+                        to="companies.company",
+                    ),
+                ),
+                ("version", models.UUIDField(default=uuid.uuid4)),
+            ],
+        ),
+    ]
@@ -226,6 +226,14 @@ class ExpenseApproval(models.Model):
     class Meta:
         unique_together = ['expense', 'approver']
         ordering = ['created_at']
+        indexes = [
+            # Keyset pagination of the approval history on (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='approval_created_id_idx'),
+            models.Index(fields=['approver', 'created_at', 'id'], name='approval_approver_created_idx'),
+            # Approval queues and step counting
+            models.Index(fields=['approver', 'status'], name='approval_approver_status_idx'),
+            models.Index(fields=['expense', 'status'], name='approval_expense_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.expense} - {self.approver.get_full_name()} ({self.get_status_display()})"
@@ -248,4 +256,18 @@ class ExpenseApproval(models.Model):
         """Escalate the expense"""
         self.status = 'ESCALATED'
         self.comments = comments
-        self.save()
\ No newline at end of file
+        self.save()
+class ApprovalRoutingVersion(models.Model):
+    """Version of a company's approval routing, replaced on every flow, category or step change"""
+    
+    company = models.OneToOneField(
+        'companies.Company',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='approval_routing_version'
+    )
+    # A new random token per change, a rolled back change's token never comes back
+    version = models.UUIDField(default=uuid.uuid4)
+    
+    def __str__(self):
+        return f"{self.company} routing {self.version}"
@@ -0,0 +1,179 @@
+"""
+Compiled approval-flow routing.
+
+ApprovalService used to pick a flow by walking every active flow of the
+company in min_amount order and asking each one applies_to_amount() and
+applies_to_category(), two queries per flow. The routing index compiles the
+same decision once per company:
+
+* the min/max amounts of all flows split the amount axis into elementary
+  pieces (open intervals between breakpoints and the breakpoints themselves),
+  within which the set of matching flows cannot change;
+* for every piece we keep, in the original flow order, the first flow
+  accepting each category and the first flow accepting any category.
+
+Selecting a flow is then a bisect over the breakpoints plus a dict lookup,
+with no queries. Indexes are kept per process and in the shared cache, keyed
+by the company's ApprovalRoutingVersion. The signals in approvals.signals
+replace it on every flow or flow-category change, in the transaction making
+the change. The version lives in the database rather than the cache, so every
+worker sees a change even with the default per-process cache, at the cost of
+reading it in one primary-key query.
+
+The index also holds the ordered steps of all the company's flows, so moving
+an expense to its next step is a lookup by Expense.current_step_number. Step
+changes replace the same version.
+"""
+import copy
+import uuid
+from bisect import bisect_left
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from .models import ApprovalFlow, ApprovalRoutingVersion, ApprovalStep
+
+ROUTING_CACHE_PREFIX = 'approval-routing:'
+ROUTING_CACHE_TIMEOUT = 24 * 60 * 60
+
+# company id -> (version, compiled index)
+_process_indexes = {}
+
+
+class ApprovalRoutingIndex:
+    """Compiled flow selection and flow steps for one company"""
+
+    def __init__(self, flows, steps=None):
+        """
+        Compile the index from (flow, category id set) pairs, given in the
+        order flows are tried in, and the steps of each flow id.
+        """
+        self.steps = steps or {}
+        self.flows = []
+        bounds = []
+        for flow, category_ids in flows:
+            self.flows.append(flow)
+            # Same falsy checks as ApprovalFlow.applies_to_amount(), 0 means unbounded
+            bounds.append((flow.min_amount or None, flow.max_amount or None, frozenset(category_ids)))
+
+        self.breakpoints = sorted({
+            amount for min_amount, max_amount, _ in bounds
+            for amount in (min_amount, max_amount) if amount is not None
+        })
+
+        # Piece 2i is the open interval below breakpoint i, piece 2i + 1 is breakpoint i itself
+        self.pieces = []
+        for index in range(len(self.breakpoints) + 1):
+            lower = self.breakpoints[index - 1] if index else None
+            upper = self.breakpoints[index] if index < len(self.breakpoints) else None
+            self.pieces.append(self.compile_piece(bounds, lower, upper, is_point=False))
+            if upper is not None:
+                self.pieces.append(self.compile_piece(bounds, upper, upper, is_point=True))
+
+    def compile_piece(self, bounds, lower, upper, is_point):
+        """Get (first flow per category, first flow for any category) for one piece"""
+        by_category = {}
+        any_category = None
+
+        for index, (min_amount, max_amount, category_ids) in enumerate(bounds):
+            if is_point:
+                covers = ((min_amount is None or min_amount <= lower)
+                          and (max_amount is None or max_amount >= upper))
+            else:
+                covers = ((min_amount is None or (lower is not None and min_amount <= lower))
+                          and (max_amount is None or (upper is not None and max_amount >= upper)))
+            if not covers:
+                continue
+
+            if not category_ids:
+                any_category = index
+                break
+            for category_id in category_ids:
+                by_category.setdefault(category_id, index)
+
+        return by_category, any_category
+
+    def select(self, amount, category_id):
+        """Get the flow an expense of this amount and category routes to, or None"""
+        amount = Decimal(str(amount))
+        index = bisect_left(self.breakpoints, amount)
+        if index < len(self.breakpoints) and self.breakpoints[index] == amount:
+            piece = 2 * index + 1
+        else:
+            piece = 2 * index
+
+        by_category, any_category = self.pieces[piece]
+        flow_index = by_category.get(category_id, any_category)
+        if flow_index is None:
+            return None
+        # Callers get their own instance, the cached one is shared
+        return copy.copy(self.flows[flow_index])
+
+
+def get_index_key(company_id, version):
+    return f'{ROUTING_CACHE_PREFIX}index:{company_id}:{version}'
+
+
+def get_routing_version(company_id):
+    """Get the current routing version of a company, None before its first change"""
+    return ApprovalRoutingVersion.objects.filter(company_id=company_id).values_list('version', flat=True).first()
+
+
+def invalidate_routing(company_id):
+    """Make every process recompile a company's routing index on next use"""
+    if not ApprovalRoutingVersion.objects.filter(company_id=company_id).update(version=uuid.uuid4()):
+        # First change of the company. A concurrent first change has just
+        # created the row if this insert is ignored, replace its version too.
+        ApprovalRoutingVersion.objects.bulk_create(
+            [ApprovalRoutingVersion(company_id=company_id)], ignore_conflicts=True
+        )
+        ApprovalRoutingVersion.objects.filter(company_id=company_id).update(version=uuid.uuid4())
+
+
+def compile_routing_index(company_id):
+    """Build a company's routing index from the database, in three queries"""
+    flows = list(
+        ApprovalFlow.objects.filter(company_id=company_id, is_active=True).order_by('min_amount', 'name', 'id')
+    )
+
+    category_ids = {flow.id: set() for flow in flows}
+    links = ApprovalFlow.categories.through.objects.filter(
+        approvalflow_id__in=category_ids
+    ).values_list('approvalflow_id', 'expensecategory_id')
+    for flow_id, category_id in links:
+        category_ids[flow_id].add(category_id)
+
+    # Of inactive flows too, expenses routed earlier still go through them
+    steps = {}
+    for step in ApprovalStep.objects.filter(flow__company_id=company_id).order_by('step_number'):
+        steps.setdefault(step.flow_id, []).append(step)
+
+    return ApprovalRoutingIndex(
+        [(flow, category_ids[flow.id]) for flow in flows],
+        {flow_id: tuple(flow_steps) for flow_id, flow_steps in steps.items()}
+    )
+
+
+def get_routing_index(company_id):
+    """Get a company's routing index from this process, the shared cache or the database"""
+    version = get_routing_version(company_id)
+
+    cached = _process_indexes.get(company_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    index = cache.get(get_index_key(company_id, version))
+    if index is None:
+        index = compile_routing_index(company_id)
+        cache.set(get_index_key(company_id, version), index, ROUTING_CACHE_TIMEOUT)
+
+    _process_indexes[company_id] = (version, index)
+    return index
+
+
+def get_flow_steps(company_id, flow_id):
+    """
+    Get a flow's steps in step_number order from the company's routing index.
+    The steps are shared and their approvers are not loaded, use approver_id.
+    """
+    return get_routing_index(company_id).steps.get(flow_id, ())
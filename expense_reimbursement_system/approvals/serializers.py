@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from expenses.fieldsets import SparseFieldsetMixin
 from .models import ApprovalRule, ApprovalFlow, ApprovalStep, ExpenseApproval
 
 
@@ -68,9 +69,9 @@ class ApprovalFlowSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
-class ExpenseApprovalSerializer(serializers.ModelSerializer):
+class ExpenseApprovalSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
-    Serializer for ExpenseApproval model.
+    Serializer for ExpenseApproval model, supports ?fields= and ?view=summary.
     """
     approver_name = serializers.CharField(source='approver.get_full_name', read_only=True)
     approver_email = serializers.CharField(source='approver.email', read_only=True)
@@ -90,3 +91,22 @@ class ExpenseApprovalSerializer(serializers.ModelSerializer):
             'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'approved_at']
+        summary_fields = ['id', 'expense', 'approver_name', 'status', 'approved_at']
+        field_dependencies = {
+            'approver_name': ['approver'],
+            'approver_email': ['approver'],
+        }
+
+
+class BulkApprovalSerializer(serializers.Serializer):
+    """Serializer for approving, rejecting or escalating many expenses at once"""
+    
+    MAX_EXPENSES = 1000
+    
+    expense_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False,
+        max_length=MAX_EXPENSES
+    )
+    action = serializers.ChoiceField(choices=['approve', 'reject', 'escalate'])
+    comments = serializers.CharField(required=False, allow_blank=True, default='')
@@ -3,7 +3,10 @@ from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.db.models import Q, Count
 from .models import ApprovalFlow, ApprovalStep, ExpenseApproval, ApprovalRule
+from .evaluation import ApprovalSnapshot
+from .routing import get_routing_index
 from expenses.models import Expense
+from expenses.state_machine import ExpenseStateMachine
 
 User = get_user_model()
 
@@ -12,18 +15,11 @@ class ApprovalService:
     
     def get_approval_flow_for_expense(self, expense):
         """Determine the appropriate approval flow for an expense"""
-        # For now, return a simple flow based on amount
-        # In a real system, this would be more complex
-        
-        # Check if there's a specific flow for this amount/category
-        flows = ApprovalFlow.objects.filter(
-            company=expense.company,
-            is_active=True
-        ).order_by('min_amount')
-        
-        for flow in flows:
-            if flow.applies_to_amount(expense.amount) and flow.applies_to_category(expense.category):
-                return flow
+        # First active flow, in min_amount order, matching the amount and category.
+        # The compiled routing index answers this without queries once warm.
+        flow = get_routing_index(expense.company_id).select(expense.amount, expense.category_id)
+        if flow is not None:
+            return flow
         
         # If no specific flow found, create a default one
         return self.create_default_approval_flow(expense)
@@ -69,79 +65,50 @@ class ApprovalService:
     
     def assign_expense_to_approver(self, expense, approver):
         """Assign expense to a specific approver"""
-        expense.current_approver = approver
-        expense.status = 'PENDING'
-        expense.submitted_at = timezone.now()
-        expense.save()
-        
-        # Create approval record
-        ExpenseApproval.objects.get_or_create(
-            expense=expense,
-            approver=approver,
-            defaults={'status': 'PENDING'}
-        )
-    
-    def process_approval(self, expense, approver, action, comments=None):
-        """Process an approval action (approve/reject/escalate)"""
-        with transaction.atomic():
-            # Get or create approval record
-            approval, created = ExpenseApproval.objects.get_or_create(
+        state_machine = ExpenseStateMachine()
+        
+        def assign(expense):
+            state_machine.transition(
+                expense,
+                'PENDING',
+                current_approver=approver,
+                submitted_at=timezone.now()
+            )
+            
+            # Create approval record
+            ExpenseApproval.objects.get_or_create(
                 expense=expense,
                 approver=approver,
                 defaults={'status': 'PENDING'}
             )
-            
-            if action == 'approve':
-                approval.approve(comments)
-                
-                # Move to next approver or mark as approved
-                next_approver = self.get_next_approver(expense)
-                if next_approver:
-                    self.assign_expense_to_approver(expense, next_approver)
-                else:
-                    # No more approvers, mark as approved
-                    expense.status = 'APPROVED'
-                    expense.approved_at = timezone.now()
-                    expense.current_approver = None
-                    expense.save()
-                    
-            elif action == 'reject':
-                approval.reject(comments)
-                expense.status = 'REJECTED'
-                expense.current_approver = None
-                expense.save()
-                
-            elif action == 'escalate':
-                approval.escalate(comments)
-                # Escalation logic can be implemented here
-                # For now, just mark as escalated
-                expense.status = 'ESCALATED'
-                expense.save()
+        
+        state_machine.run(expense, assign)
+    
+    def process_approval(self, expense, approver, action, comments=None):
+        """Process an approval action (approve/reject/escalate)"""
+        state_machine = ExpenseStateMachine()
+        
+        if action == 'approve':
+            # Move to next approver or mark as approved, without conditional rules
+            state_machine.approve(expense, approver, comments, evaluate_rules=False)
+        elif action == 'reject':
+            state_machine.reject(expense, approver, comments)
+        elif action == 'escalate':
+            state_machine.escalate(expense, approver, comments)
     
     def get_next_approver(self, expense):
         """Get the next approver in the flow"""
-        if not expense.approval_flow:
+        if not expense.approval_flow_id:
             return None
         
-        # Get current approval step
-        current_step_number = expense.approvals.filter(
-            status='APPROVED'
-        ).count() + 1
-        
-        # Get next step
-        next_step = ApprovalStep.objects.filter(
-            flow=expense.approval_flow,
-            step_number=current_step_number
-        ).first()
-        
-        return next_step.approver if next_step else None
+        return expense.get_next_approver()
     
     def get_expenses_for_approval(self, user):
         """Get expenses waiting for user's approval"""
         return Expense.objects.filter(
             current_approver=user,
             status='PENDING'
-        ).select_related('submitted_by', 'category', 'company')
+        ).for_serializer()
     
     def create_approval_flow(self, company, name, steps_data):
         """Create a new approval flow with steps"""
@@ -185,319 +152,157 @@ class ApprovalService:
             'total_processed': approved_count + rejected_count
         }
     
-    def evaluate_conditional_approval(self, expense):
+    def evaluate_conditional_approval(self, expense, snapshot=None):
         """Evaluate conditional approval rules for an expense"""
-        if not expense.approval_flow:
+        if not expense.approval_flow_id:
             return False
         
-        # Get all approval rules for this flow
-        rules = expense.approval_flow.approval_rules.all()
-        
-        for rule in rules:
-            if self.evaluate_approval_rule(expense, rule):
-                return True
-        
-        return False
+        snapshot = snapshot or ApprovalSnapshot.load(expense)
+        return snapshot.evaluate()
     
-    def evaluate_approval_rule(self, expense, rule):
+    def evaluate_approval_rule(self, expense, rule, snapshot=None):
         """Evaluate a specific approval rule"""
-        if rule.rule_type == 'PERCENTAGE':
-            return self.evaluate_percentage_rule(expense, rule)
-        elif rule.rule_type == 'SPECIFIC_APPROVER':
-            return self.evaluate_specific_approver_rule(expense, rule)
-        elif rule.rule_type == 'HYBRID':
-            return self.evaluate_hybrid_rule(expense, rule)
-        
-        return False
-    
-    def evaluate_percentage_rule(self, expense, rule):
-        """Evaluate percentage-based approval rule"""
-        if not rule.percentage_threshold:
-            return False
-        
-        # Get all approvers for this expense
-        approvers = expense.approval_flow.steps.all().values_list('approver', flat=True)
-        
-        # Get approval counts
-        total_approvers = len(approvers)
-        approved_count = ExpenseApproval.objects.filter(
-            expense=expense,
-            approver__in=approvers,
-            status='APPROVED'
-        ).count()
-        
-        # Calculate percentage
-        if total_approvers == 0:
-            return False
-        
-        approval_percentage = (approved_count / total_approvers) * 100
-        
-        return approval_percentage >= rule.percentage_threshold
-    
-    def evaluate_specific_approver_rule(self, expense, rule):
-        """Evaluate specific approver rule (e.g., CFO approval)"""
-        if not rule.specific_approver:
-            return False
-        
-        # Check if the specific approver has approved
-        specific_approval = ExpenseApproval.objects.filter(
-            expense=expense,
-            approver=rule.specific_approver,
-            status='APPROVED'
-        ).first()
-        
-        return specific_approval is not None
-    
-    def evaluate_hybrid_rule(self, expense, rule):
-        """Evaluate hybrid rule (percentage OR specific approver)"""
-        percentage_met = False
-        specific_approver_met = False
-        
-        # Check percentage rule
-        if rule.percentage_threshold:
-            percentage_met = self.evaluate_percentage_rule(expense, rule)
-        
-        # Check specific approver rule
-        if rule.specific_approver:
-            specific_approver_met = self.evaluate_specific_approver_rule(expense, rule)
-        
-        # Hybrid rule: either percentage OR specific approver
-        return percentage_met or specific_approver_met
+        snapshot = snapshot or ApprovalSnapshot.load(expense)
+        return snapshot.evaluate_rule(rule)
     
     def process_conditional_approval(self, expense, approver, action, comments=None):
         """Process approval with conditional rule evaluation"""
-        with transaction.atomic():
-            # Get or create approval record
-            approval, created = ExpenseApproval.objects.get_or_create(
-                expense=expense,
-                approver=approver,
-                defaults={'status': 'PENDING'}
-            )
-            
-            if action == 'approve':
-                approval.approve(comments)
-                
-                # Check if conditional approval rules are met
-                if self.evaluate_conditional_approval(expense):
-                    # Conditional approval met - mark as approved
-                    expense.status = 'APPROVED'
-                    expense.approved_at = timezone.now()
-                    expense.current_approver = None
-                    expense.save()
-                    return True
-                else:
-                    # Move to next approver
-                    next_approver = self.get_next_approver(expense)
-                    if next_approver:
-                        self.assign_expense_to_approver(expense, next_approver)
-                    else:
-                        # No more approvers, mark as approved
-                        expense.status = 'APPROVED'
-                        expense.approved_at = timezone.now()
-                        expense.current_approver = None
-                        expense.save()
-                    return False
-                    
-            elif action == 'reject':
-                approval.reject(comments)
-                expense.status = 'REJECTED'
-                expense.current_approver = None
-                expense.save()
-                return True
-                
-            elif action == 'escalate':
-                approval.escalate(comments)
-                expense.status = 'ESCALATED'
-                expense.save()
-                return True
-        
-        return False
-    
-    def create_conditional_approval_rule(self, company, name, rule_type, **kwargs):
-        """Create a conditional approval rule"""
-        rule = ApprovalRule.objects.create(
-            company=company,
-            name=name,
-            rule_type=rule_type,
-            **kwargs
-        )
-        return rule
-    
-    def get_approval_rule_statistics(self, expense):
-        """Get statistics for approval rules on an expense"""
-        if not expense.approval_flow:
-            return {}
+        # Versioned and retried, see expenses.state_machine
+        state_machine = ExpenseStateMachine()
         
-        rules = expense.approval_flow.approval_rules.all()
-        stats = {}
-        
-        for rule in rules:
-            rule_stats = {
-                'rule_name': rule.name,
-                'rule_type': rule.rule_type,
-                'is_met': self.evaluate_approval_rule(expense, rule)
-            }
+        if action == 'approve':
+            # True if the flow's conditional rules approved the expense outright
+            return state_machine.approve(expense, approver, comments)
             
-            if rule.rule_type == 'PERCENTAGE':
-                approvers = expense.approval_flow.steps.all().values_list('approver', flat=True)
-                total_approvers = len(approvers)
-                approved_count = ExpenseApproval.objects.filter(
-                    expense=expense,
-                    approver__in=approvers,
-                    status='APPROVED'
-                ).count()
-                
-                rule_stats.update({
-                    'total_approvers': total_approvers,
-                    'approved_count': approved_count,
-                    'percentage_threshold': rule.percentage_threshold,
-                    'current_percentage': (approved_count / total_approvers * 100) if total_approvers > 0 else 0
-                })
-            
-            elif rule.rule_type == 'SPECIFIC_APPROVER':
-                specific_approval = ExpenseApproval.objects.filter(
-                    expense=expense,
-                    approver=rule.specific_approver,
-                    status='APPROVED'
-                ).first()
-                
-                rule_stats.update({
-                    'specific_approver': rule.specific_approver.get_full_name(),
-                    'has_approved': specific_approval is not None
-                })
+        elif action == 'reject':
+            state_machine.reject(expense, approver, comments)
+            return True
             
-            stats[rule.id] = rule_stats
-        
-        return stats
-
-    
-    def evaluate_conditional_approval(self, expense):
-        """Evaluate conditional approval rules for an expense"""
-        if not expense.approval_flow:
-            return False
-        
-        # Get all approval rules for this flow
-        rules = expense.approval_flow.approval_rules.all()
-        
-        for rule in rules:
-            if self.evaluate_approval_rule(expense, rule):
-                return True
-        
-        return False
-    
-    def evaluate_approval_rule(self, expense, rule):
-        """Evaluate a specific approval rule"""
-        if rule.rule_type == 'PERCENTAGE':
-            return self.evaluate_percentage_rule(expense, rule)
-        elif rule.rule_type == 'SPECIFIC_APPROVER':
-            return self.evaluate_specific_approver_rule(expense, rule)
-        elif rule.rule_type == 'HYBRID':
-            return self.evaluate_hybrid_rule(expense, rule)
+        elif action == 'escalate':
+            state_machine.escalate(expense, approver, comments)
+            return True
         
         return False
     
-    def evaluate_percentage_rule(self, expense, rule):
-        """Evaluate percentage-based approval rule"""
-        if not rule.percentage_threshold:
-            return False
-        
-        # Get all approvers for this expense
-        approvers = expense.approval_flow.steps.all().values_list('approver', flat=True)
-        
-        # Get approval counts
-        total_approvers = len(approvers)
-        approved_count = ExpenseApproval.objects.filter(
-            expense=expense,
-            approver__in=approvers,
-            status='APPROVED'
-        ).count()
-        
-        # Calculate percentage
-        if total_approvers == 0:
-            return False
-        
-        approval_percentage = (approved_count / total_approvers) * 100
-        
-        return approval_percentage >= rule.percentage_threshold
-    
-    def evaluate_specific_approver_rule(self, expense, rule):
-        """Evaluate specific approver rule (e.g., CFO approval)"""
-        if not rule.specific_approver:
-            return False
-        
-        # Check if the specific approver has approved
-        specific_approval = ExpenseApproval.objects.filter(
-            expense=expense,
-            approver=rule.specific_approver,
-            status='APPROVED'
-        ).first()
-        
-        return specific_approval is not None
-    
-    def evaluate_hybrid_rule(self, expense, rule):
-        """Evaluate hybrid rule (percentage OR specific approver)"""
-        percentage_met = False
-        specific_approver_met = False
-        
-        # Check percentage rule
-        if rule.percentage_threshold:
-            percentage_met = self.evaluate_percentage_rule(expense, rule)
-        
-        # Check specific approver rule
-        if rule.specific_approver:
-            specific_approver_met = self.evaluate_specific_approver_rule(expense, rule)
+    def process_bulk_approval(self, expense_ids, approver, action, comments=None):
+        """
+        Approve, reject or escalate many expenses in one transaction.
+        
+        Same outcome per expense as process_conditional_approval(), but the
+        expenses are locked in one query, their approval snapshots loaded in
+        three and every write batched, so clearing hundreds of expenses costs
+        a handful of queries. Returns one result dict per requested id, in
+        request order.
+        """
+        from expenses.services import ExpenseRollupService
+        
+        expense_ids = list(dict.fromkeys(expense_ids))
+        state_machine = ExpenseStateMachine()
+        results = {}
         
-        # Hybrid rule: either percentage OR specific approver
-        return percentage_met or specific_approver_met
-    
-    def process_conditional_approval(self, expense, approver, action, comments=None):
-        """Process approval with conditional rule evaluation"""
         with transaction.atomic():
-            # Get or create approval record
-            approval, created = ExpenseApproval.objects.get_or_create(
-                expense=expense,
-                approver=approver,
-                defaults={'status': 'PENDING'}
-            )
+            expenses = {
+                expense.pk: expense
+                for expense in Expense.objects.select_for_update().filter(id__in=expense_ids)
+            }
             
-            if action == 'approve':
-                approval.approve(comments)
+            assigned = []
+            for expense_id in expense_ids:
+                expense = expenses.get(expense_id)
+                if expense is None:
+                    results[expense_id] = {'expense_id': expense_id, 'success': False, 'error': 'Expense not found'}
+                elif expense.current_approver_id != approver.id:
+                    results[expense_id] = {
+                        'expense_id': expense_id,
+                        'success': False,
+                        'error': 'This expense is not assigned to you for approval'
+                    }
+                elif not state_machine.is_awaiting_approval(expense) or (
+                    action == 'escalate' and not state_machine.can_transition(expense.status, 'ESCALATED')
+                ):
+                    results[expense_id] = {
+                        'expense_id': expense_id,
+                        'success': False,
+                        'error': 'This expense is not awaiting approval'
+                    }
+                else:
+                    assigned.append(expense)
+            
+            snapshots = ApprovalSnapshot.load_many(assigned)
+            now = timezone.now()
+            new_approvals, changed_approvals, rollup_changes = [], [], []
+            
+            for expense in assigned:
+                snapshot = snapshots[expense.pk]
+                # Loaded with the row locked, so this is the stored state
+                previous_state = expense.get_rollup_state()
                 
-                # Check if conditional approval rules are met
-                if self.evaluate_conditional_approval(expense):
-                    # Conditional approval met - mark as approved
-                    expense.status = 'APPROVED'
-                    expense.approved_at = timezone.now()
-                    expense.current_approver = None
-                    expense.save()
-                    return True
+                approval = snapshot.get_approval(approver.pk)
+                if approval is None:
+                    approval = ExpenseApproval(expense=expense, approver=approver)
+                    new_approvals.append(approval)
                 else:
-                    # Move to next approver
-                    next_approver = self.get_next_approver(expense)
-                    if next_approver:
-                        self.assign_expense_to_approver(expense, next_approver)
+                    changed_approvals.append(approval)
+                approval.comments = comments
+                approval.updated_at = now
+                
+                if action == 'approve':
+                    approval.status = 'APPROVED'
+                    approval.approved_at = now
+                    snapshot.record(approval)
+                    
+                    next_step = None if snapshot.evaluate() else snapshot.get_next_step()
+                    if next_step:
+                        expense.current_approver_id = next_step.approver_id
+                        expense.current_step_number = next_step.step_number
+                        expense.status = 'PENDING'
+                        expense.submitted_at = now
+                        if snapshot.get_approval(next_step.approver_id) is None:
+                            pending = ExpenseApproval(expense=expense, approver_id=next_step.approver_id, status='PENDING')
+                            snapshot.record(pending)
+                            new_approvals.append(pending)
                     else:
-                        # No more approvers, mark as approved
                         expense.status = 'APPROVED'
-                        expense.approved_at = timezone.now()
+                        expense.approved_at = now
                         expense.current_approver = None
-                        expense.save()
-                    return False
-                    
-            elif action == 'reject':
-                approval.reject(comments)
-                expense.status = 'REJECTED'
-                expense.current_approver = None
-                expense.save()
-                return True
                 
-            elif action == 'escalate':
-                approval.escalate(comments)
-                expense.status = 'ESCALATED'
-                expense.save()
-                return True
+                elif action == 'reject':
+                    approval.status = 'REJECTED'
+                    expense.status = 'REJECTED'
+                    expense.current_approver = None
+                
+                elif action == 'escalate':
+                    approval.status = 'ESCALATED'
+                    expense.status = 'ESCALATED'
+                
+                expense.updated_at = now
+                # The rows are locked, so the version can simply be bumped
+                expense.version += 1
+                rollup_changes.append((previous_state, expense.get_rollup_state()))
+                
+                results[expense.pk] = {
+                    'expense_id': expense.pk,
+                    'success': True,
+                    'status': expense.status,
+                    'current_approver': expense.current_approver_id
+                }
+            
+            # Bulk writes skip save(), so timestamps and rollups are maintained here
+            ExpenseApproval.objects.bulk_create(new_approvals, batch_size=500)
+            ExpenseApproval.objects.bulk_update(
+                changed_approvals, ['status', 'comments', 'approved_at', 'updated_at'], batch_size=500
+            )
+            Expense.objects.bulk_update(
+                assigned,
+                [
+                    'status', 'current_approver', 'current_step_number',
+                    'submitted_at', 'approved_at', 'updated_at', 'version'
+                ],
+                batch_size=500
+            )
+            ExpenseRollupService().apply_changes(rollup_changes)
         
-        return False
+        return [results[expense_id] for expense_id in expense_ids]
     
     def create_conditional_approval_rule(self, company, name, rule_type, **kwargs):
         """Create a conditional approval rule"""
@@ -509,49 +314,10 @@ class ApprovalService:
         )
         return rule
     
-    def get_approval_rule_statistics(self, expense):
+    def get_approval_rule_statistics(self, expense, snapshot=None):
         """Get statistics for approval rules on an expense"""
-        if not expense.approval_flow:
+        if not expense.approval_flow_id:
             return {}
         
-        rules = expense.approval_flow.approval_rules.all()
-        stats = {}
-        
-        for rule in rules:
-            rule_stats = {
-                'rule_name': rule.name,
-                'rule_type': rule.rule_type,
-                'is_met': self.evaluate_approval_rule(expense, rule)
-            }
-            
-            if rule.rule_type == 'PERCENTAGE':
-                approvers = expense.approval_flow.steps.all().values_list('approver', flat=True)
-                total_approvers = len(approvers)
-                approved_count = ExpenseApproval.objects.filter(
-                    expense=expense,
-                    approver__in=approvers,
-                    status='APPROVED'
-                ).count()
-                
-                rule_stats.update({
-                    'total_approvers': total_approvers,
-                    'approved_count': approved_count,
-                    'percentage_threshold': rule.percentage_threshold,
-                    'current_percentage': (approved_count / total_approvers * 100) if total_approvers > 0 else 0
-                })
-            
-            elif rule.rule_type == 'SPECIFIC_APPROVER':
-                specific_approval = ExpenseApproval.objects.filter(
-                    expense=expense,
-                    approver=rule.specific_approver,
-                    status='APPROVED'
-                ).first()
-                
-                rule_stats.update({
-                    'specific_approver': rule.specific_approver.get_full_name(),
-                    'has_approved': specific_approval is not None
-                })
-            
-            stats[rule.id] = rule_stats
-        
-        return stats
+        snapshot = snapshot or ApprovalSnapshot.load(expense)
+        return snapshot.get_rule_statistics()
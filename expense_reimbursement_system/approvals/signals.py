@@ -0,0 +1,70 @@
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from .models import ApprovalFlow, ApprovalStep
+from .routing import invalidate_routing
+
+
+def bump_routing(*company_ids):
+    """Bump routing versions, in the transaction making the change"""
+    for company_id in set(company_ids):
+        if company_id is not None:
+            invalidate_routing(company_id)
+
+
+@receiver(pre_save, sender=ApprovalFlow)
+def remember_previous_flow_company(sender, instance, **kwargs):
+    """Remember the stored company of a flow, in case the save moves it"""
+    if not instance._state.adding:
+        instance._previous_company_id = ApprovalFlow.objects.filter(
+            pk=instance.pk
+        ).values_list('company_id', flat=True).first()
+
+
+@receiver(post_save, sender=ApprovalFlow)
+def invalidate_saved_flow_routing(sender, instance, **kwargs):
+    bump_routing(instance.company_id, getattr(instance, '_previous_company_id', None))
+
+
+@receiver(post_delete, sender=ApprovalFlow)
+def invalidate_deleted_flow_routing(sender, instance, **kwargs):
+    bump_routing(instance.company_id)
+
+
+@receiver(m2m_changed, sender=ApprovalFlow.categories.through)
+def invalidate_flow_category_routing(sender, instance, action, reverse, pk_set, **kwargs):
+    """Recompile routing when categories are added to or removed from a flow"""
+    if reverse:
+        # instance is an ExpenseCategory, the affected flows are pk_set (or all of its flows on clear)
+        if action in ('post_add', 'post_remove'):
+            flows = ApprovalFlow.objects.filter(pk__in=pk_set)
+        elif action == 'pre_clear':
+            flows = instance.approvalflow_set.all()
+        else:
+            return
+        bump_routing(*flows.values_list('company_id', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        bump_routing(instance.company_id)
+
+
+def bump_step_routing(*flow_ids):
+    """Bump the routing versions of the companies owning the flows"""
+    bump_routing(*ApprovalFlow.objects.filter(pk__in=flow_ids).values_list('company_id', flat=True))
+
+
+@receiver(pre_save, sender=ApprovalStep)
+def remember_previous_step_flow(sender, instance, **kwargs):
+    """Remember the stored flow of a step, in case the save moves it"""
+    if not instance._state.adding:
+        instance._previous_flow_id = ApprovalStep.objects.filter(
+            pk=instance.pk
+        ).values_list('flow_id', flat=True).first()
+
+
+@receiver(post_save, sender=ApprovalStep)
+def invalidate_saved_step_flow(sender, instance, **kwargs):
+    bump_step_routing(instance.flow_id, getattr(instance, '_previous_flow_id', None))
+
+
+@receiver(post_delete, sender=ApprovalStep)
+def invalidate_deleted_step_flow(sender, instance, **kwargs):
+    bump_step_routing(instance.flow_id)
@@ -1,3 +1,100 @@
+from decimal import Decimal
+
+from django.db import transaction
 from django.test import TestCase
 
-# Create your tests here.
+from companies.models import Company
+from expenses.models import ExpenseCategory
+from expenses.tests import ExpenseQueryFixtureMixin
+from users.models import User
+from .models import ApprovalFlow, ApprovalStep
+from .routing import get_flow_steps, get_routing_index, get_routing_version, invalidate_routing
+
+
+class ApprovalListQueryCountTests(ExpenseQueryFixtureMixin, TestCase):
+    """Query budgets of the approval list endpoints, independent of the number of rows"""
+
+    def test_pending_approvals(self):
+        self.assert_list_queries(
+            self.manager, '/api/pending-approvals/', 2, 2 * self.EXPENSES_PER_EMPLOYEE
+        )
+
+    def test_team_expenses_manager(self):
+        self.assert_list_queries(
+            self.manager, '/api/team-expenses/', 2, 2 * self.EXPENSES_PER_EMPLOYEE
+        )
+
+    def test_team_expenses_admin(self):
+        self.assert_list_queries(
+            self.admin, '/api/team-expenses/', 2, 2 * self.EXPENSES_PER_EMPLOYEE
+        )
+
+
+class RoutingInvalidationTests(TestCase):
+    """Routing indexes cached in one process follow flow changes made by another"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Acme')
+        cls.category = ExpenseCategory.objects.create(name='Meals')
+        cls.small = ApprovalFlow.objects.create(company=cls.company, name='Small', max_amount=Decimal('100'))
+        cls.large = ApprovalFlow.objects.create(company=cls.company, name='Large', min_amount=Decimal('100'))
+
+    def test_change_from_another_process(self):
+        self.assertEqual(get_routing_index(self.company.id).select(Decimal('150'), self.category.id), self.large)
+
+        # What another worker's flow save does here: the rows and the version
+        # change, this process' caches are left alone
+        ApprovalFlow.objects.filter(pk=self.small.pk).update(max_amount=Decimal('200'))
+        ApprovalFlow.objects.filter(pk=self.large.pk).update(min_amount=Decimal('200'))
+        invalidate_routing(self.company.id)
+
+        self.assertEqual(get_routing_index(self.company.id).select(Decimal('150'), self.category.id), self.small)
+
+    def test_rolled_back_change(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            ApprovalFlow.objects.filter(pk=self.large.pk).update(min_amount=Decimal('500'))
+            invalidate_routing(self.company.id)
+            # Cached under the version of a change that never commits
+            get_routing_index(self.company.id)
+            raise RuntimeError
+
+        self.small.max_amount = Decimal('200')
+        self.small.save()
+        self.assertEqual(get_routing_index(self.company.id).select(Decimal('150'), self.category.id), self.small)
+
+    def test_signals_replace_version(self):
+        version = get_routing_version(self.company.id)
+        self.small.max_amount = Decimal('50')
+        self.small.save()
+        self.assertNotEqual(get_routing_version(self.company.id), version)
+        version = get_routing_version(self.company.id)
+        self.small.categories.add(self.category)
+        self.assertNotEqual(get_routing_version(self.company.id), version)
+
+    def test_warm_lookup_reads_only_the_version(self):
+        get_routing_index(self.company.id)
+        with self.assertNumQueries(1):
+            get_routing_index(self.company.id).select(Decimal('10'), self.category.id)
+
+    def test_step_change_from_another_process(self):
+        first = User.objects.create_user(username='first', password='x', company=self.company, role='MANAGER')
+        second = User.objects.create_user(username='second', password='x', company=self.company, role='ADMIN')
+        ApprovalStep.objects.create(flow=self.small, step_number=1, approver=first)
+        self.assertEqual([step.approver_id for step in get_flow_steps(self.company.id, self.small.id)], [first.id])
+
+        # Another worker renumbers the step and adds one before it
+        ApprovalStep.objects.filter(flow=self.small).update(step_number=2)
+        ApprovalStep.objects.bulk_create([ApprovalStep(flow=self.small, step_number=1, approver=second)])
+        invalidate_routing(self.company.id)
+
+        self.assertEqual(
+            [step.approver_id for step in get_flow_steps(self.company.id, self.small.id)], [second.id, first.id]
+        )
+
+    def test_step_signals_bump_version(self):
+        approver = User.objects.create_user(username='approver', password='x', company=self.company, role='MANAGER')
+        version = get_routing_version(self.company.id)
+        step = ApprovalStep.objects.create(flow=self.small, step_number=1, approver=approver)
+        step.delete()
+        self.assertNotEqual(get_routing_version(self.company.id), version)
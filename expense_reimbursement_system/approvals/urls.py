@@ -15,6 +15,7 @@ urlpatterns = [
     # Manager/Admin Approval Workflow endpoints
     path('pending-approvals/', views.pending_approvals, name='pending_approvals'),
     path('approve-expense/<uuid:expense_id>/', views.approve_expense, name='approve_expense'),
+    path('bulk-approve-expenses/', views.bulk_approve_expenses, name='bulk_approve_expenses'),
     path('approval-statistics/', views.approval_statistics, name='approval_statistics'),
     path('team-expenses/', views.team_expenses, name='team_expenses'),
     path('create-approval-flow/', views.create_approval_flow, name='create_approval_flow'),
@@ -3,10 +3,16 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.db.models import Q
 from .models import ApprovalRule, ApprovalFlow, ApprovalStep, ExpenseApproval
-from .serializers import ApprovalRuleSerializer, ApprovalFlowSerializer, ApprovalStepSerializer, ExpenseApprovalSerializer
+from .serializers import (
+    ApprovalRuleSerializer, ApprovalFlowSerializer, ApprovalStepSerializer, ExpenseApprovalSerializer,
+    BulkApprovalSerializer
+)
 from .services import ApprovalService
 from expenses.models import Expense
 from expenses.serializers import ExpenseSerializer
+from expenses.state_machine import InvalidTransition, TransitionConflict
+from expenses.fieldsets import sparse_queryset
+from expenses.pagination import KeysetPagination
 
 
 class ApprovalRuleListCreateView(generics.ListCreateAPIView):
@@ -80,10 +86,14 @@ def pending_approvals(request):
         )
     
     approval_service = ApprovalService()
-    expenses = approval_service.get_expenses_for_approval(user)
+    expenses = sparse_queryset(
+        approval_service.get_expenses_for_approval(user), request, ExpenseSerializer
+    )
     
-    serializer = ExpenseSerializer(expenses, many=True)
-    return Response(serializer.data)
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(expenses, request)
+    serializer = ExpenseSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -101,7 +111,7 @@ def approve_expense(request, expense_id):
         expense = Expense.objects.get(id=expense_id)
         
         # Check if user is the current approver
-        if expense.current_approver != user:
+        if expense.current_approver_id != user.id:
             return Response(
                 {'error': 'This expense is not assigned to you for approval'}, 
                 status=status.HTTP_403_FORBIDDEN
@@ -118,7 +128,12 @@ def approve_expense(request, expense_id):
         
         approval_service = ApprovalService()
         # Use conditional approval processing
-        conditional_approved = approval_service.process_conditional_approval(expense, user, action, comments)
+        try:
+            conditional_approved = approval_service.process_conditional_approval(expense, user, action, comments)
+        except InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except TransitionConflict as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
         
         # Return updated expense
         serializer = ExpenseSerializer(expense)
@@ -133,6 +148,38 @@ def approve_expense(request, expense_id):
             status=status.HTTP_404_NOT_FOUND
         )
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def bulk_approve_expenses(request):
+    """Approve, reject, or escalate many expenses, with a result per expense"""
+    user = request.user
+    
+    if not user.can_approve_expenses():
+        return Response(
+            {'error': 'You do not have permission to approve expenses'}, 
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    serializer = BulkApprovalSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    approval_service = ApprovalService()
+    results = approval_service.process_bulk_approval(
+        serializer.validated_data['expense_ids'],
+        user,
+        serializer.validated_data['action'],
+        serializer.validated_data['comments']
+    )
+    
+    succeeded = sum(1 for result in results if result['success'])
+    return Response({
+        'action': serializer.validated_data['action'],
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'results': results
+    })
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def approval_statistics(request):
@@ -162,26 +209,28 @@ def team_expenses(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    # Get expenses from subordinates
+    # Get expenses from everyone in the manager's reporting subtree
     if user.is_manager():
-        subordinates = user.get_subordinates()
         expenses = Expense.objects.filter(
-            submitted_by__in=subordinates
-        ).select_related('submitted_by', 'category', 'current_approver')
+            submitted_by__in=user.get_team_members()
+        ).for_serializer()
     else:  # Admin
         expenses = Expense.objects.filter(
             company=user.company
-        ).select_related('submitted_by', 'category', 'current_approver')
+        ).for_serializer()
     
     # Apply filters
     status_filter = request.query_params.get('status')
     if status_filter:
         expenses = expenses.filter(status=status_filter)
     
-    expenses = expenses.order_by('-created_at')
+    expenses = sparse_queryset(expenses, request, ExpenseSerializer)
     
-    serializer = ExpenseSerializer(expenses, many=True)
-    return Response(serializer.data)
+    # Newest first, one keyset page at a time
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(expenses, request)
+    serializer = ExpenseSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -267,8 +316,10 @@ def approval_history(request, expense_id):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        approvals = expense.approvals.all().order_by('created_at')
-        serializer = ExpenseApprovalSerializer(approvals, many=True)
+        approvals = sparse_queryset(
+            expense.get_approval_history(), request, ExpenseApprovalSerializer
+        )
+        serializer = ExpenseApprovalSerializer(approvals, many=True, context={'request': request})
         
         return Response({
             'expense_id': expense_id,
@@ -296,13 +347,15 @@ def general_approval_history(request):
     # Get all approvals made by this user or in their company
     approvals = ExpenseApproval.objects.filter(
         Q(approver=user) | Q(expense__company=user.company)
-    ).select_related('expense', 'expense__submitted_by', 'approver').order_by('-created_at')
-    
-    # Limit to recent approvals (last 100)
-    approvals = approvals[:100]
-    
-    serializer = ExpenseApprovalSerializer(approvals, many=True)
-    return Response(serializer.data)
+    ).select_related('expense', 'expense__submitted_by', 'approver')
+    approvals = sparse_queryset(approvals, request, ExpenseApprovalSerializer)
+    
+    # Newest first, 100 per page unless ?page_size= says otherwise
+    paginator = KeysetPagination()
+    paginator.page_size = 100
+    page = paginator.paginate_queryset(approvals, request)
+    serializer = ExpenseApprovalSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
@@ -61,6 +61,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "users.middleware.PermissionCacheMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -144,7 +145,7 @@ AUTH_USER_MODEL = 'users.User'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -158,6 +159,21 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Cache
+# The default local-memory cache is per process, point CACHE_BACKEND/CACHE_LOCATION
+# at a shared cache (e.g. Redis) when running several workers so that
+# invalidations reach all of them. Token authentication is only cached in a
+# shared cache.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='expense-system'),
+    }
+}
+
+# Seconds an authenticated token stays cached by CachedTokenAuthentication
+AUTH_TOKEN_CACHE_TTL = config('AUTH_TOKEN_CACHE_TTL', default=300, cast=int)
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -179,6 +195,15 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 # OCR Settings
 OCR_LANGUAGE = config('OCR_LANGUAGE', default='eng')
+# How receipt photos are shrunk, cropped and straightened before OCR:
+# fast, balanced, quality or off (see ocr/preprocessing.py)
+OCR_PREPROCESS_PROFILE = config('OCR_PREPROCESS_PROFILE', default='balanced')
+# OCR engine: tesseract, easyocr or fake (see ocr/backends.py), loaded once per process
+OCR_BACKEND = config('OCR_BACKEND', default='tesseract')
+OCR_EASYOCR_LANGUAGES = config('OCR_EASYOCR_LANGUAGES', default='en').split(',')
+# Scan receipts in a background thread pool (see ocr/tasks.py), or inside the request
+OCR_ASYNC = config('OCR_ASYNC', default=True, cast=bool)
+OCR_WORKER_THREADS = config('OCR_WORKER_THREADS', default=1, cast=int)
 
 # Email settings (for notifications)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
@@ -0,0 +1,105 @@
+"""
+Sparse fieldsets for list endpoints.
+
+Clients can ask for a subset of a serializer's fields with
+?fields=id,amount,status or for a predefined subset with ?view=summary.
+The serializer drops the other fields and sparse_queryset narrows the
+queryset to the columns, joins and prefetches those fields actually read.
+"""
+
+SUMMARY_VIEW = 'summary'
+
+
+def get_requested_fields(request, serializer_class):
+    """Get the set of fields requested by the client, or None for the full payload"""
+    if request is None:
+        return None
+
+    params = getattr(request, 'query_params', request.GET)
+    meta = serializer_class.Meta
+
+    if params.get('fields'):
+        requested = {name.strip() for name in params['fields'].split(',') if name.strip()}
+    elif params.get('view') == SUMMARY_VIEW and hasattr(meta, 'summary_fields'):
+        requested = set(meta.summary_fields)
+    else:
+        return None
+
+    # Unknown names are ignored, the primary key is always returned
+    requested &= set(meta.fields)
+    requested.add('id')
+    return requested
+
+
+def get_field_dependencies(requested, serializer_class):
+    """
+    Get the model lookups the requested fields read, and which of them were
+    declared in Meta.field_dependencies (the rest are plain model fields)
+    """
+    dependencies = getattr(serializer_class.Meta, 'field_dependencies', {})
+
+    lookups, declared = set(), set()
+    for name in requested:
+        if name in dependencies:
+            declared.update(dependencies[name])
+        else:
+            lookups.add(name)
+    return lookups | declared, declared
+
+
+def sparse_queryset(queryset, request, serializer_class):
+    """
+    Restrict a queryset to what the requested fields need.
+
+    Columns nobody asked for are deferred with .only(). Foreign key columns
+    are always loaded: they are narrow, and related managers and prefetches
+    match rows back to their owner through them. Only the relations declared
+    in Meta.field_dependencies by a requested field are joined, and the
+    queryset's prefetches are kept only if such a relation is multi-valued.
+    Returns the queryset unchanged when the full payload was requested.
+    """
+    requested = get_requested_fields(request, serializer_class)
+    if requested is None:
+        return queryset
+
+    model = queryset.model
+    lookups, declared = get_field_dependencies(requested, serializer_class)
+    attributes = {lookup.split('__')[0] for lookup in lookups}
+    columns = [
+        field.name for field in model._meta.concrete_fields
+        if field.name in attributes or field.is_relation
+    ]
+
+    relations = {field.name: field for field in model._meta.get_fields() if field.is_relation}
+    joins, prefetch = [], False
+    for lookup in sorted(declared):
+        relation = relations.get(lookup.split('__')[0])
+        if relation is None:
+            continue
+        if relation.many_to_one or relation.one_to_one:
+            joins.append(lookup)
+        else:
+            prefetch = True
+
+    queryset = queryset.select_related(None).select_related(*joins)
+    if not prefetch:
+        queryset = queryset.prefetch_related(None)
+    return queryset.only(*columns)
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin implementing ?fields= and ?view=summary.
+
+    Serializers declare the summary subset as Meta.summary_fields and, for
+    fields that are not plain model fields, the model attributes they read as
+    Meta.field_dependencies. The request is taken from the serializer context.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        requested = get_requested_fields(self.context.get('request'), type(self))
+        if requested is not None:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
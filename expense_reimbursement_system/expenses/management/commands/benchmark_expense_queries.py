@@ -0,0 +1,233 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from approvals.models import ExpenseApproval
+from companies.models import Company
+from expenses.models import Expense, ExpenseCategory
+from expenses.services import ExpenseRollupService
+from users.models import User
+from users.services import ManagerHierarchyService
+
+BENCHMARK_COMPANY = 'Benchmark Co'
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a benchmark company with synthetic expenses and report EXPLAIN plans "
+        "and latency of the hot expense and approval queries. Use a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=1_000_000,
+            help='Number of expenses the benchmark company should hold (default 1,000,000)'
+        )
+        parser.add_argument(
+            '--employees',
+            type=int,
+            default=500,
+            help='Number of employees to spread the expenses over'
+        )
+        parser.add_argument(
+            '--managers',
+            type=int,
+            default=20,
+            help='Number of managers approving the expenses'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows per bulk insert while seeding'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Timed runs per query, the median is reported'
+        )
+        parser.add_argument(
+            '--compare',
+            action='store_true',
+            help='Also time every query with the model indexes dropped, then restore them'
+        )
+
+    def handle(self, *args, **options):
+        company = self.seed(options)
+        cases = self.get_cases(company)
+
+        self.stdout.write(self.style.MIGRATE_HEADING("With indexes"))
+        with_indexes = self.run_cases(cases, options['repeat'])
+
+        if options['compare']:
+            self.stdout.write(self.style.MIGRATE_HEADING("Without indexes"))
+            indexed_models = [Expense, ExpenseApproval]
+            self.drop_indexes(indexed_models)
+            try:
+                without_indexes = self.run_cases(cases, options['repeat'])
+            finally:
+                self.restore_indexes(indexed_models)
+
+            self.stdout.write(self.style.MIGRATE_HEADING("Summary (median ms)"))
+            for name, _ in cases:
+                before, after = without_indexes[name], with_indexes[name]
+                speedup = before / after if after else 0
+                self.stdout.write(f"  {name:<32} {before:>10.2f} -> {after:>8.2f}  ({speedup:.1f}x)")
+
+    def seed(self, options):
+        """Create or top up the benchmark company to the requested number of expenses"""
+        company, _ = Company.objects.get_or_create(name=BENCHMARK_COMPANY)
+
+        admin = User.objects.filter(company=company, role='ADMIN').first()
+        if admin is None:
+            admin = self.create_users(company, options['managers'], options['employees'])
+
+        managers = list(User.objects.filter(company=company, role='MANAGER'))
+        employees = list(User.objects.filter(company=company, role='EMPLOYEE'))
+        categories = list(ExpenseCategory.objects.all()[:10])
+        if not categories:
+            categories = [
+                ExpenseCategory.objects.create(name=name)
+                for name in ['Travel', 'Meals', 'Lodging', 'Supplies', 'Other']
+            ]
+
+        existing = Expense.objects.filter(company=company).count()
+        missing = options['rows'] - existing
+        if missing <= 0:
+            self.stdout.write(f"{BENCHMARK_COMPANY} already holds {existing} expenses")
+            return company
+
+        self.stdout.write(f"Seeding {missing} expenses into {BENCHMARK_COMPANY}...")
+        managers_by_id = {manager.id: manager for manager in managers}
+        statuses = ['DRAFT', 'PENDING', 'PENDING', 'APPROVED', 'APPROVED', 'APPROVED', 'REJECTED', 'PAID']
+        today = timezone.now().date()
+        started = time.perf_counter()
+
+        for offset in range(0, missing, options['batch_size']):
+            size = min(options['batch_size'], missing - offset)
+            expenses = []
+            for _ in range(size):
+                employee = random.choice(employees)
+                status = random.choice(statuses)
+                expenses.append(Expense(
+                    submitted_by=employee,
+                    company=company,
+                    category=random.choice(categories),
+                    amount=Decimal(random.randint(100, 500000)) / 100,
+                    description='Benchmark expense',
+                    expense_date=today - timedelta(days=random.randint(0, 5 * 365)),
+                    status=status,
+                    current_approver=managers_by_id.get(employee.manager_id, admin) if status == 'PENDING' else None,
+                ))
+
+            with transaction.atomic():
+                # bulk_create skips Expense.save(), rollups are rebuilt once at the end
+                Expense.objects.bulk_create(expenses)
+                ExpenseApproval.objects.bulk_create([
+                    ExpenseApproval(
+                        expense=expense,
+                        approver=managers_by_id.get(expense.submitted_by.manager_id, admin),
+                        status='PENDING' if expense.status == 'PENDING' else 'APPROVED',
+                    )
+                    for expense in expenses if expense.status != 'DRAFT'
+                ])
+
+            self.stdout.write(f"  {offset + size}/{missing}")
+
+        ExpenseRollupService().rebuild_company(company.id)
+        self.stdout.write(f"Seeded in {time.perf_counter() - started:.1f}s")
+        return company
+
+    def create_users(self, company, manager_count, employee_count):
+        """Create the admin, managers and employees of the benchmark company"""
+        admin = User(username='benchmark-admin', company=company, role='ADMIN', is_manager_approver=True)
+        admin.set_unusable_password()
+        admin.save()
+
+        managers = [
+            User(username=f'benchmark-manager-{i}', company=company, role='MANAGER',
+                 manager=admin, is_manager_approver=True)
+            for i in range(manager_count)
+        ]
+        employees = [
+            User(username=f'benchmark-employee-{i}', company=company, role='EMPLOYEE',
+                 manager=managers[i % len(managers)] if managers else admin)
+            for i in range(employee_count)
+        ]
+        for user in managers + employees:
+            user.set_unusable_password()
+        User.objects.bulk_create(managers)
+        User.objects.bulk_create(employees)
+        # bulk_create skips User.save(), which maintains the hierarchy
+        ManagerHierarchyService().rebuild()
+        return admin
+
+    def get_cases(self, company):
+        """Get the (name, queryset) pairs mirroring each endpoint's queries"""
+        manager = User.objects.filter(company=company, role='MANAGER').first()
+        employee = User.objects.filter(company=company, role='EMPLOYEE').first()
+        expense = Expense.objects.filter(company=company).exclude(status='DRAFT').first()
+        today = timezone.now().date()
+
+        return [
+            ('expense list (company)',
+             Expense.objects.filter(company=company).order_by('-created_at', '-id')[:20]),
+            ('status totals (company)',
+             Expense.objects.filter(company=company).values('status').annotate(
+                 count=Count('id'), amount=Sum('amount')).order_by()),
+            ('history group (submitter, status)',
+             Expense.objects.filter(submitted_by=employee, status='APPROVED').order_by('-created_at', '-id')[:20]),
+            ('pending approvals (approver)',
+             Expense.objects.filter(current_approver=manager, status='PENDING').order_by('-created_at', '-id')[:20]),
+            ('date range (company)',
+             Expense.objects.filter(
+                 company=company, expense_date__gte=today - timedelta(days=30)
+             ).values('company').annotate(amount=Sum('amount')).order_by()),
+            ('approvals (approver, status)',
+             ExpenseApproval.objects.filter(approver=manager, status='PENDING').values('approver').annotate(
+                 count=Count('id')).order_by()),
+            ('approvals (expense, status)',
+             ExpenseApproval.objects.filter(expense=expense, status='APPROVED').values('expense').annotate(
+                 count=Count('id')).order_by()),
+        ]
+
+    def run_cases(self, cases, repeat):
+        """Print each query's plan and median latency, return the latencies by name"""
+        latencies = {}
+        for name, queryset in cases:
+            list(queryset.all())  # warm up caches
+
+            timings = []
+            for _ in range(max(repeat, 1)):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+
+            latencies[name] = statistics.median(timings)
+            self.stdout.write(self.style.SUCCESS(f"{name}: {latencies[name]:.2f} ms"))
+            for line in queryset.explain().splitlines():
+                self.stdout.write(f"    {line}")
+
+        return latencies
+
+    def drop_indexes(self, models):
+        with connection.schema_editor() as schema_editor:
+            for model in models:
+                for index in model._meta.indexes:
+                    schema_editor.remove_index(model, index)
+
+    def restore_indexes(self, models):
+        with connection.schema_editor() as schema_editor:
+            for model in models:
+                for index in model._meta.indexes:
+                    schema_editor.add_index(model, index)
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from companies.models import Company
+from expenses.services import ExpenseRollupService
+
+
+class Command(BaseCommand):
+    help = "Check the ExpenseRollup table against the expense table and report drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--company',
+            action='append',
+            dest='companies',
+            help='Only check the given company id (can be repeated)'
+        )
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Rebuild the rollups of every company that has drifted'
+        )
+
+    def handle(self, *args, **options):
+        companies = Company.objects.order_by('created_at')
+        if options['companies']:
+            companies = companies.filter(id__in=options['companies'])
+
+        service = ExpenseRollupService()
+        drifted_companies = []
+
+        for company_id in companies.values_list('id', flat=True):
+            drift = service.find_drift(company_id)
+            if not drift:
+                continue
+
+            drifted_companies.append(company_id)
+            self.stdout.write(self.style.WARNING(f"{company_id}: {len(drift)} drifted buckets"))
+            for entry in drift:
+                key = entry['key']
+                self.stdout.write(
+                    f"  user={key['submitted_by_id']} category={key['category_id']} "
+                    f"month={key['month']:%Y-%m} status={key['status']} "
+                    f"expected={entry['expected']} stored={entry['stored']}"
+                )
+
+            if options['fix']:
+                service.rebuild_company(company_id)
+                self.stdout.write(self.style.SUCCESS(f"  rebuilt rollups for {company_id}"))
+
+        if not drifted_companies:
+            self.stdout.write(self.style.SUCCESS("Expense rollups are consistent"))
+        elif not options['fix']:
+            raise CommandError(f"Rollup drift found in {len(drifted_companies)} companies")
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from companies.models import Company
+from expenses.services import ExpenseRollupService
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ExpenseRollup table from scratch, one company at a time"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--company',
+            action='append',
+            dest='companies',
+            help='Only rebuild the given company id (can be repeated)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rollup rows written per INSERT (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        companies = Company.objects.order_by('created_at')
+        if options['companies']:
+            companies = companies.filter(id__in=options['companies'])
+
+        service = ExpenseRollupService()
+        company_ids = list(companies.values_list('id', flat=True))
+
+        total_buckets = 0
+        for index, company_id in enumerate(company_ids, start=1):
+            buckets = service.rebuild_company(company_id, batch_size=options['batch_size'])
+            total_buckets += buckets
+            self.stdout.write(f"[{index}/{len(company_ids)}] {company_id}: {buckets} buckets")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {total_buckets} rollup buckets for {len(company_ids)} companies"
+        ))
@@ -0,0 +1,239 @@
+import random
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connections, IntegrityError, OperationalError
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from approvals.models import ApprovalFlow, ApprovalStep, ExpenseApproval
+from companies.models import Company
+from expenses.models import Expense, ExpenseCategory
+from expenses.services import ExpenseRollupService
+from expenses.state_machine import ExpenseStateMachine, InvalidTransition, StaleExpense, TransitionConflict
+from users.models import User
+
+STRESS_COMPANY = 'Stress Co'
+
+
+def legacy_approve(expense, approver, comments=None):
+    """Approving as it was before the state machine: count approvals, pick the step, save() the whole row"""
+    approval, _ = ExpenseApproval.objects.get_or_create(
+        expense=expense,
+        approver=approver,
+        defaults={'status': 'PENDING'}
+    )
+    approval.approve(comments)
+
+    current_step = expense.approvals.filter(status='APPROVED').count()
+    next_step = expense.approval_flow.steps.filter(step_number=current_step + 1).first()
+    if next_step:
+        expense.current_approver = next_step.approver
+    else:
+        expense.status = 'APPROVED'
+        expense.approved_at = timezone.now()
+        expense.current_approver = None
+    expense.save()
+
+
+class CountingStateMachine(ExpenseStateMachine):
+    """State machine that counts the conditional updates that lost to another writer"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stale_writes = 0
+
+    def transition(self, expense, status, **changes):
+        try:
+            super().transition(expense, status, **changes)
+        except StaleExpense:
+            self.stale_writes += 1
+            raise
+
+
+class Command(BaseCommand):
+    help = (
+        "Approve expenses through a multi-step flow from many threads at once and check "
+        "that no step is skipped or applied twice. Use a scratch database, ideally PostgreSQL: "
+        "SQLite serialises writers and reports lock errors instead of conflicts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--expenses',
+            type=int,
+            default=200,
+            help='Number of pending expenses to approve (default 200)'
+        )
+        parser.add_argument(
+            '--steps',
+            type=int,
+            default=3,
+            help='Approval steps per expense'
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Concurrent workers, all working through the same expenses'
+        )
+        parser.add_argument(
+            '--mode',
+            choices=['versioned', 'legacy'],
+            default='versioned',
+            help='Approve through the state machine, or the old count-and-save path for comparison'
+        )
+        parser.add_argument(
+            '--max-retries',
+            type=int,
+            default=5,
+            help='State machine retries per action'
+        )
+
+    def handle(self, *args, **options):
+        flow, expense_ids = self.seed(options['expenses'], options['steps'])
+        self.stdout.write(
+            f"Approving {len(expense_ids)} expenses x {options['steps']} steps "
+            f"with {options['threads']} threads ({options['mode']})..."
+        )
+
+        results = [Counter() for _ in range(options['threads'])]
+        threads = [
+            threading.Thread(target=self.work, args=(expense_ids, options, result))
+            for result in results
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        totals = sum(results, Counter())
+        self.stdout.write(self.style.MIGRATE_HEADING("Workers"))
+        self.stdout.write(f"  approvals applied       {totals['applied']:>8}  ({totals['applied'] / elapsed:,.0f}/s)")
+        self.stdout.write(f"  stale writes retried    {totals['stale_writes']:>8}")
+        self.stdout.write(f"  lost races (re-checked) {totals['lost_races']:>8}")
+        self.stdout.write(f"  gave up after retries   {totals['gave_up']:>8}")
+        self.stdout.write(f"  database errors         {totals['db_errors']:>8}")
+        self.stdout.write(f"  elapsed                 {elapsed:>8.2f}s")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Invariants"))
+        problems = self.check_invariants(flow, expense_ids, options['steps'], options['mode'])
+        if problems:
+            for problem in problems:
+                self.stdout.write(self.style.ERROR(f"  {problem}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("  every expense approved once per step, rollups consistent"))
+
+    def seed(self, expense_count, step_count):
+        """Reset the stress company to fresh pending expenses at step 1 of one flow"""
+        company, _ = Company.objects.get_or_create(name=STRESS_COMPANY)
+        Expense.objects.filter(company=company).delete()
+        ApprovalFlow.objects.filter(company=company).delete()
+
+        approvers = []
+        for index in range(step_count):
+            approver = User.objects.filter(username=f'stress-approver-{index}').first()
+            if approver is None:
+                approver = User(username=f'stress-approver-{index}', company=company, role='MANAGER',
+                                is_manager_approver=True)
+                approver.set_unusable_password()
+                approver.save()
+            approvers.append(approver)
+
+        employee = User.objects.filter(username='stress-employee').first()
+        if employee is None:
+            employee = User(username='stress-employee', company=company, role='EMPLOYEE', manager=approvers[0])
+            employee.set_unusable_password()
+            employee.save()
+
+        category = ExpenseCategory.objects.first() or ExpenseCategory.objects.create(name='Other')
+        flow = ApprovalFlow.objects.create(company=company, name='Stress flow')
+        ApprovalStep.objects.bulk_create([
+            ApprovalStep(flow=flow, step_number=index + 1, approver=approver)
+            for index, approver in enumerate(approvers)
+        ])
+
+        now = timezone.now()
+        expenses = Expense.objects.bulk_create([
+            Expense(
+                submitted_by=employee,
+                company=company,
+                category=category,
+                amount=Decimal(random.randint(100, 100000)) / 100,
+                description='Stress expense',
+                expense_date=now.date(),
+                status='PENDING',
+                submitted_at=now,
+                current_approver=approvers[0],
+                current_step_number=1,
+                approval_flow=flow,
+            )
+            for _ in range(expense_count)
+        ])
+        ExpenseApproval.objects.bulk_create([
+            ExpenseApproval(expense=expense, approver=approvers[0], status='PENDING')
+            for expense in expenses
+        ])
+        # bulk_create skips Expense.save(), which maintains the rollups
+        ExpenseRollupService().rebuild_company(company.id)
+
+        return flow, [expense.pk for expense in expenses]
+
+    def work(self, expense_ids, options, result):
+        """Drive each expense to the end of its flow, racing the other workers"""
+        state_machine = CountingStateMachine(max_retries=options['max_retries'])
+        try:
+            for expense_id in random.sample(expense_ids, len(expense_ids)):
+                # Bounded, a broken legacy run must not spin forever
+                for _ in range(options['steps'] * 4):
+                    expense = Expense.objects.select_related('current_approver', 'approval_flow').get(pk=expense_id)
+                    if expense.status != 'PENDING':
+                        break
+                    try:
+                        if options['mode'] == 'legacy':
+                            legacy_approve(expense, expense.current_approver)
+                        else:
+                            state_machine.approve(expense, expense.current_approver, evaluate_rules=False)
+                        result['applied'] += 1
+                    except InvalidTransition:
+                        # Another worker moved the expense on first
+                        result['lost_races'] += 1
+                    except TransitionConflict:
+                        result['gave_up'] += 1
+                    except (OperationalError, IntegrityError):
+                        result['db_errors'] += 1
+        finally:
+            result['stale_writes'] += state_machine.stale_writes
+            connections.close_all()
+
+    def check_invariants(self, flow, expense_ids, step_count, mode):
+        """Get a description of every broken invariant"""
+        problems = []
+        expenses = Expense.objects.filter(pk__in=expense_ids).annotate(
+            approved_count=Count('approvals', filter=Q(approvals__status='APPROVED'))
+        )
+
+        statuses = Counter(expense.status for expense in expenses)
+        if statuses['APPROVED'] != len(expense_ids):
+            problems.append(f"expected all {len(expense_ids)} expenses approved, got {dict(statuses)}")
+
+        wrong_steps = [expense for expense in expenses if expense.approved_count != step_count]
+        if wrong_steps:
+            problems.append(f"{len(wrong_steps)} expenses do not have exactly {step_count} approvals")
+
+        if mode == 'versioned':
+            # One transition per step, any more means a step was applied twice
+            wrong_versions = [expense for expense in expenses if expense.version != step_count]
+            if wrong_versions:
+                problems.append(f"{len(wrong_versions)} expenses made more or fewer than {step_count} transitions")
+
+        drift = ExpenseRollupService().find_drift(flow.company_id)
+        if drift:
+            problems.append(f"{len(drift)} rollup buckets drifted from the expense table")
+
+        return problems
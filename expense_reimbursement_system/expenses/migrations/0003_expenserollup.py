@@ -0,0 +1,104 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:01
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import TruncMonth
+import django.db.models.deletion
+
+
+def build_expense_rollups(apps, schema_editor):
+    Expense = apps.get_model("expenses", "Expense")
+    ExpenseRollup = apps.get_model("expenses", "ExpenseRollup")
+
+    rows = (
+        Expense.objects.order_by()
+        .annotate(month=TruncMonth("expense_date"))
+        .values("company_id", "submitted_by_id", "category_id", "month", "status")
+        .annotate(total_count=models.Count("id"), total_amount=models.Sum("amount"))
+    )
+    ExpenseRollup.objects.bulk_create(
+        [
+            ExpenseRollup(
+                company_id=row["company_id"],
+                submitted_by_id=row["submitted_by_id"],
+                category_id=row["category_id"],
+                month=row["month"],
+                status=row["status"],
+                count=row["total_count"],
+                amount=row["total_amount"] or Decimal("0.00"),
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("companies", "0002_initial"),
+        ("expenses", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExpenseRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "month",
+                    models.DateField(help_text="First day of the expense_date month"),
+                ),
+                ("status", models.CharField(max_length=20)),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "amount",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=15
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "category",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="expense_rollups",
+                        to="expenses.expensecategory",
+                    ),
+                ),
+                (
+                    "company",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="expense_rollups",
+                        to="companies.company",
+                    ),
+                ),
+                (
+                    "submitted_by",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="expense_rollups",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-month"],
+                "unique_together": {
+                    ("company", "submitted_by", "category", "month", "status")
+                },
+            },
+        ),
+        migrations.RunPython(build_expense_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0003_expenserollup"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(
+                fields=["created_at", "id"], name="expense_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(
+                fields=["company", "created_at", "id"],
+                name="expense_company_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(
+                fields=["submitted_by", "created_at", "id"],
+                name="expense_submitter_created_idx",
+            ),
+        ),
+    ]
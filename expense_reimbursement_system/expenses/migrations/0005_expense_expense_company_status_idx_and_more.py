@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0004_expense_expense_created_id_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(
+                fields=["company", "status"], name="expense_company_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(
+                fields=["submitted_by", "status", "created_at", "id"],
+                name="expense_submitter_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(
+                fields=["company", "expense_date"], name="expense_company_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(
+                condition=models.Q(("status", "PENDING")),
+                fields=["current_approver", "created_at", "id"],
+                name="expense_pending_approver_idx",
+            ),
+        ),
+    ]
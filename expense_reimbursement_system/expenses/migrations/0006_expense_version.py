@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0005_expense_expense_company_status_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="expense",
+            name="version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name="expense",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("DRAFT", "Draft"),
+                    ("PENDING", "Pending Approval"),
+                    ("APPROVED", "Approved"),
+                    ("REJECTED", "Rejected"),
+                    ("ESCALATED", "Escalated"),
+                    ("PAID", "Paid"),
+                ],
+                default="DRAFT",
+                max_length=20,
+            ),
+        ),
+    ]
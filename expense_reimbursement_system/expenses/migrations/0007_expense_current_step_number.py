@@ -0,0 +1,66 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:24
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def backfill_current_step_number(apps, schema_editor):
+    Expense = apps.get_model("expenses", "Expense")
+    ExpenseApproval = apps.get_model("approvals", "ExpenseApproval")
+    ApprovalStep = apps.get_model("approvals", "ApprovalStep")
+
+    steps = defaultdict(list)
+    for flow_id, step_number, approver_id in ApprovalStep.objects.order_by(
+        "step_number"
+    ).values_list("flow_id", "step_number", "approver_id"):
+        steps[flow_id].append((step_number, approver_id))
+
+    approved = defaultdict(set)
+    for expense_id, approver_id in ExpenseApproval.objects.filter(
+        status="APPROVED"
+    ).values_list("expense_id", "approver_id"):
+        approved[expense_id].add(approver_id)
+
+    expenses = Expense.objects.exclude(status="DRAFT").only(
+        "id", "status", "approval_flow_id", "current_approver_id"
+    )
+    updated = []
+    for expense in expenses.iterator(chunk_size=1000):
+        flow_steps = steps.get(expense.approval_flow_id, [])
+        approved_ids = approved.get(expense.id, set())
+        # Only approvals by the flow's own approvers count as steps taken
+        taken = sum(1 for _, approver_id in flow_steps if approver_id in approved_ids)
+
+        if expense.status in ("PENDING", "ESCALATED") and expense.current_approver_id:
+            waiting = [
+                step_number
+                for step_number, approver_id in flow_steps
+                if approver_id == expense.current_approver_id
+                and approver_id not in approved_ids
+            ]
+            expense.current_step_number = waiting[0] if waiting else taken + 1
+        else:
+            expense.current_step_number = taken
+
+        if expense.current_step_number:
+            updated.append(expense)
+
+    Expense.objects.bulk_update(updated, ["current_step_number"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0006_expense_version"),
+        ("approvals", "0004_expenseapproval_approval_approver_status_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="expense",
+            name="current_step_number",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_current_step_number, migrations.RunPython.noop),
+    ]
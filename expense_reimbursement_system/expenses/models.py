@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from decimal import Decimal
@@ -21,6 +21,36 @@ class ExpenseCategory(models.Model):
     def __str__(self):
         return self.name
 
+class ExpenseQuerySet(models.QuerySet):
+    """QuerySet helpers for loading expenses efficiently"""
+    
+    def with_approval_history(self):
+        """Prefetch approvals and their approvers in history order"""
+        from approvals.models import ExpenseApproval
+        return self.prefetch_related(
+            models.Prefetch(
+                'approvals',
+                queryset=ExpenseApproval.objects.select_related('approver').order_by('created_at')
+            )
+        )
+    
+    def visible_to(self, user):
+        """
+        Restrict to the expenses a user may see: employees their own, managers
+        their own and their whole reporting subtree, everyone else their company's.
+        """
+        if user.is_employee():
+            return self.filter(submitted_by=user)
+        if user.is_manager():
+            return self.filter(submitted_by__in=user.get_team_members(include_self=True))
+        return self.filter(company=user.company)
+    
+    def for_serializer(self):
+        """Load every relation ExpenseSerializer reads, avoiding per-row queries"""
+        return self.select_related(
+            'submitted_by', 'category', 'company', 'current_approver'
+        ).with_approval_history()
+
 class Expense(models.Model):
     """Expense model for managing expense claims"""
     
@@ -29,6 +59,7 @@ class Expense(models.Model):
         ('PENDING', 'Pending Approval'),
         ('APPROVED', 'Approved'),
         ('REJECTED', 'Rejected'),
+        ('ESCALATED', 'Escalated'),
         ('PAID', 'Paid'),
     ]
     
@@ -95,6 +126,10 @@ class Expense(models.Model):
         null=True, 
         blank=True
     )
+    # Step of the approval flow the current approver acts for, 0 before submission
+    current_step_number = models.PositiveIntegerField(default=0, editable=False)
+    # Bumped by every write, see expenses.state_machine
+    version = models.PositiveIntegerField(default=0, editable=False)
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -102,17 +137,85 @@ class Expense(models.Model):
     submitted_at = models.DateTimeField(null=True, blank=True)
     approved_at = models.DateTimeField(null=True, blank=True)
     
+    objects = ExpenseQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination on (created_at, id), overall and per role scope
+            models.Index(fields=['created_at', 'id'], name='expense_created_id_idx'),
+            models.Index(fields=['company', 'created_at', 'id'], name='expense_company_created_idx'),
+            models.Index(fields=['submitted_by', 'created_at', 'id'], name='expense_submitter_created_idx'),
+            # Hot filters: company dashboards, per-status history groups, date ranges
+            models.Index(fields=['company', 'status'], name='expense_company_status_idx'),
+            models.Index(
+                fields=['submitted_by', 'status', 'created_at', 'id'],
+                name='expense_submitter_status_idx'
+            ),
+            models.Index(fields=['company', 'expense_date'], name='expense_company_date_idx'),
+            # Approval queues only ever look at pending expenses
+            models.Index(
+                fields=['current_approver', 'created_at', 'id'],
+                condition=models.Q(status='PENDING'),
+                name='expense_pending_approver_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.submitted_by.get_full_name()} - {self.amount} {self.currency} - {self.category.name}"
     
+    # Fields that determine which ExpenseRollup bucket an expense counts towards
+    ROLLUP_FIELDS = ['company_id', 'submitted_by_id', 'category_id', 'expense_date', 'status', 'amount']
+    
     def save(self, *args, **kwargs):
         # Auto-set company from submitted_by user
-        if not self.company and self.submitted_by and self.submitted_by.company:
+        if not self.company_id and self.submitted_by and self.submitted_by.company:
             self.company = self.submitted_by.company
-        super().save(*args, **kwargs)
+        
+        # Every write to an existing row bumps the version, so the state
+        # machine's conditional updates see it (see expenses.state_machine)
+        bump_version = not self._state.adding
+        if bump_version:
+            self.version = models.F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = [*kwargs['update_fields'], 'version']
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not any(
+            self._meta.get_field(name).attname in self.ROLLUP_FIELDS for name in update_fields
+        ):
+            super().save(*args, **kwargs)
+        else:
+            from .services import ExpenseRollupService
+            with transaction.atomic():
+                previous_state = None
+                if not self._state.adding:
+                    # Read from the locked row, this instance may have been loaded
+                    # before another save changed it
+                    previous_state = self.get_saved_rollup_state(lock=True)
+                super().save(*args, **kwargs)
+                current_state = self.get_rollup_state() or self.get_saved_rollup_state()
+                ExpenseRollupService().apply_change(previous_state, current_state)
+        
+        if bump_version:
+            self.refresh_from_db(fields=['version'])
+    
+    def get_rollup_state(self):
+        """Get (rollup key, amount) for this expense, or None if fields are not loaded"""
+        deferred = self.get_deferred_fields()
+        if any(field in deferred for field in self.ROLLUP_FIELDS):
+            return None
+        
+        from .services import ExpenseRollupService
+        return ExpenseRollupService().get_rollup_state(self)
+    
+    def get_saved_rollup_state(self, lock=False):
+        """Get the rollup state this expense currently has in the database, locking its row if asked"""
+        saved = Expense.objects.filter(pk=self.pk).only(*self.ROLLUP_FIELDS)
+        if lock:
+            saved = saved.select_for_update()
+        saved = saved.first()
+        return saved.get_rollup_state() if saved else None
     
     def get_status_display_color(self):
         """Get color for status display"""
@@ -121,6 +224,7 @@ class Expense(models.Model):
             'PENDING': 'yellow',
             'APPROVED': 'green',
             'REJECTED': 'red',
+            'ESCALATED': 'orange',
             'PAID': 'blue',
         }
         return colors.get(self.status, 'gray')
@@ -137,35 +241,67 @@ class Expense(models.Model):
     
     def get_approval_history(self):
         """Get approval history for this expense"""
-        return self.approvals.all().order_by('created_at')
+        # Use approvals prefetched by ExpenseQuerySet.with_approval_history()
+        if 'approvals' in getattr(self, '_prefetched_objects_cache', {}):
+            return self.approvals.all()
+        return self.approvals.select_related('approver').order_by('created_at')
     
     def get_next_approver(self):
         """Get the next approver in the flow"""
-        if not self.approval_flow:
+        if not self.approval_flow_id:
             return None
         
-        # Get current approval step
-        current_step = self.approvals.filter(
-            status='APPROVED'
-        ).count()
-        
-        # Get next step
-        next_step = self.approval_flow.steps.filter(
-            step_number=current_step + 1
-        ).first()
-        
-        return next_step.approver if next_step else None
+        from approvals.routing import get_flow_steps
+        for step in get_flow_steps(self.company_id, self.approval_flow_id):
+            if step.step_number >= self.get_next_step_number():
+                # The cached steps are shared, load the approver instead of caching it on them
+                return User.objects.filter(pk=step.approver_id).first()
+        return None
+    
+    def get_next_step_number(self):
+        """Get the lowest number the flow step after the current approver's can have"""
+        # Whoever is assigned acts for at least step 1
+        return max(self.current_step_number, 1) + 1
     
     def move_to_next_approver(self):
         """Move expense to next approver"""
-        from django.utils import timezone
-        next_approver = self.get_next_approver()
-        if next_approver:
-            self.current_approver = next_approver
-            self.save()
-        else:
-            # No more approvers, mark as approved
-            self.status = 'APPROVED'
-            self.approved_at = timezone.now()
-            self.current_approver = None
-            self.save()
\ No newline at end of file
+        from approvals.evaluation import ApprovalSnapshot
+        from .state_machine import ExpenseStateMachine
+        state_machine = ExpenseStateMachine()
+        state_machine.run(
+            self,
+            lambda expense: state_machine.advance(expense, ApprovalSnapshot.load(expense), evaluate_rules=False)
+        )
+
+class ExpenseRollup(models.Model):
+    """Materialized expense counts and amounts per company, submitter, category, month and status"""
+    
+    company = models.ForeignKey(
+        'companies.Company', 
+        on_delete=models.CASCADE, 
+        related_name='expense_rollups'
+    )
+    submitted_by = models.ForeignKey(
+        User, 
+        on_delete=models.CASCADE, 
+        related_name='expense_rollups'
+    )
+    category = models.ForeignKey(
+        ExpenseCategory, 
+        on_delete=models.CASCADE,
+        related_name='expense_rollups'
+    )
+    month = models.DateField(help_text="First day of the expense_date month")
+    status = models.CharField(max_length=20)
+    
+    count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['company', 'submitted_by', 'category', 'month', 'status']
+        ordering = ['-month']
+    
+    def __str__(self):
+        return f"{self.company_id} - {self.month:%Y-%m} - {self.status}: {self.count} / {self.amount}"
@@ -0,0 +1,92 @@
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination keyed on (created_at, id), newest first.
+
+    DRF's CursorPagination orders on a single field and skips ties with an
+    OFFSET. Here the cursor holds the (created_at, id) of the row at the page
+    boundary and each page is fetched with a row-value comparison, so page N
+    costs the same as page 1. Returns the usual {next, previous, results} envelope.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+
+        if self.cursor is not None:
+            created_at, pk = self.decode_position(queryset.model, self.cursor.position)
+            if reverse:
+                boundary = Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+            else:
+                boundary = Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+            queryset = queryset.filter(boundary)
+
+        # Annotated so the position is available even when created_at is deferred
+        ordering = ('created_at', 'pk') if reverse else ('-created_at', '-pk')
+        results = list(
+            queryset.annotate(keyset_created_at=F('created_at')).order_by(*ordering)[:self.page_size + 1]
+        )
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+
+        if reverse:
+            self.has_next = self.cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        self.display_page_controls = self.has_next or self.has_previous
+        return self.page
+
+    def decode_position(self, model, position):
+        """Split a cursor position into its created_at and primary key parts"""
+        try:
+            created_at, pk = position.split('|', 1)
+            created_at = parse_datetime(created_at)
+            pk = model._meta.pk.to_python(pk)
+        except (AttributeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+    def encode_position(self, instance):
+        """Encode the (created_at, id) of a row into a cursor position"""
+        return f'{instance.keyset_created_at.isoformat()}|{instance.pk}'
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            position = self.encode_position(self.page[-1])
+        else:
+            # An empty reverse page: continue from where it started
+            position = self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self.encode_position(self.page[0])
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
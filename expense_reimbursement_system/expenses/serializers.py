@@ -1,7 +1,11 @@
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Expense, ExpenseCategory
 from users.models import User
 from companies.models import Company
+from ocr.models import OCRResult
+from .fieldsets import SparseFieldsetMixin
+from .state_machine import ExpenseStateMachine
 
 class ExpenseCategorySerializer(serializers.ModelSerializer):
     """Serializer for expense categories"""
@@ -10,8 +14,8 @@ class ExpenseCategorySerializer(serializers.ModelSerializer):
         model = ExpenseCategory
         fields = ['id', 'name', 'description', 'is_active', 'created_at']
 
-class ExpenseSerializer(serializers.ModelSerializer):
-    """Serializer for expenses"""
+class ExpenseSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Serializer for expenses, supports ?fields= and ?view=summary"""
     
     submitted_by_name = serializers.CharField(source='submitted_by.get_full_name', read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
@@ -36,6 +40,18 @@ class ExpenseSerializer(serializers.ModelSerializer):
             'id', 'submitted_by', 'company', 'created_at', 'updated_at',
             'submitted_at', 'approved_at'
         ]
+        summary_fields = [
+            'id', 'amount', 'currency', 'status', 'expense_date', 'category_name'
+        ]
+        field_dependencies = {
+            'submitted_by_name': ['submitted_by'],
+            'category_name': ['category'],
+            'company_name': ['company'],
+            'current_approver_name': ['current_approver'],
+            'status_display': ['status'],
+            'can_be_edited': ['status'],
+            'approval_history': ['approvals'],
+        }
     
     def get_approval_history(self, obj):
         """Get approval history for the expense"""
@@ -54,8 +70,9 @@ class ExpenseSerializer(serializers.ModelSerializer):
         
         validated_data['company'] = user.company
         
-        # Create the expense
-        expense = super().create(validated_data)
+        # The starting status is decided before the insert, so the row is
+        # written once and never makes a transition the state machine forbids
+        expense = Expense(**validated_data)
         
         # Apply conditional approval logic
         try:
@@ -63,10 +80,10 @@ class ExpenseSerializer(serializers.ModelSerializer):
             conditional_service = ConditionalApprovalService()
             approval_info = conditional_service.determine_approval_requirements(expense)
             
-            # Update expense status based on conditional logic
+            # Set the starting status based on conditional logic
             if approval_info['status'] == 'AUTO_APPROVED':
                 expense.status = 'APPROVED'
-                expense.approved_at = expense.created_at
+                expense.approved_at = timezone.now()
             elif approval_info['status'] == 'REJECTED':
                 expense.status = 'REJECTED'
             elif approval_info['status'] == 'ESCALATED':
@@ -75,21 +92,20 @@ class ExpenseSerializer(serializers.ModelSerializer):
             else:
                 expense.status = 'PENDING'
             
-            expense.save()
-            
-            # Store approval info for frontend
-            expense._approval_info = approval_info
-            
         except Exception as e:
             # If conditional logic fails, default to pending
             expense.status = 'PENDING'
-            expense.save()
-            expense._approval_info = {
+            approval_info = {
                 'status': 'PENDING_APPROVAL',
                 'reason': 'Manual review required',
                 'fallback': True
             }
         
+        expense.save()
+        
+        # Store approval info for frontend
+        expense._approval_info = approval_info
+        
         return expense
     
     def validate_amount(self, value):
@@ -100,23 +116,64 @@ class ExpenseSerializer(serializers.ModelSerializer):
     
     def validate_expense_date(self, value):
         """Validate expense date"""
-        from django.utils import timezone
         if value > timezone.now().date():
             raise serializers.ValidationError("Expense date cannot be in the future.")
         return value
 
 class ExpenseCreateSerializer(serializers.ModelSerializer):
-    """Serializer for creating expenses"""
+    """Serializer for creating expenses, optionally prefilled from a scanned receipt"""
+    
+    # Fields left out are taken from the completed scan, see OCRResult.to_expense_data()
+    ocr_result = serializers.PrimaryKeyRelatedField(
+        queryset=OCRResult.objects.filter(status='COMPLETED'),
+        write_only=True,
+        required=False
+    )
+    
+    # Required unless an ocr_result provides them
+    OCR_FILLED_FIELDS = ['amount', 'expense_date', 'description']
     
     class Meta:
         model = Expense
         fields = [
             'amount', 'currency', 'category', 'description',
-            'expense_date', 'receipt_image', 'merchant_name'
+            'expense_date', 'receipt_image', 'merchant_name', 'ocr_result'
         ]
+        extra_kwargs = {
+            'amount': {'required': False},
+            'expense_date': {'required': False},
+            'description': {'required': False},
+        }
+    
+    def validate_ocr_result(self, value):
+        """Only the user's own scans can be used"""
+        if value.uploaded_by_id != self.context['request'].user.id:
+            raise serializers.ValidationError("Scan not found.")
+        return value
+    
+    def validate(self, attrs):
+        """Fill the fields not given from the scan, then require the essential ones"""
+        ocr_result = attrs.get('ocr_result')
+        if ocr_result is not None:
+            for field, value in ocr_result.to_expense_data().items():
+                if attrs.get(field) in (None, '') and value not in (None, ''):
+                    attrs[field] = value
+            if not attrs.get('receipt_image'):
+                attrs['receipt_image'] = ocr_result.image.name
+        
+        errors = {
+            field: ["This field is required."]
+            for field in self.OCR_FILLED_FIELDS if attrs.get(field) in (None, '')
+        }
+        if errors:
+            raise serializers.ValidationError(errors)
+        if attrs['amount'] <= 0:
+            raise serializers.ValidationError({'amount': ["Amount must be greater than 0."]})
+        return attrs
     
     def create(self, validated_data):
         """Create expense with auto-assignment"""
+        validated_data.pop('ocr_result', None)
         user = self.context['request'].user
         validated_data['submitted_by'] = user
         
@@ -139,9 +196,23 @@ class ExpenseUpdateSerializer(serializers.ModelSerializer):
     
     def validate(self, attrs):
         """Validate expense update"""
-        if self.instance.status not in ['DRAFT', 'PENDING']:
+        if self.instance.status not in ExpenseStateMachine.EDITABLE_STATUSES:
             raise serializers.ValidationError("Cannot edit approved or rejected expenses.")
         return attrs
+    
+    def update(self, instance, validated_data):
+        """
+        Write only the edited columns, guarded by the version read (see
+        ExpenseStateMachine.edit). Raises StaleExpense if the expense was
+        approved, rejected or otherwise changed in the meantime.
+        """
+        image = validated_data.get('receipt_image')
+        if image:
+            # A queryset update doesn't store uploads, store it like save() would
+            instance.receipt_image.save(image.name, image, save=False)
+            validated_data['receipt_image'] = instance.receipt_image.name
+        ExpenseStateMachine().edit(instance, **validated_data)
+        return instance
 
 class ExpenseApprovalSerializer(serializers.Serializer):
     """Serializer for expense approval/rejection"""
@@ -163,12 +234,12 @@ class ExpenseStatsSerializer(serializers.Serializer):
     """Serializer for expense statistics"""
     
     total_expenses = serializers.IntegerField()
-    total_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    total_amount = serializers.DecimalField(max_digits=15, decimal_places=2)
     pending_expenses = serializers.IntegerField()
     approved_expenses = serializers.IntegerField()
     rejected_expenses = serializers.IntegerField()
-    pending_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
-    approved_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
-    rejected_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    pending_amount = serializers.DecimalField(max_digits=15, decimal_places=2)
+    approved_amount = serializers.DecimalField(max_digits=15, decimal_places=2)
+    rejected_amount = serializers.DecimalField(max_digits=15, decimal_places=2)
     expenses_by_category = serializers.DictField()
     expenses_by_month = serializers.DictField()
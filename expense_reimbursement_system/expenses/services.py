@@ -0,0 +1,288 @@
+from datetime import date
+from decimal import Decimal
+from django.db import transaction, IntegrityError
+from django.db.models import Q, F, Sum, Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from .models import Expense, ExpenseRollup
+
+ZERO_AMOUNT = Decimal('0.00')
+
+
+class ExpenseStatsService:
+    """Service for computing expense statistics with constant query count"""
+
+    def get_stats(self, rollups, months=12):
+        """
+        Compute status, category and calendar-month buckets from ExpenseRollup rows.
+
+        Runs one conditional aggregation for the status totals, one GROUP BY
+        for categories and one GROUP BY month for the monthly window, so the
+        query count does not depend on the number of expenses. Amounts are
+        returned as Decimal.
+        """
+        rollups = rollups.order_by()
+        stats = self.get_status_totals(rollups)
+        stats['by_category'] = self.get_category_totals(rollups)
+        stats['by_month'] = self.get_monthly_totals(rollups, months)
+        return stats
+
+    def get_status_totals(self, rollups):
+        """Get overall and per-status counts and amounts in a single query"""
+        aggregates = {
+            'total_count': Sum('count'),
+            'total_amount': Sum('amount'),
+        }
+        for status, _ in Expense.STATUS_CHOICES:
+            aggregates[f'{status}_count'] = Sum('count', filter=Q(status=status))
+            aggregates[f'{status}_amount'] = Sum('amount', filter=Q(status=status))
+
+        row = rollups.order_by().aggregate(**aggregates)
+
+        return {
+            'total_count': row['total_count'] or 0,
+            'total_amount': row['total_amount'] or ZERO_AMOUNT,
+            'by_status': {
+                status: {
+                    'count': row[f'{status}_count'] or 0,
+                    'amount': row[f'{status}_amount'] or ZERO_AMOUNT,
+                }
+                for status, _ in Expense.STATUS_CHOICES
+            },
+        }
+
+    def get_category_totals(self, rollups):
+        """Get counts and amounts grouped by category name"""
+        rows = rollups.order_by().values('category__name').annotate(
+            total_count=Sum('count'),
+            total_amount=Sum('amount')
+        ).filter(total_count__gt=0).order_by('category__name')
+
+        return {
+            row['category__name']: {
+                'count': row['total_count'],
+                'amount': row['total_amount'] or ZERO_AMOUNT,
+            }
+            for row in rows
+        }
+
+    def get_monthly_totals(self, rollups, months=12):
+        """Get counts and amounts for the last N calendar months, newest first"""
+        month_starts = self.get_month_starts(months)
+
+        buckets = {
+            month_start.strftime('%Y-%m'): {'count': 0, 'amount': ZERO_AMOUNT}
+            for month_start in month_starts
+        }
+
+        rows = rollups.order_by().filter(
+            month__gte=month_starts[-1]
+        ).values('month').annotate(
+            total_count=Sum('count'),
+            total_amount=Sum('amount')
+        )
+
+        for row in rows:
+            month_key = row['month'].strftime('%Y-%m')
+            if month_key in buckets:
+                buckets[month_key] = {
+                    'count': row['total_count'],
+                    'amount': row['total_amount'] or ZERO_AMOUNT,
+                }
+
+        return buckets
+
+    def get_month_starts(self, months, today=None):
+        """Get the first day of each of the last N calendar months, newest first"""
+        today = today or timezone.now().date()
+        year, month = today.year, today.month
+
+        month_starts = []
+        for _ in range(max(months, 1)):
+            month_starts.append(date(year, month, 1))
+            month -= 1
+            if month == 0:
+                year, month = year - 1, 12
+
+        return month_starts
+
+
+class ExpenseRollupService:
+    """Service for maintaining the materialized ExpenseRollup table"""
+
+    KEY_FIELDS = ['company_id', 'submitted_by_id', 'category_id', 'month', 'status']
+
+    def get_rollup_state(self, expense):
+        """Get the (rollup key, amount) pair an expense contributes, or None"""
+        expense_date = expense.expense_date
+        if isinstance(expense_date, str):
+            expense_date = date.fromisoformat(expense_date)
+
+        if not (expense.company_id and expense.submitted_by_id and expense.category_id
+                and expense_date and expense.amount is not None):
+            return None
+
+        key = (
+            expense.company_id,
+            expense.submitted_by_id,
+            expense.category_id,
+            expense_date.replace(day=1),
+            expense.status,
+        )
+        return key, Decimal(str(expense.amount))
+
+    def apply_change(self, previous_state, current_state):
+        """Move an expense's contribution from its previous bucket to its current one"""
+        if previous_state == current_state:
+            return
+
+        if previous_state is not None:
+            key, amount = previous_state
+            self.apply_delta(key, -1, -amount)
+
+        if current_state is not None:
+            key, amount = current_state
+            self.apply_delta(key, 1, amount)
+
+    def apply_delta(self, key, count, amount):
+        """Atomically add count and amount to a rollup bucket, creating it if needed"""
+        lookup = dict(zip(self.KEY_FIELDS, key))
+
+        updated = ExpenseRollup.objects.filter(**lookup).update(
+            count=F('count') + count,
+            amount=F('amount') + amount,
+            updated_at=timezone.now()
+        )
+        if updated or count < 0:
+            # A missing bucket on removal means the rows are being cascade-deleted
+            # along with their company or submitter, so there is nothing to undo
+            return
+
+        try:
+            with transaction.atomic():
+                ExpenseRollup.objects.create(count=count, amount=amount, **lookup)
+        except IntegrityError:
+            # Created concurrently by another writer, add to it instead
+            ExpenseRollup.objects.filter(**lookup).update(
+                count=F('count') + count,
+                amount=F('amount') + amount,
+                updated_at=timezone.now()
+            )
+
+    def apply_changes(self, changes, batch_size=1000):
+        """
+        Apply many (previous state, current state) changes at once.
+
+        Deltas are summed per bucket, the existing buckets are locked and
+        updated in one bulk_update and the missing ones bulk created, so the
+        query count does not grow with the number of expenses. Used by bulk
+        writers that bypass Expense.save().
+        """
+        deltas = {}
+        for previous_state, current_state in changes:
+            if previous_state == current_state:
+                continue
+            for state, sign in ((previous_state, -1), (current_state, 1)):
+                if state is None:
+                    continue
+                key, amount = state
+                count_delta, amount_delta = deltas.get(key, (0, ZERO_AMOUNT))
+                deltas[key] = (count_delta + sign, amount_delta + sign * amount)
+
+        deltas = {key: delta for key, delta in deltas.items() if delta != (0, ZERO_AMOUNT)}
+        if not deltas:
+            return
+
+        # Narrow the lock to the buckets' key values, exact keys are matched below
+        columns = list(zip(*deltas))
+        candidates = ExpenseRollup.objects.select_for_update().filter(**{
+            f'{field}__in': set(values) for field, values in zip(self.KEY_FIELDS, columns)
+        })
+
+        now = timezone.now()
+        updated = []
+        for rollup in candidates:
+            key = tuple(getattr(rollup, field) for field in self.KEY_FIELDS)
+            if key not in deltas:
+                continue
+            count, amount = deltas.pop(key)
+            rollup.count += count
+            rollup.amount += amount
+            rollup.updated_at = now
+            updated.append(rollup)
+        ExpenseRollup.objects.bulk_update(updated, ['count', 'amount', 'updated_at'], batch_size=batch_size)
+
+        # As in apply_delta(), a missing bucket is only created for additions
+        missing = {key: delta for key, delta in deltas.items() if delta[0] > 0}
+        try:
+            with transaction.atomic():
+                ExpenseRollup.objects.bulk_create(
+                    [
+                        ExpenseRollup(count=count, amount=amount, **dict(zip(self.KEY_FIELDS, key)))
+                        for key, (count, amount) in missing.items()
+                    ],
+                    batch_size=batch_size
+                )
+        except IntegrityError:
+            # Some were created concurrently, fall back to one bucket at a time
+            for key, (count, amount) in missing.items():
+                self.apply_delta(key, count, amount)
+
+    def compute_company_rollups(self, company_id):
+        """Aggregate a company's expenses into rollup buckets straight from Expense"""
+        rows = Expense.objects.filter(company_id=company_id).order_by().annotate(
+            month=TruncMonth('expense_date')
+        ).values(*self.KEY_FIELDS).annotate(
+            total_count=Count('id'),
+            total_amount=Sum('amount')
+        )
+
+        return {
+            tuple(row[field] for field in self.KEY_FIELDS): (row['total_count'], row['total_amount'] or ZERO_AMOUNT)
+            for row in rows
+        }
+
+    def get_company_rollups(self, company_id):
+        """Get a company's stored rollup buckets, ignoring empty ones"""
+        rows = ExpenseRollup.objects.filter(company_id=company_id).exclude(
+            count=0, amount=ZERO_AMOUNT
+        ).values(*self.KEY_FIELDS, 'count', 'amount')
+
+        return {
+            tuple(row[field] for field in self.KEY_FIELDS): (row['count'], row['amount'])
+            for row in rows
+        }
+
+    def rebuild_company(self, company_id, batch_size=1000):
+        """Replace a company's rollups with freshly aggregated ones"""
+        expected = self.compute_company_rollups(company_id)
+
+        with transaction.atomic():
+            ExpenseRollup.objects.filter(company_id=company_id).delete()
+            ExpenseRollup.objects.bulk_create(
+                [
+                    ExpenseRollup(count=count, amount=amount, **dict(zip(self.KEY_FIELDS, key)))
+                    for key, (count, amount) in expected.items()
+                ],
+                batch_size=batch_size
+            )
+
+        return len(expected)
+
+    def find_drift(self, company_id):
+        """Compare stored rollups with the expense table and return mismatching buckets"""
+        expected = self.compute_company_rollups(company_id)
+        stored = self.get_company_rollups(company_id)
+
+        drift = []
+        for key in sorted(set(expected) | set(stored), key=str):
+            expected_value = expected.get(key, (0, ZERO_AMOUNT))
+            stored_value = stored.get(key, (0, ZERO_AMOUNT))
+            if expected_value != stored_value:
+                drift.append({
+                    'key': dict(zip(self.KEY_FIELDS, key)),
+                    'expected': expected_value,
+                    'stored': stored_value,
+                })
+
+        return drift
@@ -0,0 +1,16 @@
+from django.db.models.signals import pre_delete, post_delete
+from django.dispatch import receiver
+from .models import Expense
+from .services import ExpenseRollupService
+
+
+@receiver(pre_delete, sender=Expense)
+def remember_deleted_rollup_state(sender, instance, **kwargs):
+    """Read the rollup state of the row being deleted, the instance may be stale"""
+    instance._deleted_rollup_state = instance.get_saved_rollup_state(lock=True)
+
+
+@receiver(post_delete, sender=Expense)
+def remove_expense_from_rollups(sender, instance, **kwargs):
+    """Take a deleted expense out of its ExpenseRollup bucket"""
+    ExpenseRollupService().apply_change(getattr(instance, '_deleted_rollup_state', None), None)
@@ -0,0 +1,268 @@
+"""
+Expense status transitions.
+
+Approving used to count the APPROVED rows, pick the next step and save() the
+whole expense, outside of any transaction. Two workers approving at the same
+time could both advance from the same step (skipping one) or overwrite each
+other's columns.
+
+Every transition here is a conditional UPDATE of only the changed columns,
+guarded by the version the caller read:
+
+    UPDATE expense SET status = ..., version = version + 1
+    WHERE id = ... AND version = <version read>
+
+If another worker wrote the expense first, no row matches and the attempt is
+rolled back and re-run against the fresh row (which re-checks who the current
+approver is), up to max_retries times. No lock is held while deciding, only
+the UPDATE's own row lock until commit. Rollups are moved in the same
+transaction, since queryset updates bypass Expense.save().
+"""
+import random
+import time
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from approvals.evaluation import ApprovalSnapshot
+from approvals.models import ExpenseApproval
+from .models import Expense
+from .services import ExpenseRollupService
+
+
+class InvalidTransition(Exception):
+    """The expense cannot make this transition in its current state"""
+
+
+class StaleExpense(Exception):
+    """The expense was changed by someone else since it was read"""
+
+
+class TransitionConflict(Exception):
+    """The transition kept losing to concurrent writers and was given up"""
+
+
+class ExpenseStateMachine:
+    """Versioned, retrying status transitions for expenses"""
+
+    TRANSITIONS = {
+        'DRAFT': {'PENDING'},
+        # PENDING -> PENDING moves the expense on to the next approver
+        'PENDING': {'PENDING', 'APPROVED', 'REJECTED', 'ESCALATED'},
+        'ESCALATED': {'PENDING', 'APPROVED', 'REJECTED'},
+        'APPROVED': {'PAID'},
+        'REJECTED': set(),
+        'PAID': set(),
+    }
+
+    # Statuses in which the submitter may still edit the expense
+    EDITABLE_STATUSES = ('DRAFT', 'PENDING')
+
+    # Columns written alongside an approval record decision
+    APPROVAL_FIELDS = ['status', 'comments', 'approved_at', 'updated_at']
+
+    def __init__(self, max_retries=5, backoff=0.01):
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def can_transition(self, from_status, to_status):
+        return to_status in self.TRANSITIONS.get(from_status, ())
+
+    def is_awaiting_approval(self, expense):
+        return self.can_transition(expense.status, 'APPROVED')
+
+    def transition(self, expense, status, **changes):
+        """
+        Write a status change and the given columns with a conditional UPDATE.
+
+        Raises InvalidTransition if the status change is not allowed and
+        StaleExpense if the expense was written since it was read. The
+        instance is only updated once the row has been.
+        """
+        if not self.can_transition(expense.status, status):
+            raise InvalidTransition(f'Cannot move an expense from {expense.status} to {status}')
+
+        changes['status'] = status
+        changes['updated_at'] = timezone.now()
+        previous_state = expense.get_rollup_state()
+
+        updated = Expense.objects.filter(pk=expense.pk, version=expense.version).update(
+            version=F('version') + 1,
+            **changes
+        )
+        if not updated:
+            raise StaleExpense(expense.pk)
+
+        for name, value in changes.items():
+            setattr(expense, name, value)
+        expense.version += 1
+
+        current_state = expense.get_rollup_state()
+        ExpenseRollupService().apply_change(previous_state, current_state)
+
+    def edit(self, expense, **changes):
+        """
+        Write the submitter's edits with a conditional UPDATE of only those columns.
+
+        The edit is based on what the submitter saw, so it is not retried:
+        raises StaleExpense if the expense was written since it was read, or
+        is no longer editable, e.g. because it was approved in the meantime.
+        """
+        if expense.status not in self.EDITABLE_STATUSES:
+            raise InvalidTransition(f'Cannot edit an expense that is {expense.status}')
+
+        changes['updated_at'] = timezone.now()
+        previous_state = expense.get_rollup_state()
+
+        with transaction.atomic():
+            updated = Expense.objects.filter(
+                pk=expense.pk,
+                version=expense.version,
+                status__in=self.EDITABLE_STATUSES
+            ).update(version=F('version') + 1, **changes)
+            if not updated:
+                raise StaleExpense(expense.pk)
+
+            for name, value in changes.items():
+                setattr(expense, name, value)
+            expense.version += 1
+
+            current_state = expense.get_rollup_state()
+            ExpenseRollupService().apply_change(previous_state, current_state)
+
+    def run(self, expense, action):
+        """
+        Run action(expense) in its own transaction, retrying on StaleExpense.
+
+        The first attempt uses the instance as given, later ones refresh it
+        from the database first, so the caller's instance ends up current.
+        """
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # Spread out workers that collided on the same expense
+                time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+                expense.refresh_from_db()
+            try:
+                with transaction.atomic():
+                    return action(expense)
+            except StaleExpense:
+                continue
+
+        raise TransitionConflict(
+            f'Expense {expense.pk} was changed concurrently {self.max_retries + 1} times, giving up'
+        )
+
+    def check_approver(self, expense, approver):
+        if expense.current_approver_id != approver.pk:
+            raise InvalidTransition('This expense is not assigned to you for approval')
+        if not self.is_awaiting_approval(expense):
+            raise InvalidTransition('This expense is not awaiting approval')
+
+    def record_decision(self, snapshot, expense, approver, status, comments=None):
+        """Set the approver's decision on their approval record, in memory only"""
+        approval = snapshot.get_approval(approver.pk)
+        if approval is None:
+            approval = ExpenseApproval(expense=expense, approver=approver)
+        approval.status = status
+        approval.comments = comments
+        if status == 'APPROVED':
+            approval.approved_at = timezone.now()
+        snapshot.record(approval)
+        return approval
+
+    def save_approval(self, approval):
+        if approval._state.adding:
+            approval.save()
+        else:
+            approval.save(update_fields=self.APPROVAL_FIELDS)
+
+    def advance(self, expense, snapshot, evaluate_rules=True):
+        """
+        Move an expense on to its next approver, or approve it if the flow's
+        rules are met or no step is left. Returns True if rules were met.
+        """
+        rules_met = evaluate_rules and snapshot.evaluate()
+        next_step = None if rules_met else snapshot.get_next_step()
+        now = timezone.now()
+
+        if next_step:
+            self.transition(
+                expense,
+                'PENDING',
+                current_approver_id=next_step.approver_id,
+                current_step_number=next_step.step_number,
+                submitted_at=now
+            )
+            if snapshot.get_approval(next_step.approver_id) is None:
+                pending = ExpenseApproval(expense=expense, approver_id=next_step.approver_id, status='PENDING')
+                snapshot.record(pending)
+                self.save_approval(pending)
+        else:
+            self.transition(expense, 'APPROVED', current_approver=None, approved_at=now)
+
+        return rules_met
+
+    def submit(self, expense, approval_flow, approver, step_number=1):
+        """
+        Submit a draft expense to its flow and first approver, who acts for
+        the flow step numbered step_number.
+        """
+        def action(expense):
+            if expense.status != 'DRAFT':
+                raise InvalidTransition('Only draft expenses can be submitted for approval')
+
+            self.transition(
+                expense,
+                'PENDING',
+                approval_flow=approval_flow,
+                current_approver=approver,
+                current_step_number=step_number if approver else 0,
+                submitted_at=timezone.now()
+            )
+            if approver:
+                ExpenseApproval.objects.get_or_create(
+                    expense=expense,
+                    approver=approver,
+                    defaults={'status': 'PENDING'}
+                )
+            return expense
+
+        return self.run(expense, action)
+
+    def approve(self, expense, approver, comments=None, evaluate_rules=True):
+        """Record an approval and advance the expense. Returns True if rules were met"""
+        def action(expense):
+            self.check_approver(expense, approver)
+            snapshot = ApprovalSnapshot.load(expense)
+            approval = self.record_decision(snapshot, expense, approver, 'APPROVED', comments)
+            # The expense row is claimed first, a losing worker writes nothing
+            rules_met = self.advance(expense, snapshot, evaluate_rules)
+            self.save_approval(approval)
+            return rules_met
+
+        return self.run(expense, action)
+
+    def reject(self, expense, approver, comments=None):
+        """Record a rejection and close the expense"""
+        def action(expense):
+            self.check_approver(expense, approver)
+            snapshot = ApprovalSnapshot.load(expense)
+            approval = self.record_decision(snapshot, expense, approver, 'REJECTED', comments)
+            self.transition(expense, 'REJECTED', current_approver=None)
+            self.save_approval(approval)
+            return expense
+
+        return self.run(expense, action)
+
+    def escalate(self, expense, approver, comments=None):
+        """Record an escalation, the expense stays with its current approver"""
+        def action(expense):
+            self.check_approver(expense, approver)
+            snapshot = ApprovalSnapshot.load(expense)
+            approval = self.record_decision(snapshot, expense, approver, 'ESCALATED', comments)
+            self.transition(expense, 'ESCALATED')
+            self.save_approval(approval)
+            return expense
+
+        return self.run(expense, action)
@@ -1,3 +1,315 @@
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from approvals.models import ExpenseApproval
+from companies.models import Company
+from users.models import User
+from .models import Expense, ExpenseCategory
+from .services import ExpenseRollupService
+from .state_machine import ExpenseStateMachine, StaleExpense, TransitionConflict
+
+
+class ExpenseQueryFixtureMixin:
+    """
+    A manager, an admin and two employees, each employee with several pending
+    expenses that carry several approval records each. Enough rows that a
+    query per expense or per approval shows up in the query counts.
+    """
+
+    EXPENSES_PER_EMPLOYEE = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Acme')
+        cls.admin = User.objects.create_user(username='admin', password='x', company=cls.company, role='ADMIN')
+        cls.manager = User.objects.create_user(
+            username='manager', password='x', company=cls.company, role='MANAGER', manager=cls.admin
+        )
+        cls.employees = [
+            User.objects.create_user(
+                username=f'employee{number}', password='x', company=cls.company, manager=cls.manager
+            )
+            for number in range(2)
+        ]
+        categories = [ExpenseCategory.objects.create(name=name) for name in ('Meals', 'Travel')]
+
+        for employee in cls.employees:
+            for number in range(cls.EXPENSES_PER_EMPLOYEE):
+                expense = Expense.objects.create(
+                    submitted_by=employee,
+                    company=cls.company,
+                    amount=Decimal('10.00') + number,
+                    category=categories[number % 2],
+                    description=f'Expense {number}',
+                    expense_date=date(2024, 1, number + 1),
+                    status='PENDING',
+                    current_approver=cls.manager,
+                    current_step_number=2
+                )
+                ExpenseApproval.objects.create(expense=expense, approver=cls.admin, status='APPROVED')
+                ExpenseApproval.objects.create(expense=expense, approver=cls.manager, status='PENDING')
+
+    def get_client(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def assert_list_queries(self, user, url, count, expected_rows):
+        """Check the endpoint's query budget and that every row was returned"""
+        client = self.get_client(user)
+        with self.assertNumQueries(count):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        rows = data['results'] if isinstance(data, dict) else data
+        self.assertEqual(len(rows), expected_rows)
+        for row in rows:
+            self.assertEqual(len(row['approval_history']), 2)
+        return response
+
+
+class ExpenseListQueryCountTests(ExpenseQueryFixtureMixin, TestCase):
+    """Query budgets of the expense list endpoints, independent of the number of rows"""
+
+    # Page numbers: COUNT, the page of expenses, their approvals with approvers.
+    # Keyset pages and the other lists skip the COUNT
+
+    def test_expense_list(self):
+        self.assert_list_queries(self.admin, '/api/expenses/', 3, 2 * self.EXPENSES_PER_EMPLOYEE)
+
+    def test_expense_list_cursor_pagination(self):
+        self.assert_list_queries(
+            self.manager, '/api/expenses/?pagination=cursor', 2, 2 * self.EXPENSES_PER_EMPLOYEE
+        )
+
+    def test_my_expenses(self):
+        self.assert_list_queries(self.employees[0], '/api/my-expenses/', 2, self.EXPENSES_PER_EMPLOYEE)
+
+    def test_expenses_for_approval(self):
+        self.assert_list_queries(
+            self.manager, '/api/expenses/for-approval/', 2, 2 * self.EXPENSES_PER_EMPLOYEE
+        )
+
+
+class SparseFieldsetTests(ExpenseQueryFixtureMixin, TestCase):
+    """?fields= and ?view=summary load only the columns and relations they need"""
+
+    def get_rows(self, user, url, count):
+        with self.assertNumQueries(count):
+            response = self.get_client(user).get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        return data['results'] if isinstance(data, dict) else data
+
+    def test_summary_view(self):
+        # No approvals prefetch, the category is joined
+        rows = self.get_rows(self.manager, '/api/expenses/?pagination=cursor&view=summary', 1)
+        self.assertEqual(len(rows), 2 * self.EXPENSES_PER_EMPLOYEE)
+        self.assertEqual(set(rows[0]), {'id', 'amount', 'currency', 'status', 'expense_date', 'category_name'})
+        self.assertIn(rows[0]['category_name'], ('Meals', 'Travel'))
+
+    def test_requested_relations(self):
+        rows = self.get_rows(
+            self.manager, '/api/expenses/?pagination=cursor&fields=submitted_by_name,approval_history', 2
+        )
+        self.assertEqual(set(rows[0]), {'id', 'submitted_by_name', 'approval_history'})
+        for row in rows:
+            self.assertEqual(len(row['approval_history']), 2)
+
+    def test_related_manager(self):
+        # The approvals of one expense, matched back to it through the kept foreign key.
+        # The expense, its submitter for the permission check, then the approvals
+        expense = Expense.objects.filter(submitted_by=self.employees[0]).first()
+        with self.assertNumQueries(3):
+            response = self.get_client(self.manager).get(
+                f'/api/approval-history/{expense.pk}/?fields=status,approver_name'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [row['approver_name'] for row in response.data['approval_history']],
+            [self.admin.get_full_name(), self.manager.get_full_name()]
+        )
+
+
+class ExpenseSubmitStepTests(TestCase):
+    """Flows whose step numbers do not start at 1 or have gaps"""
+
+    @classmethod
+    def setUpTestData(cls):
+        from approvals.models import ApprovalFlow, ApprovalStep
+
+        cls.company = Company.objects.create(name='Acme')
+        cls.admin = User.objects.create_user(username='admin', password='x', company=cls.company, role='ADMIN')
+        cls.manager = User.objects.create_user(
+            username='manager', password='x', company=cls.company, role='MANAGER', manager=cls.admin
+        )
+        cls.employee = User.objects.create_user(
+            username='employee', password='x', company=cls.company, manager=cls.manager
+        )
+        cls.category = ExpenseCategory.objects.create(name='Meals')
+        cls.flow = ApprovalFlow.objects.create(company=cls.company, name='Gapped')
+        ApprovalStep.objects.create(flow=cls.flow, step_number=10, approver=cls.manager)
+        ApprovalStep.objects.create(flow=cls.flow, step_number=20, approver=cls.admin)
+
+    def test_submit_and_approve_follow_step_numbers(self):
+        from approvals.services import ApprovalService
+
+        expense = Expense.objects.create(
+            submitted_by=self.employee,
+            company=self.company,
+            amount=Decimal('25.00'),
+            category=self.category,
+            description='Lunch',
+            expense_date=date(2024, 1, 1)
+        )
+        ExpenseStateMachine().submit(expense, self.flow, self.manager, 10)
+        expense.refresh_from_db()
+        self.assertEqual(expense.current_step_number, 10)
+        self.assertEqual(expense.get_next_approver(), self.admin)
+
+        ApprovalService().process_approval(expense, self.manager, 'approve')
+        expense.refresh_from_db()
+        self.assertEqual(expense.status, 'PENDING')
+        self.assertEqual(expense.current_approver, self.admin)
+        self.assertEqual(expense.current_step_number, 20)
+        self.assertIsNone(expense.get_next_approver())
+
+
+class ExpenseRollupConsistencyTests(TestCase):
+    """Saves and deletes of instances loaded before another write keep the rollups right"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Acme')
+        cls.employee = User.objects.create_user(username='employee', password='x', company=cls.company)
+        cls.category = ExpenseCategory.objects.create(name='Meals')
+
+    def setUp(self):
+        self.expense = Expense.objects.create(
+            submitted_by=self.employee,
+            company=self.company,
+            amount=Decimal('25.00'),
+            category=self.category,
+            description='Lunch',
+            expense_date=date(2024, 1, 1),
+            status='PENDING'
+        )
+
+    def assert_no_drift(self):
+        self.assertEqual(ExpenseRollupService().find_drift(self.company.id), [])
+
+    def test_save_of_stale_instance(self):
+        first = Expense.objects.get(pk=self.expense.pk)
+        second = Expense.objects.get(pk=self.expense.pk)
+
+        first.status = 'APPROVED'
+        first.save()
+        second.description = 'Team lunch'
+        second.save()
+
+        self.assertEqual(Expense.objects.get(pk=self.expense.pk).status, 'PENDING')
+        self.assert_no_drift()
+
+    def test_delete_of_stale_instance(self):
+        stale = Expense.objects.get(pk=self.expense.pk)
+        fresh = Expense.objects.get(pk=self.expense.pk)
+        fresh.status = 'APPROVED'
+        fresh.save()
+
+        stale.delete()
+        self.assert_no_drift()
+
+
+class ExpenseVersionTests(TestCase):
+    """Optimistic locking of expenses on their version"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Acme')
+        cls.manager = User.objects.create_user(username='manager', password='x', company=cls.company, role='MANAGER')
+        cls.employee = User.objects.create_user(
+            username='employee', password='x', company=cls.company, manager=cls.manager
+        )
+        cls.category = ExpenseCategory.objects.create(name='Meals')
+
+    def setUp(self):
+        self.expense = Expense.objects.create(
+            submitted_by=self.employee,
+            company=self.company,
+            amount=Decimal('25.00'),
+            category=self.category,
+            description='Lunch',
+            expense_date=date(2024, 1, 1),
+            status='PENDING',
+            current_approver=self.manager,
+            current_step_number=1
+        )
+        self.state_machine = ExpenseStateMachine(backoff=0)
+
+    def test_save_bumps_version(self):
+        self.expense.description = 'Team lunch'
+        self.expense.save()
+        self.assertEqual(self.expense.version, 1)
+        self.expense.save(update_fields=['description'])
+        self.assertEqual(self.expense.version, 2)
+        self.assertEqual(Expense.objects.get(pk=self.expense.pk).version, 2)
+
+    def test_transition_of_stale_instance(self):
+        stale = Expense.objects.get(pk=self.expense.pk)
+        self.expense.description = 'Team lunch'
+        self.expense.save()
+
+        with self.assertRaises(StaleExpense):
+            self.state_machine.transition(stale, 'REJECTED', current_approver=None)
+        self.assertEqual(Expense.objects.get(pk=self.expense.pk).status, 'PENDING')
+
+    def test_edit_of_stale_instance(self):
+        stale = Expense.objects.get(pk=self.expense.pk)
+        self.state_machine.transition(self.expense, 'APPROVED', current_approver=None)
+
+        with self.assertRaises(StaleExpense):
+            self.state_machine.edit(stale, description='Team lunch')
+        saved = Expense.objects.get(pk=self.expense.pk)
+        self.assertEqual((saved.status, saved.description), ('APPROVED', 'Lunch'))
+
+    def test_run_retries_with_a_fresh_instance(self):
+        stale = Expense.objects.get(pk=self.expense.pk)
+        self.expense.description = 'Team lunch'
+        self.expense.save()
+
+        self.state_machine.run(stale, lambda expense: self.state_machine.transition(expense, 'REJECTED'))
+        self.assertEqual(stale.description, 'Team lunch')
+        self.assertEqual(Expense.objects.get(pk=self.expense.pk).status, 'REJECTED')
+
+    def test_run_gives_up(self):
+        attempts = []
+
+        def action(expense):
+            attempts.append(expense.version)
+            raise StaleExpense(expense.pk)
+
+        with self.assertRaises(TransitionConflict):
+            ExpenseStateMachine(max_retries=2, backoff=0).run(self.expense, action)
+        self.assertEqual(len(attempts), 3)
+
+    def test_update_view_conflict(self):
+        client = APIClient()
+        client.force_authenticate(self.employee)
+        edit = ExpenseStateMachine.edit
+
+        def approve_first(state_machine, expense, **changes):
+            # The manager approves between the view reading the expense and writing it
+            ExpenseStateMachine().transition(Expense.objects.get(pk=expense.pk), 'APPROVED', current_approver=None)
+            return edit(state_machine, expense, **changes)
+
+        with mock.patch.object(ExpenseStateMachine, 'edit', approve_first):
+            response = client.patch(f'/api/expenses/{self.expense.pk}/', {'description': 'Team lunch'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Expense.objects.get(pk=self.expense.pk).description, 'Lunch')
 
-# Create your tests here.
+        response = client.patch(f'/api/expenses/{self.expense.pk}/', {'description': 'Team lunch'})
+        self.assertEqual(response.status_code, 400)
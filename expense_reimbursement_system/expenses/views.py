@@ -1,11 +1,9 @@
 from rest_framework import generics, status, permissions, filters
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Sum, Count
-from django.utils import timezone
-from datetime import datetime, timedelta
-from .models import Expense, ExpenseCategory
+from .models import Expense, ExpenseCategory, ExpenseRollup
 from .serializers import (
     ExpenseSerializer, 
     ExpenseCreateSerializer, 
@@ -14,7 +12,10 @@ from .serializers import (
     ExpenseCategorySerializer,
     ExpenseStatsSerializer
 )
-from approvals.models import ExpenseApproval
+from .services import ExpenseStatsService
+from .state_machine import ExpenseStateMachine, InvalidTransition, StaleExpense, TransitionConflict
+from .fieldsets import sparse_queryset
+from .pagination import KeysetPagination
 from users.permissions import (
     AdminPermission, ManagerPermission, EmployeePermission,
     ExpenseAccessPermission, ApprovalPermission
@@ -29,6 +30,19 @@ class ExpenseListCreateView(generics.ListCreateAPIView):
     ordering_fields = ['created_at', 'expense_date', 'amount']
     ordering = ['-created_at']
     
+    @property
+    def pagination_class(self):
+        """
+        Page numbers by default, keyset pages with ?pagination=cursor.
+        
+        Cursor mode always orders newest first and ignores ?ordering=, in
+        exchange deep pages cost the same as the first one.
+        """
+        params = self.request.query_params
+        if params.get('pagination') == 'cursor' or KeysetPagination.cursor_query_param in params:
+            return KeysetPagination
+        return api_settings.DEFAULT_PAGINATION_CLASS
+    
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return ExpenseCreateSerializer
@@ -37,20 +51,11 @@ class ExpenseListCreateView(generics.ListCreateAPIView):
     def get_queryset(self):
         """Filter expenses based on user role"""
         user = self.request.user
-        queryset = Expense.objects.filter(company=user.company)
-        
-        if user.is_employee():
-            # Employees can only see their own expenses
-            queryset = queryset.filter(submitted_by=user)
-        elif user.is_manager():
-            # Managers can see their team's expenses
-            subordinates = user.get_subordinates()
-            queryset = queryset.filter(
-                Q(submitted_by=user) | Q(submitted_by__in=subordinates)
-            )
-        # Admins can see all company expenses
+        # Employees see their own expenses, managers their whole reporting
+        # subtree, admins all company expenses
+        queryset = Expense.objects.filter(company=user.company).visible_to(user)
         
-        return queryset.select_related('submitted_by', 'category', 'current_approver')
+        return sparse_queryset(queryset.for_serializer(), self.request, ExpenseSerializer)
 
 class ExpenseDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update, or delete expense"""
@@ -64,17 +69,21 @@ class ExpenseDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         """Filter expenses based on user role"""
         user = self.request.user
-        queryset = Expense.objects.filter(company=user.company)
+        queryset = Expense.objects.filter(company=user.company).visible_to(user)
         
-        if user.is_employee():
-            queryset = queryset.filter(submitted_by=user)
-        elif user.is_manager():
-            subordinates = user.get_subordinates()
-            queryset = queryset.filter(
-                Q(submitted_by=user) | Q(submitted_by__in=subordinates)
+        return queryset.for_serializer()
+    
+    def update(self, request, *args, **kwargs):
+        """Edit the expense, 409 if it was approved or changed since it was read"""
+        try:
+            return super().update(request, *args, **kwargs)
+        except StaleExpense:
+            return Response(
+                {'error': 'The expense was changed by someone else, reload it and try again.'},
+                status=status.HTTP_409_CONFLICT
             )
-        
-        return queryset.select_related('submitted_by', 'category', 'current_approver')
+        except InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
     
     def perform_destroy(self, instance):
         """Only allow deletion of draft expenses"""
@@ -95,30 +104,26 @@ def submit_expense(request, expense_id):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Set status to pending and submitted timestamp
-        expense.status = 'PENDING'
-        expense.submitted_at = timezone.now()
-        
-        # Determine approval flow and set current approver
+        # Determine approval flow and current approver
         from approvals.services import ApprovalService
         approval_service = ApprovalService()
         approval_flow = approval_service.get_approval_flow_for_expense(expense)
         
+        first_approver = None
+        first_step_number = 1
         if approval_flow:
-            expense.approval_flow = approval_flow
-            first_step = approval_flow.get_steps().first()
+            first_step = approval_flow.get_steps().select_related('approver').first()
             if first_step:
-                expense.current_approver = first_step.approver
-        
-        expense.save()
+                first_approver = first_step.approver
+                first_step_number = first_step.step_number
         
-        # Create initial approval record
-        if expense.current_approver:
-            ExpenseApproval.objects.create(
-                expense=expense,
-                approver=expense.current_approver,
-                status='PENDING'
-            )
+        # Set status to pending and create the initial approval record
+        try:
+            ExpenseStateMachine().submit(expense, approval_flow, first_approver, first_step_number)
+        except InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except TransitionConflict as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
         
         return Response({
             'message': 'Expense submitted for approval',
@@ -153,43 +158,31 @@ def approve_expense(request, expense_id):
             action = serializer.validated_data['action']
             comments = serializer.validated_data.get('comments', '')
             
-            # Get or create approval record
-            approval, created = ExpenseApproval.objects.get_or_create(
-                expense=expense,
-                approver=request.user,
-                defaults={'status': 'PENDING'}
-            )
+            state_machine = ExpenseStateMachine()
             
-            if action == 'approve':
-                approval.approve(comments)
-                
-                # Move to next approver or mark as approved
-                expense.move_to_next_approver()
-                
-                return Response({
-                    'message': 'Expense approved',
-                    'expense': ExpenseSerializer(expense).data
-                })
-                
-            elif action == 'reject':
-                approval.reject(comments)
-                expense.status = 'REJECTED'
-                expense.current_approver = None
-                expense.save()
-                
-                return Response({
-                    'message': 'Expense rejected',
-                    'expense': ExpenseSerializer(expense).data
-                })
-                
-            elif action == 'escalate':
-                approval.escalate(comments)
-                # Escalation logic can be implemented here
-                
-                return Response({
-                    'message': 'Expense escalated',
-                    'expense': ExpenseSerializer(expense).data
-                })
+            try:
+                if action == 'approve':
+                    # Move to next approver or mark as approved
+                    state_machine.approve(expense, request.user, comments, evaluate_rules=False)
+                    message = 'Expense approved'
+                    
+                elif action == 'reject':
+                    state_machine.reject(expense, request.user, comments)
+                    message = 'Expense rejected'
+                    
+                elif action == 'escalate':
+                    state_machine.escalate(expense, request.user, comments)
+                    message = 'Expense escalated'
+            
+            except InvalidTransition as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            except TransitionConflict as e:
+                return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+            
+            return Response({
+                'message': message,
+                'expense': ExpenseSerializer(expense).data
+            })
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
@@ -204,8 +197,10 @@ def approve_expense(request, expense_id):
 def expenses_for_approval(request):
     """Get expenses waiting for user's approval"""
     user = request.user
-    expenses = user.get_expenses_for_approval()
-    serializer = ExpenseSerializer(expenses, many=True)
+    expenses = sparse_queryset(
+        user.get_expenses_for_approval().for_serializer(), request, ExpenseSerializer
+    )
+    serializer = ExpenseSerializer(expenses, many=True, context={'request': request})
     return Response(serializer.data)
 
 @api_view(['GET'])
@@ -214,63 +209,31 @@ def expense_stats(request):
     """Get expense statistics"""
     user = request.user
     
-    # Base queryset
+    # Base rollup queryset
     if user.is_employee():
-        queryset = Expense.objects.filter(submitted_by=user)
+        rollups = ExpenseRollup.objects.filter(submitted_by=user)
     elif user.is_manager():
-        subordinates = user.get_subordinates()
-        queryset = Expense.objects.filter(
-            Q(submitted_by=user) | Q(submitted_by__in=subordinates)
+        rollups = ExpenseRollup.objects.filter(
+            submitted_by__in=user.get_team_members(include_self=True)
         )
     else:  # Admin
-        queryset = Expense.objects.filter(company=user.company)
+        rollups = ExpenseRollup.objects.filter(company=user.company)
     
     # Calculate statistics
-    total_expenses = queryset.count()
-    total_amount = queryset.aggregate(total=Sum('amount'))['total'] or 0
-    
-    pending_expenses = queryset.filter(status='PENDING').count()
-    approved_expenses = queryset.filter(status='APPROVED').count()
-    rejected_expenses = queryset.filter(status='REJECTED').count()
-    
-    pending_amount = queryset.filter(status='PENDING').aggregate(total=Sum('amount'))['total'] or 0
-    approved_amount = queryset.filter(status='APPROVED').aggregate(total=Sum('amount'))['total'] or 0
-    rejected_amount = queryset.filter(status='REJECTED').aggregate(total=Sum('amount'))['total'] or 0
-    
-    # Expenses by category
-    expenses_by_category = {}
-    for expense in queryset.select_related('category'):
-        category_name = expense.category.name
-        if category_name not in expenses_by_category:
-            expenses_by_category[category_name] = {'count': 0, 'amount': 0}
-        expenses_by_category[category_name]['count'] += 1
-        expenses_by_category[category_name]['amount'] += float(expense.amount)
-    
-    # Expenses by month (last 12 months)
-    expenses_by_month = {}
-    for i in range(12):
-        month_date = timezone.now().date().replace(day=1) - timedelta(days=30*i)
-        month_expenses = queryset.filter(
-            expense_date__year=month_date.year,
-            expense_date__month=month_date.month
-        )
-        month_key = month_date.strftime('%Y-%m')
-        expenses_by_month[month_key] = {
-            'count': month_expenses.count(),
-            'amount': float(month_expenses.aggregate(total=Sum('amount'))['total'] or 0)
-        }
+    stats = ExpenseStatsService().get_stats(rollups, months=12)
+    status_totals = stats['by_status']
     
     stats_data = {
-        'total_expenses': total_expenses,
-        'total_amount': total_amount,
-        'pending_expenses': pending_expenses,
-        'approved_expenses': approved_expenses,
-        'rejected_expenses': rejected_expenses,
-        'pending_amount': pending_amount,
-        'approved_amount': approved_amount,
-        'rejected_amount': rejected_amount,
-        'expenses_by_category': expenses_by_category,
-        'expenses_by_month': expenses_by_month,
+        'total_expenses': stats['total_count'],
+        'total_amount': stats['total_amount'],
+        'pending_expenses': status_totals['PENDING']['count'],
+        'approved_expenses': status_totals['APPROVED']['count'],
+        'rejected_expenses': status_totals['REJECTED']['count'],
+        'pending_amount': status_totals['PENDING']['amount'],
+        'approved_amount': status_totals['APPROVED']['amount'],
+        'rejected_amount': status_totals['REJECTED']['amount'],
+        'expenses_by_category': stats['by_category'],
+        'expenses_by_month': stats['by_month'],
     }
     
     serializer = ExpenseStatsSerializer(stats_data)
@@ -309,7 +272,7 @@ def my_expenses(request):
     end_date = request.query_params.get('end_date')
     
     # Base queryset - only user's own expenses
-    queryset = Expense.objects.filter(submitted_by=user).select_related('category', 'current_approver')
+    queryset = Expense.objects.filter(submitted_by=user).for_serializer()
     
     # Apply filters
     if status_filter:
@@ -323,11 +286,13 @@ def my_expenses(request):
     if end_date:
         queryset = queryset.filter(expense_date__lte=end_date)
     
-    # Order by creation date (newest first)
-    queryset = queryset.order_by('-created_at')
+    queryset = sparse_queryset(queryset, request, ExpenseSerializer)
     
-    serializer = ExpenseSerializer(queryset, many=True)
-    return Response(serializer.data)
+    # Newest first, one keyset page at a time
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(queryset, request)
+    serializer = ExpenseSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
@@ -336,7 +301,9 @@ def my_expense_history(request):
     user = request.user
     
     # Get all user's expenses
-    all_expenses = Expense.objects.filter(submitted_by=user).select_related('category', 'current_approver')
+    all_expenses = sparse_queryset(
+        Expense.objects.filter(submitted_by=user).for_serializer(), request, ExpenseSerializer
+    )
     
     # Group by status
     status_groups = {
@@ -347,25 +314,33 @@ def my_expense_history(request):
         'PAID': all_expenses.filter(status='PAID'),
     }
     
-    # Calculate totals for each status
+    # Totals for each status come from the rollups
+    totals = ExpenseStatsService().get_status_totals(
+        ExpenseRollup.objects.filter(submitted_by=user)
+    )
+    
     result = {}
     for status, expenses in status_groups.items():
-        expenses_list = expenses.order_by('-created_at')
-        total_amount = sum(float(exp.amount) for exp in expenses_list)
+        # Each group pages independently through its own ?<status>_cursor=
+        paginator = KeysetPagination()
+        paginator.cursor_query_param = f'{status.lower()}_cursor'
+        page = paginator.paginate_queryset(expenses, request)
         
         result[status.lower()] = {
-            'count': expenses_list.count(),
-            'total_amount': total_amount,
-            'expenses': ExpenseSerializer(expenses_list, many=True).data
+            'count': totals['by_status'][status]['count'],
+            'total_amount': totals['by_status'][status]['amount'],
+            'expenses': ExpenseSerializer(page, many=True, context={'request': request}).data,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
         }
     
     # Add overall statistics
     result['summary'] = {
-        'total_expenses': all_expenses.count(),
-        'total_amount': sum(float(exp.amount) for exp in all_expenses),
-        'pending_count': status_groups['PENDING'].count(),
-        'approved_count': status_groups['APPROVED'].count(),
-        'rejected_count': status_groups['REJECTED'].count(),
+        'total_expenses': totals['total_count'],
+        'total_amount': totals['total_amount'],
+        'pending_count': totals['by_status']['PENDING']['count'],
+        'approved_count': totals['by_status']['APPROVED']['count'],
+        'rejected_count': totals['by_status']['REJECTED']['count'],
     }
     
     return Response(result)
@@ -390,17 +365,12 @@ def submit_expense_for_approval(request, expense_id):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Set status to pending and submitted timestamp
-        expense.status = 'PENDING'
-        expense.submitted_at = timezone.now()
-        
         # Use approval service to determine flow and assign approver
         from approvals.services import ApprovalService
         approval_service = ApprovalService()
         
         # Get or create approval flow for this expense
         approval_flow = approval_service.get_approval_flow_for_expense(expense)
-        expense.approval_flow = approval_flow
         
         # Determine first approver based on IS_MANAGER_APPROVER field
         first_approver = None
@@ -414,9 +384,21 @@ def submit_expense_for_approval(request, expense_id):
             if admin_users.exists():
                 first_approver = admin_users.first()
         
-        # Assign expense to first approver
-        if first_approver:
-            approval_service.assign_expense_to_approver(expense, first_approver)
+        # The first approver acts for the flow's first step
+        first_step_number = 1
+        if approval_flow:
+            from approvals.routing import get_flow_steps
+            flow_steps = get_flow_steps(approval_flow.company_id, approval_flow.id)
+            if flow_steps:
+                first_step_number = flow_steps[0].step_number
+        
+        # Set status to pending and assign expense to first approver
+        try:
+            ExpenseStateMachine().submit(expense, approval_flow, first_approver, first_step_number)
+        except InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except TransitionConflict as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
         
         return Response({
             'message': 'Expense submitted for approval successfully',
@@ -442,50 +424,18 @@ def expense_categories(request):
 def my_expense_stats(request):
     """Get current user's expense statistics"""
     user = request.user
-    expenses = Expense.objects.filter(submitted_by=user)
-    
-    # Calculate statistics
-    total_expenses = expenses.count()
-    total_amount = sum(float(exp.amount) for exp in expenses)
-    
-    # Status breakdown
-    status_counts = {}
-    status_amounts = {}
-    for status, _ in Expense.STATUS_CHOICES:
-        status_expenses = expenses.filter(status=status)
-        status_counts[status] = status_expenses.count()
-        status_amounts[status] = sum(float(exp.amount) for exp in status_expenses)
+    rollups = ExpenseRollup.objects.filter(submitted_by=user)
     
-    # Category breakdown
-    category_breakdown = {}
-    for expense in expenses.select_related('category'):
-        category_name = expense.category.name
-        if category_name not in category_breakdown:
-            category_breakdown[category_name] = {'count': 0, 'amount': 0}
-        category_breakdown[category_name]['count'] += 1
-        category_breakdown[category_name]['amount'] += float(expense.amount)
-    
-    # Monthly breakdown (last 6 months)
-    monthly_breakdown = {}
-    for i in range(6):
-        month_date = timezone.now().date().replace(day=1) - timedelta(days=30*i)
-        month_expenses = expenses.filter(
-            expense_date__year=month_date.year,
-            expense_date__month=month_date.month
-        )
-        month_key = month_date.strftime('%Y-%m')
-        monthly_breakdown[month_key] = {
-            'count': month_expenses.count(),
-            'amount': sum(float(exp.amount) for exp in month_expenses)
-        }
+    # Calculate statistics (last 6 months for the monthly breakdown)
+    stats = ExpenseStatsService().get_stats(rollups, months=6)
     
     return Response({
-        'total_expenses': total_expenses,
-        'total_amount': total_amount,
+        'total_expenses': stats['total_count'],
+        'total_amount': stats['total_amount'],
         'status_breakdown': {
-            'counts': status_counts,
-            'amounts': status_amounts
+            'counts': {status: totals['count'] for status, totals in stats['by_status'].items()},
+            'amounts': {status: totals['amount'] for status, totals in stats['by_status'].items()}
         },
-        'category_breakdown': category_breakdown,
-        'monthly_breakdown': monthly_breakdown
-    })
\ No newline at end of file
+        'category_breakdown': stats['by_category'],
+        'monthly_breakdown': stats['by_month']
+    })
@@ -0,0 +1,109 @@
+"""
+OCR backends.
+
+The OCR_BACKEND setting picks the engine receipts are read with:
+
+- 'tesseract': pytesseract and the tesseract binary, reading OCR_LANGUAGE.
+- 'easyocr': EasyOCR (pip install easyocr), reading OCR_EASYOCR_LANGUAGES.
+  More accurate on photos, but loading its models takes seconds and
+  hundreds of MB.
+- 'fake': returns OCR_FAKE_TEXT for every image, for tests and for
+  development without an OCR engine.
+
+A dotted path to an OCRBackend subclass works too. The backend is built
+on first use and kept for the life of the process, so all scans in a worker
+process share one loaded model.
+"""
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# One line of text read from the image, confidence between 0 and 1
+OCRLine = namedtuple('OCRLine', 'text confidence')
+
+BACKENDS = {
+    'tesseract': 'ocr.backends.TesseractBackend',
+    'easyocr': 'ocr.backends.EasyOCRBackend',
+    'fake': 'ocr.backends.FakeOCRBackend',
+}
+
+FAKE_TEXT = """Corner Coffee House
+12 High Street
+Date: 03/14/2024
+Flat White 3.50
+Croissant 2.75
+TOTAL $6.25
+Thank you!"""
+
+_backend = None
+_lock = threading.Lock()
+
+
+class OCRBackend:
+    """Reads the lines of text in a receipt image"""
+
+    def read(self, image):
+        """Get the lines of text in a PIL image as OCRLines, top to bottom"""
+        raise NotImplementedError
+
+
+class TesseractBackend(OCRBackend):
+    """Tesseract through pytesseract, words grouped back into lines"""
+
+    def __init__(self):
+        import pytesseract
+        self.pytesseract = pytesseract
+        self.language = settings.OCR_LANGUAGE
+
+    def read(self, image):
+        data = self.pytesseract.image_to_data(
+            image, lang=self.language, output_type=self.pytesseract.Output.DICT
+        )
+        lines = {}
+        for index, word in enumerate(data['text']):
+            confidence = float(data['conf'][index])
+            # Blocks, paragraphs and lines without a word have a confidence of -1
+            if confidence < 0 or not word.strip():
+                continue
+            key = (data['block_num'][index], data['par_num'][index], data['line_num'][index])
+            lines.setdefault(key, []).append((word, confidence))
+        return [
+            OCRLine(' '.join(word for word, _ in words), sum(c for _, c in words) / len(words) / 100)
+            for words in lines.values()
+        ]
+
+
+class EasyOCRBackend(OCRBackend):
+    """EasyOCR, one text region per line"""
+
+    def __init__(self):
+        import easyocr
+        self.reader = easyocr.Reader(settings.OCR_EASYOCR_LANGUAGES)
+
+    def read(self, image):
+        import numpy  # Installed with easyocr
+        return [
+            OCRLine(text, float(confidence))
+            for _, text, confidence in self.reader.readtext(numpy.asarray(image))
+        ]
+
+
+class FakeOCRBackend(OCRBackend):
+    """Reads OCR_FAKE_TEXT from every image, with full confidence"""
+
+    def read(self, image):
+        text = getattr(settings, 'OCR_FAKE_TEXT', FAKE_TEXT)
+        return [OCRLine(line.strip(), 1.0) for line in text.splitlines() if line.strip()]
+
+
+def get_backend():
+    """Get this process's OCR backend, building it on first use"""
+    global _backend
+    if _backend is None:
+        # Several worker threads may ask for it at once, only load the model once
+        with _lock:
+            if _backend is None:
+                _backend = import_string(BACKENDS.get(settings.OCR_BACKEND, settings.OCR_BACKEND))()
+    return _backend
@@ -0,0 +1,161 @@
+"""
+Expense fields from the OCR text of a receipt.
+
+Each field's confidence is the OCR confidence of the line it was read from,
+scaled down when the value was guessed rather than labelled: an amount on a
+TOTAL line counts fully, the largest amount on the receipt only half.
+"""
+import re
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+# How much a value found without its label is trusted, relative to a labelled one
+UNLABELLED_DATE_WEIGHT = 0.8
+LARGEST_AMOUNT_WEIGHT = 0.5
+MERCHANT_WEIGHT = 0.8
+
+# Largest amount OCRResult.extracted_amount holds
+MAX_AMOUNT = Decimal('99999999.99')
+AMOUNT_RE = re.compile(r'(?<![\d.,])(\d{1,3}(?:,\d{3})+|\d+)[.,](\d{2})(?![\d%])')
+TOTAL_LABEL_RE = re.compile(
+    r'\b(?:grand\s*total|total(?:\s*(?:due|amount|payable))?|amount\s*(?:due|payable)|balance\s*due|net\s*amount)\b',
+    re.IGNORECASE
+)
+SUBTOTAL_RE = re.compile(r'\bsub\s*-?\s*total', re.IGNORECASE)
+DATE_LABEL_RE = re.compile(r'\bdate\b', re.IGNORECASE)
+
+CURRENCY_SYMBOLS = {'$': 'USD', '£': 'GBP', '€': 'EUR', '₹': 'INR', '¥': 'JPY'}
+CURRENCY_RE = re.compile(r'[$£€₹¥]|\b(?:USD|EUR|GBP|INR|JPY|AUD|CAD|Rs)\b')
+
+MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ('jan', 'january'), ('feb', 'february'), ('mar', 'march'), ('apr', 'april'),
+        ('may',), ('jun', 'june'), ('jul', 'july'), ('aug', 'august'),
+        ('sep', 'sept', 'september'), ('oct', 'october'), ('nov', 'november'), ('dec', 'december'),
+    ], 1)
+    for name in names
+}
+DATE_RES = [
+    # 2024-03-14, 2024/03/14
+    ('ymd', re.compile(r'\b(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})\b')),
+    # 03/14/2024, 14-03-24
+    ('numeric', re.compile(r'\b(\d{1,2})[-/.](\d{1,2})[-/.](\d{4}|\d{2})\b')),
+    # 14 March 2024, 14 Mar, 2024
+    ('dmy', re.compile(r'\b(\d{1,2})\s+([A-Za-z]{3,9})\.?,?\s+(\d{4})\b')),
+    # March 14, 2024
+    ('mdy', re.compile(r'\b([A-Za-z]{3,9})\.?\s+(\d{1,2}),?\s+(\d{4})\b')),
+]
+# Lines that are never the merchant name
+NOT_MERCHANT_RE = re.compile(
+    r'^(?:tax\s+)?(?:invoice|receipt|bill|cash\s+memo|welcome|thank\s+you)\b', re.IGNORECASE
+)
+
+
+def parse_amount(line):
+    """All the amounts with two decimals on a line, left to right"""
+    amounts = []
+    for whole, cents in AMOUNT_RE.findall(line):
+        try:
+            amount = Decimal(f"{whole.replace(',', '')}.{cents}")
+        except InvalidOperation:
+            continue
+        # Longer numbers are phone, card or reference numbers
+        if amount <= MAX_AMOUNT:
+            amounts.append(amount)
+    return amounts
+
+
+def parse_date(line):
+    """The first valid date on a line, or None. Ambiguous numeric dates are read month first"""
+    for kind, pattern in DATE_RES:
+        for match in pattern.finditer(line):
+            first, second, third = match.groups()
+            try:
+                if kind == 'ymd':
+                    return date(int(first), int(second), int(third))
+                if kind == 'numeric':
+                    year = int(third) + (2000 if len(third) == 2 else 0)
+                    month, day = int(first), int(second)
+                    if month > 12:
+                        month, day = day, month
+                    return date(year, month, day)
+                if kind == 'dmy':
+                    return date(int(third), MONTHS[second.lower()], int(first))
+                return date(int(third), MONTHS[first.lower()], int(second))
+            except (KeyError, ValueError):
+                continue
+    return None
+
+
+def extract_receipt_data(lines):
+    """
+    Get the OCRResult fields from a receipt's OCR lines: raw_text, the
+    extracted amount, currency, date and merchant, and their confidences
+    """
+    data = {
+        'raw_text': '\n'.join(line.text for line in lines),
+        'extracted_amount': None,
+        'extracted_currency': None,
+        'extracted_date': None,
+        'extracted_merchant': None,
+        'amount_confidence': None,
+        'date_confidence': None,
+        'merchant_confidence': None,
+    }
+
+    # Amount: the last TOTAL line wins (totals come after subtotals and tax),
+    # its value is on the same line or printed on the next one
+    for index in range(len(lines) - 1, -1, -1):
+        line = lines[index]
+        if not TOTAL_LABEL_RE.search(line.text) or SUBTOTAL_RE.search(line.text):
+            continue
+        for candidate in lines[index:index + 2]:
+            amounts = parse_amount(candidate.text)
+            if amounts:
+                data['extracted_amount'] = amounts[-1]
+                data['amount_confidence'] = min(line.confidence, candidate.confidence)
+                break
+        if data['extracted_amount'] is not None:
+            break
+    else:
+        largest = max(
+            ((amount, line) for line in lines for amount in parse_amount(line.text)),
+            key=lambda pair: pair[0],
+            default=None
+        )
+        if largest:
+            data['extracted_amount'] = largest[0]
+            data['amount_confidence'] = largest[1].confidence * LARGEST_AMOUNT_WEIGHT
+
+    for line in lines:
+        match = CURRENCY_RE.search(line.text)
+        if match:
+            symbol = match.group()
+            data['extracted_currency'] = CURRENCY_SYMBOLS.get(symbol, 'INR' if symbol == 'Rs' else symbol)
+            break
+
+    # Date: a labelled one first, else the first date anywhere
+    dated = [(line, parse_date(line.text)) for line in lines]
+    dated = [(line, value) for line, value in dated if value is not None]
+    labelled = [(line, value) for line, value in dated if DATE_LABEL_RE.search(line.text)]
+    if labelled:
+        line, data['extracted_date'] = labelled[0]
+        data['date_confidence'] = line.confidence
+    elif dated:
+        line, data['extracted_date'] = dated[0]
+        data['date_confidence'] = line.confidence * UNLABELLED_DATE_WEIGHT
+
+    # Merchant: the name is usually printed first
+    for line in lines[:5]:
+        text = line.text.strip()
+        if (sum(character.isalpha() for character in text) >= 3 and not NOT_MERCHANT_RE.match(text)
+                and not parse_amount(text) and parse_date(text) is None):
+            data['extracted_merchant'] = text[:200]
+            data['merchant_confidence'] = line.confidence * MERCHANT_WEIGHT
+            break
+
+    for field in ('amount_confidence', 'date_confidence', 'merchant_confidence'):
+        if data[field] is not None:
+            data[field] = round(data[field], 4)
+    return data
@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from ocr.models import OCRResult
+from ocr.tasks import process_ocr_result
+
+
+class Command(BaseCommand):
+    help = (
+        "Scan OCR results still waiting for OCR, e.g. after the process whose "
+        "thread pool held them restarted. Results stuck in PROCESSING for longer "
+        "than --stale-after are requeued first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=15,
+            help='Minutes after which a PROCESSING result is assumed abandoned (default: 15)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Scan at most this many results'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(minutes=options['stale_after'])
+        # Clearing started_at revokes the abandoned job's claim
+        requeued = OCRResult.objects.filter(status='PROCESSING', started_at__lt=cutoff).update(
+            status='PENDING', started_at=None, updated_at=timezone.now()
+        )
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} abandoned result(s)")
+
+        pending = OCRResult.objects.filter(status='PENDING').order_by('created_at').values_list('pk', flat=True)
+        if options['limit']:
+            pending = pending[:options['limit']]
+
+        counts = {'COMPLETED': 0, 'FAILED': 0}
+        for result_id in list(pending):
+            result = process_ocr_result(result_id)
+            # None: picked up by a web process in the meantime
+            if result is not None:
+                counts[result.status] += 1
+                self.stdout.write(f"{result_id}: {result.status} in {result.processing_time:.2f}s")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {counts['COMPLETED'] + counts['FAILED']} result(s): "
+            f"{counts['COMPLETED']} completed, {counts['FAILED']} failed"
+        ))
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:25
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_started_at(apps, schema_editor):
+    # Results claimed before the column existed, so they can still be requeued
+    OCRResult = apps.get_model("ocr", "OCRResult")
+    OCRResult.objects.filter(status="PROCESSING").update(started_at=F("updated_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ocr", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ocrresult",
+            name="started_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_started_at, migrations.RunPython.noop),
+    ]
@@ -52,6 +52,8 @@ class OCRResult(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     processed_at = models.DateTimeField(null=True, blank=True)
+    # Set when a job claims the result and only that job may finish it, cleared on requeue
+    started_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-created_at']
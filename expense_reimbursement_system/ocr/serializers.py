@@ -6,19 +6,42 @@ class OCRResultSerializer(serializers.ModelSerializer):
     """
     Serializer for OCRResult model.
     """
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    confidence_score = serializers.FloatField(source='get_confidence_score', read_only=True)
+    expense_data = serializers.SerializerMethodField()
+
     class Meta:
         model = OCRResult
         fields = [
             'id',
-            'expense',
-            'image_file',
-            'extracted_text',
+            'image',
+            'status',
+            'status_display',
+            'raw_text',
             'extracted_amount',
-            'extracted_merchant',
+            'extracted_currency',
             'extracted_date',
+            'extracted_merchant',
+            'amount_confidence',
+            'date_confidence',
+            'merchant_confidence',
             'confidence_score',
-            'processing_status',
+            'expense_data',
+            'processing_time',
+            'error_message',
             'created_at',
-            'updated_at'
+            'updated_at',
+            'processed_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        # The extracted values can be corrected before an expense is made from them
+        read_only_fields = [
+            'id', 'status', 'raw_text', 'amount_confidence', 'date_confidence',
+            'merchant_confidence', 'processing_time', 'error_message',
+            'created_at', 'updated_at', 'processed_at'
+        ]
+
+    def get_expense_data(self, obj):
+        """Expense fields to prefill from the scan, once it is done"""
+        if obj.status != 'COMPLETED':
+            return None
+        return obj.to_expense_data()
@@ -0,0 +1,105 @@
+"""
+Background OCR of scanned receipts.
+
+scan_receipt saves an OCRResult as PENDING and, once that is committed,
+hands its id to a small thread pool inside the process. Each job claims its
+result with a conditional UPDATE (PENDING -> PROCESSING) that stamps
+started_at, so a result is never read twice, even with the
+process_ocr_results command running at the same time, and ends up COMPLETED
+or FAILED with its processing time. Only the job holding the current claim
+writes the outcome: a result requeued as abandoned and claimed again is not
+overwritten by its first job if that one finishes after all.
+
+The OCR model is loaded once per process (see backends.get_backend) and
+shared by the pool's threads. With OCR_ASYNC off the scan runs inside the
+request instead.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .backends import get_backend
+from .extraction import extract_receipt_data
+from .models import OCRResult
+from .preprocessing import get_profile, preprocess_image
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.OCR_WORKER_THREADS, thread_name_prefix='ocr'
+                )
+    return _executor
+
+
+def enqueue_ocr(result_id):
+    """Scan the result's image in the background once the current transaction commits"""
+    transaction.on_commit(lambda: get_executor().submit(run_ocr_job, result_id))
+
+
+def run_ocr_job(result_id):
+    close_old_connections()
+    try:
+        process_ocr_result(result_id)
+    except Exception:
+        logger.exception("OCR job for result %s failed", result_id)
+    finally:
+        # Pool threads outlive the job, don't keep a connection open per thread
+        connection.close()
+
+
+def load_image(result):
+    """Open the result's image, preprocessed as OCR_PREPROCESS_PROFILE says"""
+    from PIL import Image, ImageOps
+
+    profile = get_profile()
+    with result.image.open('rb') as image_file:
+        if profile is None:
+            image = ImageOps.exif_transpose(Image.open(image_file))
+            image.load()
+            return image
+        return preprocess_image(image_file, profile)
+
+
+def process_ocr_result(result_id):
+    """
+    Claim a PENDING result, scan its image and store what was read.
+
+    Returns the updated result, or None if it was not PENDING (already
+    claimed by another worker, or finished).
+    """
+    now = timezone.now()
+    claimed = OCRResult.objects.filter(pk=result_id, status='PENDING').update(
+        status='PROCESSING', started_at=now, updated_at=now
+    )
+    if not claimed:
+        return None
+
+    result = OCRResult.objects.get(pk=result_id)
+    started = time.perf_counter()
+    try:
+        fields = extract_receipt_data(get_backend().read(load_image(result)))
+        fields.update(status='COMPLETED', error_message=None)
+    except Exception as e:
+        logger.exception("OCR of result %s failed", result_id)
+        fields = {'status': 'FAILED', 'error_message': str(e) or e.__class__.__name__}
+
+    now = timezone.now()
+    fields.update(processing_time=time.perf_counter() - started, processed_at=now, updated_at=now)
+    # Nothing is written if the claim was lost, e.g. requeued as abandoned
+    OCRResult.objects.filter(pk=result_id, status='PROCESSING', started_at=result.started_at).update(**fields)
+    result.refresh_from_db()
+    return result
@@ -1,3 +1,149 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from companies.models import Company
+from expenses.models import Expense, ExpenseCategory
+from users.models import User
+from . import backends
+from .models import OCRResult
+from .tasks import process_ocr_result
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='expense-system-ocr-tests-')
+
+
+def receipt_image(name='receipt.png'):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (60, 80), 'white').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, OCR_BACKEND='fake', OCR_ASYNC=False, OCR_PREPROCESS_PROFILE='fast')
+class OCRTestCase(TestCase):
+    """Scans read by the fake backend, with images in a temporary MEDIA_ROOT"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Acme')
+        cls.user = User.objects.create_user(username='employee', password='x', company=cls.company)
+        cls.other_user = User.objects.create_user(username='other', password='x', company=cls.company)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # The backend is built once per process, build the fake one for each test
+        patcher = mock.patch.object(backends, '_backend', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_result(self, user=None, image=None, **fields):
+        return OCRResult.objects.create(uploaded_by=user or self.user, image=image or receipt_image(), **fields)
+
+
+class ProcessOCRResultTests(OCRTestCase):
+    """Claiming, scanning and finishing a result"""
+
+    def test_completed(self):
+        result = process_ocr_result(self.create_result().pk)
+        self.assertEqual(result.status, 'COMPLETED')
+        self.assertEqual(result.extracted_amount, Decimal('6.25'))
+        self.assertEqual(result.extracted_date, date(2024, 3, 14))
+        self.assertIsNotNone(result.started_at)
+        self.assertIsNotNone(result.processed_at)
+        self.assertIsNone(result.error_message)
+
+    def test_failed(self):
+        image = SimpleUploadedFile('receipt.png', b'not an image')
+        with self.assertLogs('ocr.tasks', 'ERROR'):
+            result = process_ocr_result(self.create_result(image=image).pk)
+        self.assertEqual(result.status, 'FAILED')
+        self.assertTrue(result.error_message)
+        self.assertIsNotNone(result.processing_time)
+
+    def test_second_claim(self):
+        result = self.create_result()
+        process_ocr_result(result.pk)
+        self.assertIsNone(process_ocr_result(result.pk))
+
+    def test_lost_claim_writes_nothing(self):
+        result = self.create_result()
+        reclaimed_at = timezone.now() + timedelta(minutes=1)
+        read = backends.FakeOCRBackend.read
+
+        def read_after_requeue(backend, image):
+            # Requeued as abandoned and claimed by another job meanwhile
+            OCRResult.objects.filter(pk=result.pk).update(status='PROCESSING', started_at=reclaimed_at)
+            return read(backend, image)
+
+        with mock.patch.object(backends.FakeOCRBackend, 'read', read_after_requeue):
+            process_ocr_result(result.pk)
+
+        result.refresh_from_db()
+        self.assertEqual((result.status, result.started_at), ('PROCESSING', reclaimed_at))
+        self.assertIsNone(result.raw_text)
+
+    def test_command_requeues_abandoned_results(self):
+        abandoned = self.create_result(status='PROCESSING', started_at=timezone.now() - timedelta(hours=1))
+        running = self.create_result(status='PROCESSING', started_at=timezone.now())
+
+        call_command('process_ocr_results', stdout=io.StringIO())
+
+        abandoned.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(abandoned.status, 'COMPLETED')
+        self.assertEqual(running.status, 'PROCESSING')
+
+
+class ExpenseFromScanTests(OCRTestCase):
+    """ExpenseCreateSerializer's ocr_result"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.category = ExpenseCategory.objects.create(name='Meals')
+
+    def post_expense(self, data):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client.post('/api/expenses/', {'category': self.category.pk, **data}, format='json')
+
+    def test_prefill(self):
+        scan = process_ocr_result(self.create_result().pk)
+        response = self.post_expense({'ocr_result': str(scan.pk), 'description': 'Coffee with a client'})
+        self.assertEqual(response.status_code, 201, response.data)
+
+        expense = Expense.objects.get(submitted_by=self.user)
+        self.assertEqual(expense.amount, Decimal('6.25'))
+        self.assertEqual(expense.expense_date, date(2024, 3, 14))
+        # Given fields win over the scan's
+        self.assertEqual(expense.description, 'Coffee with a client')
+        self.assertEqual(expense.receipt_image.name, scan.image.name)
+
+    def test_scan_of_another_user(self):
+        scan = process_ocr_result(self.create_result(user=self.other_user).pk)
+        response = self.post_expense({'ocr_result': str(scan.pk)})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ocr_result', response.data)
+        self.assertFalse(Expense.objects.exists())
+
+    def test_required_fields_without_scan(self):
+        response = self.post_expense({})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'amount', 'expense_date', 'description'})
+
+        response = self.post_expense({'amount': '12.00', 'expense_date': '2024-03-14', 'description': 'Taxi'})
+        self.assertEqual(response.status_code, 201, response.data)
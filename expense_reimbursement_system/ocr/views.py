@@ -1,27 +1,45 @@
+from django.conf import settings
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from .models import OCRResult
 from .serializers import OCRResultSerializer
+from .tasks import enqueue_ocr, process_ocr_result
+
+
+def start_scan(serializer, user):
+    """Save a new PENDING result for the uploaded image and scan it as OCR_ASYNC says"""
+    result = serializer.save(uploaded_by=user, status='PENDING')
+    if settings.OCR_ASYNC:
+        enqueue_ocr(result.pk)
+    else:
+        result = process_ocr_result(result.pk) or result
+    return result
 
 
 class OCRResultListView(generics.ListCreateAPIView):
     """
-    List all OCR results or create a new OCR result.
+    List the user's OCR results or scan a new receipt image.
     """
-    queryset = OCRResult.objects.all()
     serializer_class = OCRResultSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        return OCRResult.objects.filter(uploaded_by=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.instance = start_scan(serializer, self.request.user)
+
 
 class OCRResultDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update or delete an OCR result.
     """
-    queryset = OCRResult.objects.all()
     serializer_class = OCRResultSerializer
     permission_classes = [permissions.IsAuthenticated]
-    lookup_field = 'id'
+
+    def get_queryset(self):
+        return OCRResult.objects.filter(uploaded_by=self.request.user)
 
 
 @api_view(['POST'])
@@ -29,20 +47,23 @@ class OCRResultDetailView(generics.RetrieveUpdateDestroyAPIView):
 def scan_receipt(request):
     """
     Scan a receipt image using OCR.
+
+    The scan runs in the background: the result comes back PENDING, poll
+    ocr/results/<id>/ until it is COMPLETED or FAILED. Its expense_data then
+    prefills a new expense (see ExpenseCreateSerializer.ocr_result).
     """
     if 'image' not in request.FILES:
         return Response(
-            {'error': 'No image file provided'}, 
+            {'error': 'No image file provided'},
             status=status.HTTP_400_BAD_REQUEST
         )
-    
-    # For now, return a placeholder response
-    # In a real implementation, you would use pytesseract or similar OCR library
-    return Response({
-        'message': 'OCR functionality not yet implemented',
-        'extracted_text': 'Placeholder text',
-        'extracted_amount': 0.00,
-        'extracted_merchant': 'Placeholder merchant',
-        'extracted_date': None,
-        'confidence_score': 0.0
-    }, status=status.HTTP_200_OK)
+
+    serializer = OCRResultSerializer(data={'image': request.FILES['image']})
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    result = start_scan(serializer, request.user)
+    return Response(
+        OCRResultSerializer(result, context={'request': request}).data,
+        status=status.HTTP_202_ACCEPTED if result.status == 'PENDING' else status.HTTP_201_CREATED
+    )
@@ -0,0 +1,121 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from companies.models import Company
+from .models import User
+
+TOKEN_CACHE_PREFIX = 'auth-token:'
+
+# Never copy the password hash into the cache, it is loaded on demand if needed
+UNCACHED_USER_FIELDS = {'password'}
+
+# Cache backends private to each process, invalidating an entry there does
+# not reach the other workers
+PER_PROCESS_CACHE_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def token_cache_enabled():
+    """Tokens are only cached in a cache shared by all workers"""
+    return settings.CACHES['default']['BACKEND'] not in PER_PROCESS_CACHE_BACKENDS
+
+
+def get_token_cache_key(key):
+    return f'{TOKEN_CACHE_PREFIX}{key}'
+
+
+def dump_instance(instance, exclude=()):
+    """Get the concrete field values of a model instance as a plain dict"""
+    if instance is None:
+        return None
+    return {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+        if field.name not in exclude
+    }
+
+
+def load_instance(model, values):
+    """Rebuild a model instance from dump_instance() output without a query"""
+    if values is None:
+        return None
+    return model.from_db(None, list(values), list(values.values()))
+
+
+def invalidate_token_keys(keys):
+    cache.delete_many([get_token_cache_key(key) for key in keys])
+
+
+def invalidate_user_tokens(*users):
+    """Drop the cached authentication of the given users"""
+    if not token_cache_enabled():
+        return
+    invalidate_token_keys(Token.objects.filter(user__in=users).values_list('key', flat=True))
+
+
+def invalidate_company_tokens(company):
+    """Drop the cached authentication of every user of a company"""
+    if not token_cache_enabled():
+        return
+    invalidate_token_keys(Token.objects.filter(user__company=company).values_list('key', flat=True))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that caches the authenticated user.
+
+    On a miss the token, user, company and manager are loaded in one joined
+    query and their field values cached for AUTH_TOKEN_CACHE_TTL seconds, so
+    cache hits authenticate without touching the database and
+    request.user.company / request.user.manager are already loaded.
+
+    Entries are invalidated when the token is deleted and when the user or
+    their company is saved (see users.signals). That only reaches every worker
+    through a shared cache, with a per-process one (the default local-memory
+    cache) nothing is cached and every request loads the token.
+    """
+
+    def authenticate_credentials(self, key):
+        use_cache = token_cache_enabled()
+        cache_key = get_token_cache_key(key)
+
+        cached = cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            user = self.load_user(cached)
+            token = Token(key=key, user=user)
+        else:
+            try:
+                token = Token.objects.select_related(
+                    'user__company', 'user__manager'
+                ).get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+            user = token.user
+            if use_cache:
+                cache.set(cache_key, self.dump_user(user), settings.AUTH_TOKEN_CACHE_TTL)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (user, token)
+
+    def dump_user(self, user):
+        return {
+            'user': dump_instance(user, exclude=UNCACHED_USER_FIELDS),
+            'company': dump_instance(user.company),
+            'manager': dump_instance(user.manager, exclude=UNCACHED_USER_FIELDS),
+        }
+
+    def load_user(self, cached):
+        user = load_instance(User, cached['user'])
+        user.company = load_instance(Company, cached['company'])
+        user.manager = load_instance(User, cached['manager'])
+        # Assigning the relations above is not a manager change
+        user._loaded_manager_id = user.manager_id
+        return user
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from expenses.models import Expense
+from users.models import User, PERMISSION_CHECKS
+
+
+def legacy_has_permission(user, permission_name):
+    """User.has_permission as it was before permission sets: a dict of bound methods per call"""
+    permission_map = {name: getattr(user, check) for name, check in PERMISSION_CHECKS.items()}
+
+    if permission_name not in permission_map:
+        return False
+
+    return permission_map[permission_name]()
+
+
+class Command(BaseCommand):
+    help = "Measure permission checks per second with and without the memoized permission sets"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200_000,
+            help='Checks per measurement (default 200,000)'
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        names = list(PERMISSION_CHECKS) + ['unknown_permission']
+
+        # Unsaved instances, nothing here touches the database
+        users = [
+            User(role='ADMIN', is_manager_approver=True),
+            User(role='MANAGER', is_manager_approver=True),
+            User(role='EMPLOYEE'),
+        ]
+        expense = Expense(current_approver=users[1])
+
+        cases = [
+            ('has_permission (dict per call)',
+             lambda user, name: legacy_has_permission(user, name)),
+            ('has_permission (permission set)',
+             lambda user, name: user.has_permission(name)),
+            ('can_approve_expense',
+             lambda user, name: user.can_approve_expense(expense)),
+        ]
+
+        for label, check in cases:
+            started = time.perf_counter()
+            for index in range(iterations):
+                check(users[index % len(users)], names[index % len(names)])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{label:<34} {iterations / elapsed:>14,.0f} checks/s")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from users.services import ManagerHierarchyService
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ManagerClosure table from each user's manager"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of closure rows to insert per query'
+        )
+
+    def handle(self, *args, **options):
+        count = ManagerHierarchyService().rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt manager hierarchy with {count} links"))
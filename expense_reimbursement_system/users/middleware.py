@@ -0,0 +1,25 @@
+from django.utils.functional import SimpleLazyObject
+
+
+def get_user_permission_set(user):
+    """Get the permission set of a possibly anonymous user"""
+    if not user.is_authenticated:
+        return frozenset()
+    return user.get_permission_set()
+
+
+class PermissionCacheMiddleware:
+    """
+    Expose the current user's permission set as request.permissions.
+    
+    It is resolved lazily on first access, after DRF has authenticated the
+    request (DRF writes the token user back to the Django request), and
+    then reused by every permission check for the rest of the request.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        request.permissions = SimpleLazyObject(lambda: get_user_permission_set(request.user))
+        return self.get_response(request)
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_manager_closure(apps, schema_editor):
+    User = apps.get_model("users", "User")
+    ManagerClosure = apps.get_model("users", "ManagerClosure")
+
+    manager_of = dict(User.objects.values_list("id", "manager_id"))
+    links = []
+    for user_id in manager_of:
+        seen = {user_id}
+        links.append(
+            ManagerClosure(ancestor_id=user_id, descendant_id=user_id, depth=0)
+        )
+
+        ancestor_id, depth = manager_of[user_id], 1
+        while ancestor_id is not None and ancestor_id not in seen:
+            links.append(
+                ManagerClosure(
+                    ancestor_id=ancestor_id, descendant_id=user_id, depth=depth
+                )
+            )
+            seen.add(ancestor_id)
+            ancestor_id, depth = manager_of.get(ancestor_id), depth + 1
+
+    ManagerClosure.objects.bulk_create(links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="role",
+            field=models.CharField(
+                choices=[
+                    ("SUPER_USER", "Super User"),
+                    ("ADMIN", "Admin"),
+                    ("MANAGER", "Manager"),
+                    ("EMPLOYEE", "Employee"),
+                ],
+                default="EMPLOYEE",
+                max_length=20,
+            ),
+        ),
+        migrations.CreateModel(
+            name="ManagerClosure",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("depth", models.PositiveIntegerField()),
+                (
+                    "ancestor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="descendant_links",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "descendant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ancestor_links",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("ancestor", "descendant")},
+            },
+        ),
+        migrations.RunPython(build_manager_closure, migrations.RunPython.noop),
+    ]
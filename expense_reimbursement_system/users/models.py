@@ -1,8 +1,67 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from companies.models import Company
+from functools import lru_cache
 import uuid
 
+# Permission name -> User method deciding it, see User.has_permission()
+PERMISSION_CHECKS = {
+    # Admin permissions
+    'create_company': 'can_create_company',
+    'manage_users': 'can_manage_users',
+    'set_roles': 'can_set_roles',
+    'configure_approval_rules': 'can_configure_approval_rules',
+    'view_all_expenses': 'can_view_all_expenses',
+    'override_approvals': 'can_override_approvals',
+    
+    # Manager permissions
+    'approve_reject_expenses': 'can_approve_reject_expenses',
+    'view_team_expenses': 'can_view_team_expenses',
+    'escalate_expenses': 'can_escalate_expenses',
+    
+    # Employee permissions
+    'submit_expenses': 'can_submit_expenses',
+    'view_own_expenses': 'can_view_own_expenses',
+    'check_approval_status': 'can_check_approval_status',
+}
+
+# Permissions listed by User.get_permissions() for each role
+ROLE_PERMISSIONS = {
+    'ADMIN': (
+        'create_company', 'manage_users', 'set_roles', 
+        'configure_approval_rules', 'view_all_expenses', 
+        'override_approvals', 'approve_reject_expenses', 
+        'view_team_expenses', 'escalate_expenses', 
+        'submit_expenses', 'view_own_expenses', 
+        'check_approval_status'
+    ),
+    'MANAGER': (
+        'approve_reject_expenses', 'view_team_expenses', 
+        'escalate_expenses', 'submit_expenses', 
+        'view_own_expenses', 'check_approval_status'
+    ),
+    'EMPLOYEE': (
+        'submit_expenses', 'view_own_expenses', 
+        'check_approval_status'
+    ),
+}
+
+
+@lru_cache(maxsize=None)
+def get_role_permission_set(role, is_manager_approver):
+    """
+    Get the frozenset of permissions granted by a role and approver flag.
+    
+    Every can_* check depends on nothing else, so there are only a handful
+    of distinct sets and each is computed once per process.
+    """
+    user = User(role=role, is_manager_approver=is_manager_approver)
+    return frozenset(
+        name for name, check in PERMISSION_CHECKS.items()
+        if getattr(user, check)()
+    )
+
+
 class User(AbstractUser):
     """Extended User model with company and role information"""
     
@@ -55,6 +114,45 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.get_full_name()} ({self.get_role_display()})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded manager so save() can tell when it changes
+        if 'manager_id' in instance.__dict__:
+            instance._loaded_manager_id = instance.manager_id
+        return instance
+    
+    def save(self, *args, **kwargs):
+        """Save the user and keep the ManagerClosure hierarchy in sync"""
+        from .services import ManagerHierarchyService
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'manager' not in update_fields and 'manager_id' not in update_fields:
+            return super().save(*args, **kwargs)
+        
+        service = ManagerHierarchyService()
+        adding = self._state.adding
+        
+        if adding:
+            previous_manager_id = None
+        elif hasattr(self, '_loaded_manager_id'):
+            previous_manager_id = self._loaded_manager_id
+        else:
+            previous_manager_id = User.objects.filter(pk=self.pk).values_list('manager_id', flat=True).first()
+        
+        manager_changed = self.manager_id != previous_manager_id
+        if manager_changed and self.manager_id:
+            service.validate_manager(self, self.manager_id)
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                service.add_user(self)
+            elif manager_changed:
+                service.move_subtree(self, self.manager_id)
+        
+        self._loaded_manager_id = self.manager_id
+    
     def get_full_name(self):
         """Return the first_name plus the last_name, with a space in between."""
         full_name = f"{self.first_name} {self.last_name}"
@@ -145,88 +243,53 @@ class User(AbstractUser):
         return self.role in ['ADMIN', 'MANAGER', 'EMPLOYEE']
     
     # ===== COMPREHENSIVE PERMISSION CHECKS =====
+    def get_permission_set(self):
+        """Get the memoized frozenset of permissions this user has"""
+        return get_role_permission_set(self.role, self.is_manager_approver)
+    
     def has_permission(self, permission_name):
         """Check if user has a specific permission"""
-        permission_map = {
-            # Admin permissions
-            'create_company': self.can_create_company,
-            'manage_users': self.can_manage_users,
-            'set_roles': self.can_set_roles,
-            'configure_approval_rules': self.can_configure_approval_rules,
-            'view_all_expenses': self.can_view_all_expenses,
-            'override_approvals': self.can_override_approvals,
-            
-            # Manager permissions
-            'approve_reject_expenses': self.can_approve_reject_expenses,
-            'view_team_expenses': self.can_view_team_expenses,
-            'escalate_expenses': self.can_escalate_expenses,
-            
-            # Employee permissions
-            'submit_expenses': self.can_submit_expenses,
-            'view_own_expenses': self.can_view_own_expenses,
-            'check_approval_status': self.can_check_approval_status,
-        }
-        
-        if permission_name not in permission_map:
-            return False
-        
-        return permission_map[permission_name]()
+        return permission_name in self.get_permission_set()
     
     def get_permissions(self):
         """Get all permissions for this user"""
-        permissions = []
-        
-        if self.is_admin():
-            permissions.extend([
-                'create_company', 'manage_users', 'set_roles', 
-                'configure_approval_rules', 'view_all_expenses', 
-                'override_approvals', 'approve_reject_expenses', 
-                'view_team_expenses', 'escalate_expenses', 
-                'submit_expenses', 'view_own_expenses', 
-                'check_approval_status'
-            ])
-        elif self.is_manager():
-            permissions.extend([
-                'approve_reject_expenses', 'view_team_expenses', 
-                'escalate_expenses', 'submit_expenses', 
-                'view_own_expenses', 'check_approval_status'
-            ])
-        elif self.is_employee():
-            permissions.extend([
-                'submit_expenses', 'view_own_expenses', 
-                'check_approval_status'
-            ])
-        
-        return permissions
+        return list(ROLE_PERMISSIONS.get(self.role, ()))
     
     def can_access_expense(self, expense):
         """Check if user can access a specific expense"""
-        from expenses.models import Expense
+        permissions = self.get_permission_set()
         
-        # Admin can access all expenses
-        if self.is_admin():
-            return expense.company == self.company
+        # Admin can access all expenses of their company
+        if 'view_all_expenses' in permissions:
+            return expense.company_id == self.company_id
         
-        # Manager can access team expenses and their own
-        if self.is_manager():
-            return (expense.submitted_by in self.get_subordinates() or 
-                   expense.submitted_by == self)
+        # Manager can access their own expenses and those of their whole reporting subtree
+        if 'view_team_expenses' in permissions:
+            if expense.submitted_by_id == self.id:
+                return True
+            return ManagerClosure.objects.filter(
+                ancestor=self,
+                descendant_id=expense.submitted_by_id,
+                descendant__is_active=True
+            ).exists()
         
         # Employee can only access their own expenses
-        if self.is_employee():
-            return expense.submitted_by == self
+        if 'view_own_expenses' in permissions:
+            return expense.submitted_by_id == self.id
         
         return False
     
     def can_approve_expense(self, expense):
         """Check if user can approve a specific expense"""
-        # Admin can approve any expense
-        if self.is_admin():
-            return expense.company == self.company
+        permissions = self.get_permission_set()
         
-        # Manager can approve if they are the current approver
-        if self.is_manager() and self.is_manager_approver:
-            return expense.current_approver == self
+        # Admin can approve any expense of their company
+        if 'override_approvals' in permissions:
+            return expense.company_id == self.company_id
+        
+        # Manager approvers can approve if they are the current approver
+        if 'approve_reject_expenses' in permissions:
+            return expense.current_approver_id == self.id
         
         return False
     
@@ -234,6 +297,14 @@ class User(AbstractUser):
         """Get all subordinates of this user"""
         return User.objects.filter(manager=self, is_active=True)
     
+    def get_team_members(self, include_self=False):
+        """Get every active user in this user's reporting subtree, at any depth"""
+        return User.objects.filter(
+            ancestor_links__ancestor=self,
+            ancestor_links__depth__gte=0 if include_self else 1,
+            is_active=True
+        )
+    
     def get_expenses_for_approval(self):
         """Get expenses waiting for this user's approval"""
         from expenses.models import Expense
@@ -245,9 +316,8 @@ class User(AbstractUser):
     def get_team_expenses(self):
         """Get all expenses from user's team"""
         from expenses.models import Expense
-        subordinates = self.get_subordinates()
         return Expense.objects.filter(
-            submitted_by__in=subordinates
+            submitted_by__in=self.get_team_members()
         ).order_by('-created_at')
     
     @classmethod
@@ -272,140 +342,32 @@ class User(AbstractUser):
         user.set_password(password)
         user.save(using=cls._default_manager.db)
         return user
+
+
+class ManagerClosure(models.Model):
+    """
+    Transitive closure of the manager hierarchy.
+    
+    Holds one row per (ancestor, descendant) pair, including a depth 0 row
+    linking every user to themselves, so a manager's whole subtree is a
+    single indexed lookup on ancestor. Maintained by User.save() through
+    ManagerHierarchyService.
+    """
+    
+    ancestor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='descendant_links'
+    )
+    descendant = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='ancestor_links'
+    )
+    depth = models.PositiveIntegerField()
     
-    def can_view_own_expenses(self):
-        """Employee can view their own expenses"""
-        return self.role in ['ADMIN', 'MANAGER', 'EMPLOYEE']
-    
-    def can_check_approval_status(self):
-        """Employee can check approval status of their expenses"""
-        return self.role in ['ADMIN', 'MANAGER', 'EMPLOYEE']
-    
-    # ===== COMPREHENSIVE PERMISSION CHECKS =====
-    def has_permission(self, permission_name):
-        """Check if user has a specific permission"""
-        permission_map = {
-            # Admin permissions
-            'create_company': self.can_create_company,
-            'manage_users': self.can_manage_users,
-            'set_roles': self.can_set_roles,
-            'configure_approval_rules': self.can_configure_approval_rules,
-            'view_all_expenses': self.can_view_all_expenses,
-            'override_approvals': self.can_override_approvals,
-            
-            # Manager permissions
-            'approve_reject_expenses': self.can_approve_reject_expenses,
-            'view_team_expenses': self.can_view_team_expenses,
-            'escalate_expenses': self.can_escalate_expenses,
-            
-            # Employee permissions
-            'submit_expenses': self.can_submit_expenses,
-            'view_own_expenses': self.can_view_own_expenses,
-            'check_approval_status': self.can_check_approval_status,
-        }
-        
-        if permission_name not in permission_map:
-            return False
-        
-        return permission_map[permission_name]()
-    
-    def get_permissions(self):
-        """Get all permissions for this user"""
-        permissions = []
-        
-        if self.is_admin():
-            permissions.extend([
-                'create_company', 'manage_users', 'set_roles', 
-                'configure_approval_rules', 'view_all_expenses', 
-                'override_approvals', 'approve_reject_expenses', 
-                'view_team_expenses', 'escalate_expenses', 
-                'submit_expenses', 'view_own_expenses', 
-                'check_approval_status'
-            ])
-        elif self.is_manager():
-            permissions.extend([
-                'approve_reject_expenses', 'view_team_expenses', 
-                'escalate_expenses', 'submit_expenses', 
-                'view_own_expenses', 'check_approval_status'
-            ])
-        elif self.is_employee():
-            permissions.extend([
-                'submit_expenses', 'view_own_expenses', 
-                'check_approval_status'
-            ])
-        
-        return permissions
-    
-    def can_access_expense(self, expense):
-        """Check if user can access a specific expense"""
-        from expenses.models import Expense
-        
-        # Admin can access all expenses
-        if self.is_admin():
-            return expense.company == self.company
-        
-        # Manager can access team expenses and their own
-        if self.is_manager():
-            return (expense.submitted_by in self.get_subordinates() or 
-                   expense.submitted_by == self)
-        
-        # Employee can only access their own expenses
-        if self.is_employee():
-            return expense.submitted_by == self
-        
-        return False
-    
-    def can_approve_expense(self, expense):
-        """Check if user can approve a specific expense"""
-        # Admin can approve any expense
-        if self.is_admin():
-            return expense.company == self.company
-        
-        # Manager can approve if they are the current approver
-        if self.is_manager() and self.is_manager_approver:
-            return expense.current_approver == self
-        
-        return False
-    
-    def get_subordinates(self):
-        """Get all subordinates of this user"""
-        return User.objects.filter(manager=self, is_active=True)
-    
-    def get_expenses_for_approval(self):
-        """Get expenses waiting for this user's approval"""
-        from expenses.models import Expense
-        return Expense.objects.filter(
-            status='PENDING',
-            current_approver=self
-        )
-    
-    def get_team_expenses(self):
-        """Get all expenses from user's team"""
-        from expenses.models import Expense
-        subordinates = self.get_subordinates()
-        return Expense.objects.filter(
-            submitted_by__in=subordinates
-        ).order_by('-created_at')
+    class Meta:
+        unique_together = ['ancestor', 'descendant']
     
-    @classmethod
-    def create_user(cls, username, email, password, first_name, last_name, company=None, role='EMPLOYEE', **extra_fields):
-        """Create a new user with the given details"""
-        if not username:
-            raise ValueError('The username must be set')
-        if not email:
-            raise ValueError('The email must be set')
-        if not password:
-            raise ValueError('The password must be set')
-        
-        user = cls(
-            username=username,
-            email=email,
-            first_name=first_name,
-            last_name=last_name,
-            company=company,
-            role=role,
-            **extra_fields
-        )
-        user.set_password(password)
-        user.save(using=cls._default_manager.db)
-        return user
\ No newline at end of file
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
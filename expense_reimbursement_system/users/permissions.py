@@ -7,8 +7,19 @@ from django.contrib.auth import get_user_model
 from rest_framework import status
 from rest_framework.response import Response
 
+from .middleware import get_user_permission_set
+from .models import ROLE_PERMISSIONS
+
 User = get_user_model()
 
+
+def get_request_permissions(request):
+    """Get the permission set cached on the request, computing it if the middleware is not installed"""
+    permissions = getattr(request, 'permissions', None)
+    if permissions is None:
+        permissions = get_user_permission_set(request.user)
+    return permissions
+
 class PermissionDenied(Exception):
     """Custom exception for permission denied"""
     pass
@@ -31,7 +42,7 @@ def require_permission(permission_name):
                     status=status.HTTP_401_UNAUTHORIZED
                 )
             
-            if not request.user.has_permission(permission_name):
+            if permission_name not in get_request_permissions(request):
                 return JsonResponse(
                     {'error': f'Permission denied. Required: {permission_name}'}, 
                     status=status.HTTP_403_FORBIDDEN
@@ -140,7 +151,7 @@ def permission_required(permission_name):
             if not request.user.is_authenticated:
                 return False
             
-            return request.user.has_permission(permission_name)
+            return permission_name in get_request_permissions(request)
         
         def has_object_permission(self, request, view, obj):
             return self.has_permission(request, view)
@@ -230,26 +241,4 @@ def check_permission(user, permission_name):
 
 def get_role_permissions(role):
     """Get permissions for a specific role"""
-    role_permissions = {
-        'ADMIN': [
-            'create_company', 'manage_users', 'set_roles', 
-            'configure_approval_rules', 'view_all_expenses', 
-            'override_approvals', 'approve_reject_expenses', 
-            'view_team_expenses', 'escalate_expenses', 
-            'submit_expenses', 'view_own_expenses', 
-            'check_approval_status'
-        ],
-        'MANAGER': [
-            'approve_reject_expenses', 'view_team_expenses', 
-            'escalate_expenses', 'submit_expenses', 
-            'view_own_expenses', 'check_approval_status'
-        ],
-        'EMPLOYEE': [
-            'submit_expenses', 'view_own_expenses', 
-            'check_approval_status'
-        ]
-    }
-    
-    return role_permissions.get(role, [])
-
-
+    return list(ROLE_PERMISSIONS.get(role, ()))
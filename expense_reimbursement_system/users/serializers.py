@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError as DjangoValidationError
 from .models import User
+from .services import ManagerHierarchyService
 from companies.models import Company
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -253,6 +255,11 @@ class AdminUpdateUserSerializer(serializers.ModelSerializer):
                     raise serializers.ValidationError('Manager must be from the same company.')
             except User.DoesNotExist:
                 raise serializers.ValidationError('Manager not found.')
+            
+            try:
+                ManagerHierarchyService().validate_manager(self.instance, value)
+            except DjangoValidationError as e:
+                raise serializers.ValidationError(e.messages[0])
         return value
     
     def validate_role(self, value):
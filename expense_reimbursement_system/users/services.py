@@ -0,0 +1,104 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from .models import User, ManagerClosure
+
+
+class ManagerHierarchyService:
+    """Service for maintaining the ManagerClosure table"""
+
+    def validate_manager(self, user, manager_id):
+        """Raise ValidationError if making manager_id the user's manager would create a cycle"""
+        if manager_id == user.pk:
+            raise ValidationError('A user cannot be their own manager.')
+
+        if user.pk and ManagerClosure.objects.filter(ancestor_id=user.pk, descendant_id=manager_id).exists():
+            raise ValidationError('A user cannot report to someone in their own reporting line.')
+
+    def get_ancestors(self, user_id):
+        """Get (ancestor id, depth) pairs for a user, including the user at depth 0"""
+        return list(
+            ManagerClosure.objects.filter(descendant_id=user_id).values_list('ancestor_id', 'depth')
+        )
+
+    def add_user(self, user):
+        """Link a newly created user to themselves and to their manager's ancestors"""
+        links = [ManagerClosure(ancestor_id=user.pk, descendant_id=user.pk, depth=0)]
+        if user.manager_id:
+            links.extend(
+                ManagerClosure(ancestor_id=ancestor_id, descendant_id=user.pk, depth=depth + 1)
+                for ancestor_id, depth in self.get_ancestors(user.manager_id)
+            )
+        ManagerClosure.objects.bulk_create(links, ignore_conflicts=True)
+
+    def move_subtree(self, user, manager_id):
+        """Re-attach a user, and everyone below them, under a new manager (or none)"""
+        subtree = list(
+            ManagerClosure.objects.filter(ancestor_id=user.pk).values_list('descendant_id', 'depth')
+        )
+        if not subtree:
+            # Created without going through save(), e.g. bulk_create
+            self.add_user(user)
+            return
+
+        subtree_ids = ManagerClosure.objects.filter(ancestor_id=user.pk).values('descendant_id')
+
+        with transaction.atomic():
+            # Cut the subtree loose from its old ancestors, keeping the links inside it
+            ManagerClosure.objects.filter(
+                descendant_id__in=subtree_ids
+            ).exclude(
+                ancestor_id__in=subtree_ids
+            ).delete()
+
+            if manager_id:
+                ManagerClosure.objects.bulk_create(
+                    [
+                        ManagerClosure(
+                            ancestor_id=ancestor_id,
+                            descendant_id=descendant_id,
+                            depth=ancestor_depth + descendant_depth + 1
+                        )
+                        for ancestor_id, ancestor_depth in self.get_ancestors(manager_id)
+                        for descendant_id, descendant_depth in subtree
+                    ],
+                    batch_size=1000
+                )
+
+    def detach_subordinates(self, user):
+        """Turn each direct report of a user into the root of their own subtree"""
+        for subordinate in User.objects.filter(manager=user):
+            self.move_subtree(subordinate, None)
+
+    def compute_links(self, users):
+        """Compute closure rows from (user id, manager id) pairs, stopping at any existing cycle"""
+        manager_of = dict(users)
+
+        links = []
+        for user_id in manager_of:
+            seen = {user_id}
+            links.append((user_id, user_id, 0))
+
+            ancestor_id, depth = manager_of[user_id], 1
+            while ancestor_id is not None and ancestor_id not in seen:
+                links.append((ancestor_id, user_id, depth))
+                seen.add(ancestor_id)
+                ancestor_id, depth = manager_of.get(ancestor_id), depth + 1
+
+        return links
+
+    def rebuild(self, batch_size=1000):
+        """Replace the whole closure table with one computed from User.manager"""
+        users = User.objects.values_list('id', 'manager_id')
+        links = self.compute_links(users)
+
+        with transaction.atomic():
+            ManagerClosure.objects.all().delete()
+            ManagerClosure.objects.bulk_create(
+                [
+                    ManagerClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth)
+                    for ancestor_id, descendant_id, depth in links
+                ],
+                batch_size=batch_size
+            )
+
+        return len(links)
@@ -0,0 +1,35 @@
+from django.db.models.signals import pre_delete, post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from companies.models import Company
+from .authentication import invalidate_token_keys, invalidate_user_tokens, invalidate_company_tokens
+from .models import User
+from .services import ManagerHierarchyService
+
+
+@receiver(pre_delete, sender=User)
+def detach_deleted_manager(sender, instance, **kwargs):
+    """Drop a deleted user's reports out of the hierarchy above them"""
+    # manager is SET_NULL with a plain UPDATE, which bypasses User.save()
+    ManagerHierarchyService().detach_subordinates(instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_saved_user_tokens(sender, instance, update_fields=None, **kwargs):
+    """Make CachedTokenAuthentication reload a user after role, status or manager changes"""
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_user_tokens(instance)
+
+
+@receiver(post_save, sender=Company)
+def invalidate_saved_company_tokens(sender, instance, created=False, **kwargs):
+    """Make CachedTokenAuthentication reload the company of its users"""
+    if not created:
+        invalidate_company_tokens(instance)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Forget a token as soon as it is deleted, e.g. on logout"""
+    invalidate_token_keys([instance.key])
@@ -5,6 +5,8 @@ from rest_framework import status
 from django.contrib.auth import get_user_model
 from companies.models import Company
 from companies.serializers import CompanySerializer
+from expenses.models import ExpenseRollup
+from expenses.services import ExpenseStatsService
 from .serializers import UserSerializer
 from .models import User
 import uuid
@@ -172,6 +174,9 @@ def super_user_system_analytics(request):
             currency = company.currency
             companies_by_currency[currency] = companies_by_currency.get(currency, 0) + 1
         
+        # Get expense totals from the rollups
+        expense_totals = ExpenseStatsService().get_status_totals(ExpenseRollup.objects.all())
+        
         return Response({
             'success': True,
             'analytics': {
@@ -180,7 +185,10 @@ def super_user_system_analytics(request):
                 'active_users': active_users,
                 'inactive_users': total_users - active_users,
                 'users_by_role': users_by_role,
-                'companies_by_currency': companies_by_currency
+                'companies_by_currency': companies_by_currency,
+                'total_expenses': expense_totals['total_count'],
+                'total_expense_amount': expense_totals['total_amount'],
+                'expenses_by_status': expense_totals['by_status']
             }
         })
     except Exception as e:
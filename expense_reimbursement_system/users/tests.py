@@ -1,3 +1,52 @@
-from django.test import TestCase
+import tempfile
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+
+from companies.models import Company
+from .authentication import CachedTokenAuthentication
+from .models import User
+
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': tempfile.mkdtemp(prefix='expense-system-tests-'),
+    }
+}
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Tokens are cached only where every worker sees the invalidations"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Acme')
+        cls.user = User.objects.create_user(username='employee', password='x', company=cls.company)
+        cls.token = Token.objects.create(user=cls.user)
+
+    def authenticate(self):
+        return CachedTokenAuthentication().authenticate_credentials(self.token.key)
+
+    def test_per_process_cache_is_not_used(self):
+        self.authenticate()
+        # Another worker deactivates the user, no invalidation reaches this one
+        User.objects.filter(pk=self.user.pk).update(is_active=False, role='ADMIN')
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authenticate()
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_shared_cache(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+        self.assertEqual(user.company.name, 'Acme')
+
+        self.user.role = 'MANAGER'
+        self.user.save()
+        user, _ = self.authenticate()
+        self.assertEqual(user.role, 'MANAGER')
+
+        self.token.delete()
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authenticate()
@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import login, logout
 from django.contrib.auth.models import User as DjangoUser
+from django.core.exceptions import ValidationError as DjangoValidationError
 from .models import User
 from .serializers import (
     UserRegistrationSerializer, 
@@ -147,8 +148,8 @@ def manager_team_users(request):
         # Admin can see all users in company
         users = User.objects.filter(company=request.user.company, is_active=True)
     else:
-        # Manager can see their subordinates
-        users = request.user.get_subordinates()
+        # Manager can see everyone in their reporting subtree
+        users = request.user.get_team_members()
     
     serializer = UserSerializer(users, many=True)
     return Response({
@@ -236,7 +237,10 @@ def assign_manager(request, user_id):
     else:
         user.manager = None
     
-    user.save()
+    try:
+        user.save()
+    except DjangoValidationError as e:
+        return Response({'error': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
     
     return Response({
         'message': 'Manager assigned successfully',
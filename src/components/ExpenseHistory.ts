@@ -21,12 +21,23 @@ export interface Expense {
   approval_history: any[];
 }
 
+// One page of a status group, next links to the group's following page (its <status>_cursor)
+export interface ExpenseStatusGroup {
+  count: number;
+  total_amount: number;
+  expenses: Expense[];
+  next: string | null;
+  previous: string | null;
+}
+
+const STATUS_GROUPS = ['draft', 'pending', 'approved', 'rejected', 'paid'] as const;
+
 export interface ExpenseHistoryData {
-  draft: { count: number; total_amount: number; expenses: Expense[] };
-  pending: { count: number; total_amount: number; expenses: Expense[] };
-  approved: { count: number; total_amount: number; expenses: Expense[] };
-  rejected: { count: number; total_amount: number; expenses: Expense[] };
-  paid: { count: number; total_amount: number; expenses: Expense[] };
+  draft: ExpenseStatusGroup;
+  pending: ExpenseStatusGroup;
+  approved: ExpenseStatusGroup;
+  rejected: ExpenseStatusGroup;
+  paid: ExpenseStatusGroup;
   summary: {
     total_expenses: number;
     total_amount: number;
@@ -208,7 +219,7 @@ export class ExpenseHistory {
   private async loadHistory(): Promise<void> {
     try {
       const token = localStorage.getItem('auth_token');
-      const response = await fetch('http://localhost:8000/api/my-expense-history/', {
+      const response = await fetch('http://localhost:8000/api/my-expense-history/?page_size=100', {
         headers: {
           'Authorization': `Token ${token}`,
         },
@@ -216,6 +227,7 @@ export class ExpenseHistory {
 
       if (response.ok) {
         this.historyData = await response.json();
+        await this.loadRemainingPages(this.historyData!, token);
         this.renderSummary();
         this.updateTabCounts();
         this.renderExpenses('all');
@@ -228,6 +240,27 @@ export class ExpenseHistory {
     }
   }
 
+  // Each status group is paged separately, follow every group's next link
+  // so the tabs hold as many expenses as their counts say
+  private async loadRemainingPages(historyData: ExpenseHistoryData, token: string | null): Promise<void> {
+    for (const status of STATUS_GROUPS) {
+      const group = historyData[status];
+      while (group.next) {
+        const response = await fetch(group.next, {
+          headers: {
+            'Authorization': `Token ${token}`,
+          },
+        });
+        if (!response.ok) {
+          throw new Error(`Failed to load more ${status} expenses`);
+        }
+        const page: ExpenseHistoryData = await response.json();
+        group.expenses.push(...page[status].expenses);
+        group.next = page[status].next;
+      }
+    }
+  }
+
   private renderSummary(): void {
     if (!this.historyData) return;
 
@@ -288,7 +321,7 @@ export class ExpenseHistory {
       if (status === 'all') {
         count = this.historyData!.summary.total_expenses;
       } else if (status in this.historyData! && status !== 'summary') {
-        const statusData = this.historyData![status as keyof ExpenseHistoryData] as { count: number; total_amount: number; expenses: Expense[] };
+        const statusData = this.historyData![status as keyof ExpenseHistoryData] as ExpenseStatusGroup;
         count = statusData.count;
       }
 
@@ -330,7 +363,7 @@ export class ExpenseHistory {
         ...this.historyData.paid.expenses
       ];
     } else if (status in this.historyData && status !== 'summary') {
-      const statusData = this.historyData[status as keyof ExpenseHistoryData] as { count: number; total_amount: number; expenses: Expense[] };
+      const statusData = this.historyData[status as keyof ExpenseHistoryData] as ExpenseStatusGroup;
       expenses = statusData.expenses;
     }
 
@@ -54,18 +54,34 @@ export class ManagerDashboard {
     }
   }
 
-  private async loadPendingApprovals(): Promise<void> {
+  // List endpoints return one page at a time ({ next, results }), follow next to get every row
+  private async fetchAllPages<T>(url: string): Promise<T[]> {
     const token = localStorage.getItem('auth_token');
-    const response = await fetch('http://localhost:8000/api/pending-approvals/', {
-      headers: {
-        'Authorization': `Token ${token}`,
-        'Content-Type': 'application/json'
+    const results: T[] = [];
+    let next: string | null = `${url}?page_size=100`;
+
+    while (next) {
+      const response: Response = await fetch(next, {
+        headers: {
+          'Authorization': `Token ${token}`,
+          'Content-Type': 'application/json'
+        }
+      });
+      if (!response.ok) {
+        throw new Error(`Failed to load ${url}`);
       }
-    });
+      const data = await response.json();
+      results.push(...data.results);
+      next = data.next;
+    }
 
-    if (response.ok) {
-      this.pendingExpenses = await response.json();
-    } else {
+    return results;
+  }
+
+  private async loadPendingApprovals(): Promise<void> {
+    try {
+      this.pendingExpenses = await this.fetchAllPages<PendingExpense>('http://localhost:8000/api/pending-approvals/');
+    } catch (error) {
       throw new Error('Failed to load pending approvals');
     }
   }
@@ -570,22 +586,11 @@ export class ManagerDashboard {
 
   private async loadTeamExpenses(container: HTMLElement): Promise<void> {
     try {
-      const token = localStorage.getItem('auth_token');
-      const response = await fetch('http://localhost:8000/api/team-expenses/', {
-        headers: {
-          'Authorization': `Token ${token}`,
-        },
-      });
-
-      if (response.ok) {
-        const expenses = await response.json();
-        this.renderTeamExpenses(container, expenses);
-      } else {
-        this.showTeamExpensesError(container, 'Failed to load team expenses');
-      }
+      const expenses = await this.fetchAllPages<any>('http://localhost:8000/api/team-expenses/');
+      this.renderTeamExpenses(container, expenses);
     } catch (error) {
       console.error('Error loading team expenses:', error);
-      this.showTeamExpensesError(container, 'Network error. Please try again.');
+      this.showTeamExpensesError(container, 'Failed to load team expenses');
     }
   }
 
@@ -802,8 +807,8 @@ export class ManagerDashboard {
       });
 
       if (response.ok) {
-        const history = await response.json();
-        this.renderApprovalHistory(container, history);
+        const data = await response.json();
+        this.renderApprovalHistory(container, data.results, data.next);
       } else {
         this.showApprovalHistoryError(container, 'Failed to load approval history');
       }
@@ -813,7 +818,7 @@ export class ManagerDashboard {
     }
   }
 
-  private renderApprovalHistory(container: HTMLElement, history: any[]): void {
+  private renderApprovalHistory(container: HTMLElement, history: any[], next: string | null = null): void {
     // Remove loading div
     const loadingDiv = container.querySelector('div');
     if (loadingDiv && loadingDiv.textContent?.includes('Loading')) {
@@ -867,51 +872,100 @@ export class ManagerDashboard {
     table.appendChild(headerRow);
 
     // Table rows
-    history.forEach(approval => {
-      const row = document.createElement('tr');
-      row.style.cssText = `
-        border-bottom: 1px solid var(--border-color);
-        transition: background-color 0.2s ease;
-      `;
+    history.forEach(approval => table.appendChild(this.createApprovalHistoryRow(approval)));
 
-      row.addEventListener('mouseenter', () => {
-        row.style.backgroundColor = 'var(--background-light)';
-      });
+    container.appendChild(table);
 
-      row.addEventListener('mouseleave', () => {
-        row.style.backgroundColor = 'transparent';
+    // The history is paged, further pages are fetched on request
+    if (next) {
+      const loadMoreButton = document.createElement('button');
+      loadMoreButton.textContent = 'Load more';
+      loadMoreButton.style.cssText = `
+        display: block;
+        margin: 1.5rem auto 0;
+        padding: 0.75rem 1.5rem;
+        background: var(--accent-primary);
+        color: white;
+        border: none;
+        border-radius: 8px;
+        cursor: pointer;
+        font-weight: 500;
+      `;
+      let nextPage: string | null = next;
+      loadMoreButton.addEventListener('click', async () => {
+        if (!nextPage) return;
+        loadMoreButton.disabled = true;
+        loadMoreButton.textContent = 'Loading...';
+        try {
+          const token = localStorage.getItem('auth_token');
+          const response = await fetch(nextPage, {
+            headers: {
+              'Authorization': `Token ${token}`,
+            },
+          });
+          if (!response.ok) {
+            throw new Error('Failed to load more approval history');
+          }
+          const data = await response.json();
+          data.results.forEach((approval: any) => table.appendChild(this.createApprovalHistoryRow(approval)));
+          nextPage = data.next;
+        } catch (error) {
+          console.error('Error loading approval history:', error);
+          this.showErrorMessage('Failed to load more approval history');
+        }
+        if (nextPage) {
+          loadMoreButton.disabled = false;
+          loadMoreButton.textContent = 'Load more';
+        } else {
+          loadMoreButton.remove();
+        }
       });
+      container.appendChild(loadMoreButton);
+    }
+  }
 
-      const cells = [
-        approval.expense?.description || 'N/A',
-        `${approval.expense?.submitted_by?.first_name || 'Unknown'} ${approval.expense?.submitted_by?.last_name || ''}`,
-        `${approval.expense?.currency || 'USD'} ${parseFloat(approval.expense?.amount || 0).toFixed(2)}`,
-        approval.action || 'N/A',
-        new Date(approval.created_at).toLocaleDateString(),
-        approval.comments || 'N/A'
-      ];
+  private createApprovalHistoryRow(approval: any): HTMLTableRowElement {
+    const row = document.createElement('tr');
+    row.style.cssText = `
+      border-bottom: 1px solid var(--border-color);
+      transition: background-color 0.2s ease;
+    `;
 
-      cells.forEach((cellText, index) => {
-        const td = document.createElement('td');
-        td.textContent = cellText;
-        td.style.cssText = `
-          padding: 1rem;
-          color: var(--text-primary);
-        `;
-        
-        if (index === 3) { // Action column
-          const actionColor = cellText === 'APPROVED' ? '#10b981' : cellText === 'REJECTED' ? '#ef4444' : '#6b7280';
-          td.style.color = actionColor;
-          td.style.fontWeight = '500';
-        }
-        
-        row.appendChild(td);
-      });
+    row.addEventListener('mouseenter', () => {
+      row.style.backgroundColor = 'var(--background-light)';
+    });
 
-      table.appendChild(row);
+    row.addEventListener('mouseleave', () => {
+      row.style.backgroundColor = 'transparent';
     });
 
-    container.appendChild(table);
+    const cells = [
+      approval.expense?.description || 'N/A',
+      `${approval.expense?.submitted_by?.first_name || 'Unknown'} ${approval.expense?.submitted_by?.last_name || ''}`,
+      `${approval.expense?.currency || 'USD'} ${parseFloat(approval.expense?.amount || 0).toFixed(2)}`,
+      approval.action || 'N/A',
+      new Date(approval.created_at).toLocaleDateString(),
+      approval.comments || 'N/A'
+    ];
+
+    cells.forEach((cellText, index) => {
+      const td = document.createElement('td');
+      td.textContent = cellText;
+      td.style.cssText = `
+        padding: 1rem;
+        color: var(--text-primary);
+      `;
+      
+      if (index === 3) { // Action column
+        const actionColor = cellText === 'APPROVED' ? '#10b981' : cellText === 'REJECTED' ? '#ef4444' : '#6b7280';
+        td.style.color = actionColor;
+        td.style.fontWeight = '500';
+      }
+      
+      row.appendChild(td);
+    });
+
+    return row;
   }
 
   private showApprovalHistoryError(container: HTMLElement, message: string): void {